@@ -0,0 +1,41 @@
+"""book generation jobs
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column(
+        'books', sa.Column('prompts', postgresql.JSON(astext_type=sa.Text()), nullable=True)
+    )
+    op.add_column('books', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.add_column(
+        'books',
+        sa.Column('generation_attempts', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.add_column('books', sa.Column('generation_error', sa.String(), nullable=True))
+    op.create_index(op.f('ix_books_idempotency_key'), 'books', ['idempotency_key'], unique=True)
+
+    # Generated content is filled in by the job worker after the row is queued
+    op.alter_column('books', 'content', nullable=True)
+    op.alter_column('books', 'pages', nullable=True)
+
+def downgrade():
+    op.alter_column('books', 'pages', nullable=False)
+    op.alter_column('books', 'content', nullable=False)
+    op.drop_index(op.f('ix_books_idempotency_key'), table_name='books')
+    op.drop_column('books', 'generation_error')
+    op.drop_column('books', 'generation_attempts')
+    op.drop_column('books', 'idempotency_key')
+    op.drop_column('books', 'prompts')
@@ -0,0 +1,91 @@
+"""normalize book pages and add missing indexes
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-03-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+def upgrade():
+    op.create_table(
+        'book_pages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('image_prompt', sa.Text(), nullable=True),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('page_image', sa.String(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('book_id', 'page_number', name='uq_book_pages_book_id_page_number')
+    )
+    op.create_index(op.f('ix_book_pages_id'), 'book_pages', ['id'], unique=False)
+
+    op.create_index('ix_books_owner_id_status', 'books', ['owner_id', 'status'], unique=False)
+    op.create_index('ix_books_status', 'books', ['status'], unique=False)
+    op.create_index(op.f('ix_orders_book_id'), 'orders', ['book_id'], unique=False)
+    op.create_index(op.f('ix_orders_user_id'), 'orders', ['user_id'], unique=False)
+
+    backfill_pages()
+
+def backfill_pages():
+    """Copy the pages (or, before illustration, the content) JSON of every book into book_pages."""
+    bind = op.get_bind()
+    books = sa.table(
+        'books',
+        sa.column('id', sa.Integer),
+        sa.column('content', sa.JSON),
+        sa.column('pages', sa.JSON),
+    )
+    book_pages = sa.table(
+        'book_pages',
+        sa.column('book_id', sa.Integer),
+        sa.column('page_number', sa.Integer),
+        sa.column('text', sa.Text),
+        sa.column('image_prompt', sa.Text),
+        sa.column('image_url', sa.String),
+        sa.column('page_image', sa.String),
+        sa.column('error', sa.String),
+    )
+
+    result = bind.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(
+        sa.select(books.c.id, books.c.content, books.c.pages).order_by(books.c.id)
+    )
+    for partition in result.partitions():
+        rows = []
+        for book_id, content, pages in partition:
+            for page_number, page in enumerate(pages or content or [], start=1):
+                if isinstance(page, str):
+                    page = {"text": page}
+                rows.append({
+                    "book_id": book_id,
+                    "page_number": page_number,
+                    "text": page.get("text"),
+                    "image_prompt": page.get("image_prompt"),
+                    "image_url": page.get("image_url"),
+                    "page_image": page.get("page_image"),
+                    "error": page.get("error"),
+                })
+        if rows:
+            bind.execute(book_pages.insert(), rows)
+
+def downgrade():
+    op.drop_index(op.f('ix_orders_user_id'), table_name='orders')
+    op.drop_index(op.f('ix_orders_book_id'), table_name='orders')
+    op.drop_index('ix_books_status', table_name='books')
+    op.drop_index('ix_books_owner_id_status', table_name='books')
+    op.drop_index(op.f('ix_book_pages_id'), table_name='book_pages')
+    op.drop_table('book_pages')
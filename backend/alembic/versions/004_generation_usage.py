@@ -0,0 +1,30 @@
+"""generation usage
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-03-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    for name, type_ in (
+        ('prompt_tokens', sa.Integer()),
+        ('completion_tokens', sa.Integer()),
+        ('images_generated', sa.Integer()),
+        ('generation_cost', sa.Float()),
+    ):
+        op.add_column('books', sa.Column(name, type_, nullable=False, server_default='0'))
+
+def downgrade():
+    op.drop_column('books', 'generation_cost')
+    op.drop_column('books', 'images_generated')
+    op.drop_column('books', 'completion_tokens')
+    op.drop_column('books', 'prompt_tokens')
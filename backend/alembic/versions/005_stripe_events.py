@@ -0,0 +1,38 @@
+"""stripe webhook events
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-03-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'stripe_events',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('payload', postgresql.JSON(astext_type=sa.Text()), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Partial index: the worker only ever scans events it hasn't applied yet
+    op.create_index(
+        'ix_stripe_events_unprocessed', 'stripe_events', ['created'], unique=False,
+        postgresql_where=sa.text('processed_at IS NULL'),
+    )
+
+def downgrade():
+    op.drop_index('ix_stripe_events_unprocessed', table_name='stripe_events')
+    op.drop_table('stripe_events')
@@ -0,0 +1,21 @@
+"""image variants
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-04-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('book_pages', sa.Column('image_variants', sa.JSON(), nullable=True))
+
+def downgrade():
+    op.drop_column('book_pages', 'image_variants')
@@ -0,0 +1,21 @@
+"""job leases
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-06-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('books', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+def downgrade():
+    op.drop_column('books', 'lease_expires_at')
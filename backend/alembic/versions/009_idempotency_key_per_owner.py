@@ -0,0 +1,31 @@
+"""scope idempotency keys to the book owner
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-06-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.drop_index('ix_books_idempotency_key', table_name='books')
+    op.create_index(
+        'ix_books_owner_id_idempotency_key', 'books', ['owner_id', 'idempotency_key'], unique=True
+    )
+    # NULL owners never conflict in the index above, so anonymous books get a partial one
+    op.create_index(
+        'ix_books_anonymous_idempotency_key', 'books', ['idempotency_key'], unique=True,
+        postgresql_where=sa.text('owner_id IS NULL'),
+    )
+
+def downgrade():
+    op.drop_index('ix_books_anonymous_idempotency_key', table_name='books')
+    op.drop_index('ix_books_owner_id_idempotency_key', table_name='books')
+    op.create_index('ix_books_idempotency_key', 'books', ['idempotency_key'], unique=True)
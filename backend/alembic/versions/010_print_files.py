@@ -0,0 +1,21 @@
+"""print files
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-06-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('books', sa.Column('print_file', sa.String(), nullable=True))
+
+def downgrade():
+    op.drop_column('books', 'print_file')
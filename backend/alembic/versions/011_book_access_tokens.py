@@ -0,0 +1,21 @@
+"""access tokens for books created without signing in
+
+Revision ID: 011
+Revises: 010
+Create Date: 2024-06-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('books', sa.Column('access_token', sa.String(), nullable=True))
+
+def downgrade():
+    op.drop_column('books', 'access_token')
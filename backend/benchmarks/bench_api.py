@@ -0,0 +1,182 @@
+"""Benchmark API requests per second under uvicorn.
+
+Starts the app in a uvicorn subprocess against a throwaway SQLite database
+seeded with the default book types and a 20-page book, points every provider
+client at the local stubs, and drives each endpoint with a fixed number of
+concurrent keep-alive connections.
+
+Run from the backend directory: ``python benchmarks/bench_api.py``
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import StubServer, free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "32"))
+DURATION = float(os.getenv("BENCH_DURATION", "5"))
+API_WORKERS = int(os.getenv("BENCH_API_WORKERS", "1"))
+BOOK_PAGES = 20
+# The seeded book has no owner, so requests for it carry its access token
+BOOK_HEADERS = {"X-Book-Token": "benchmark-token"}
+
+
+def seed(database_url: str) -> int:
+    """Create the schema and sample rows, returning the id of the 20-page book."""
+    os.environ["DATABASE_URL"] = database_url
+    from database import SessionLocal, engine
+    from models import Base, Book, BookPage, BookType
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        for number in range(4):
+            db.add(BookType(
+                name=f"Book type {number}",
+                description="A personalized book",
+                price=29.99,
+                preview_price=0.0,
+                prompts=["Name", "Interests"],
+            ))
+        book = Book(
+            title="Benchmark book",
+            status="preview",
+            prompts={"name": "Sam"},
+            access_token=BOOK_HEADERS["X-Book-Token"],
+        )
+        db.add(book)
+        db.flush()
+        for number in range(1, BOOK_PAGES + 1):
+            db.add(BookPage(
+                book_id=book.id,
+                page_number=number,
+                text=f"Page {number}. "
+                + "Once upon a time a curious fox went looking for rainbows. " * 4,
+                image_prompt="A fox under a rainbow",
+                image_url=f"https://images.example.com/{number}.png",
+                page_image=f"ab/cd/{number:064d}.png",
+            ))
+        db.commit()
+        return book.id
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    path: str,
+    headers: Optional[Dict] = None,
+    method: str = "GET",
+    body: Optional[Dict] = None,
+) -> dict:
+    """Hit one path from CONCURRENCY workers for DURATION seconds."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "errors": errors,
+    }
+
+
+async def bench(base_url: str, book_id: int) -> dict:
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        etag = (await client.get("/book-types")).headers.get("etag")
+        await client.get(f"/books/{book_id}", headers=BOOK_HEADERS)  # warm the async engine
+        return {
+            "book_types": await drive(client, "/book-types"),
+            "book_types_not_modified": await drive(
+                client, "/book-types", {"If-None-Match": etag or ""}
+            ),
+            "book_detail": await drive(client, f"/books/{book_id}", BOOK_HEADERS),
+        }
+
+
+def start_api(env: Dict[str, str], port: int) -> subprocess.Popen:
+    """Launch the app under uvicorn with API_WORKERS processes."""
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(API_WORKERS), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def run() -> dict:
+    with tempfile.TemporaryDirectory() as directory, StubServer() as stubs:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        book_id = seed(database_url)
+
+        port = free_port()
+        env = {
+            **os.environ,
+            **stubs.env(),
+            "DATABASE_URL": database_url,
+            "ARTIFACT_DIR": os.path.join(directory, "artifacts"),
+            "CACHE_BACKEND": "memory",
+            "JOB_QUEUE_BACKEND": "inprocess",
+            "JOB_WORKERS": "0",
+        }
+        process = start_api(env, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_ready(base_url, process)
+            results = asyncio.run(bench(base_url, book_id))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    return {
+        "benchmark": "api",
+        "uvicorn_workers": API_WORKERS,
+        "concurrency": CONCURRENCY,
+        "duration_seconds": DURATION,
+        "book_pages": BOOK_PAGES,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,114 @@
+"""Benchmark login and authenticated requests per second per core under uvicorn.
+
+Logins are dominated by bcrypt at the configured BCRYPT_ROUNDS; authenticated
+requests are measured with the verified-token cache on and off, showing what
+skipping JWT verification and the user lookup is worth.
+
+Run from the backend directory: ``python benchmarks/bench_auth.py``
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+import bcrypt
+import httpx
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_api import (
+    API_WORKERS,
+    CONCURRENCY,
+    DURATION,
+    drive,
+    start_api,
+    wait_until_ready,
+)
+from benchmarks.stubs import free_port
+
+EMAIL = "reader@example.com"
+PASSWORD = "correct horse battery"
+ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def seed(database_url: str) -> None:
+    os.environ["DATABASE_URL"] = database_url
+    from database import SessionLocal, engine
+    from models import Base, User
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(ROUNDS)).decode()
+        db.add(User(email=EMAIL, hashed_password=hashed))
+        db.commit()
+
+
+def per_core(result: dict) -> dict:
+    return {**result, "per_core_per_second": round(result["requests_per_second"] / API_WORKERS, 1)}
+
+
+async def bench(base_url: str, include_login: bool) -> dict:
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    credentials = {"email": EMAIL, "password": PASSWORD}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        token = (await client.post("/users/login", json=credentials)).json()["access_token"]
+        results = {}
+        if include_login:
+            login = await drive(client, "/users/login", method="POST", body=credentials)
+            results["login"] = per_core(login)
+        users_me = await drive(client, "/users/me", {"Authorization": f"Bearer {token}"})
+        results["users_me"] = per_core(users_me)
+        return results
+
+
+def run_server(
+    directory: str, database_url: str, token_cache_size: int, include_login: bool
+) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "ARTIFACT_DIR": os.path.join(directory, "artifacts"),
+        "JOB_QUEUE_BACKEND": "inprocess",
+        "JOB_WORKERS": "0",
+        "JWT_SECRET_KEY": "benchmark-secret",
+        "BCRYPT_ROUNDS": str(ROUNDS),
+        "AUTH_TOKEN_CACHE_SIZE": str(token_cache_size),
+        # The benchmark is one client IP hammering login on purpose
+        "LOGIN_RATE_LIMIT_IP": "100000000/minute",
+    }
+    process = start_api(env, port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, process)
+        return asyncio.run(bench(base_url, include_login))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def run() -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        seed(database_url)
+        cached = run_server(directory, database_url, 10000, include_login=True)
+        uncached = run_server(directory, database_url, 0, include_login=False)
+
+    return {
+        "benchmark": "auth",
+        "uvicorn_workers": API_WORKERS,
+        "bcrypt_rounds": ROUNDS,
+        "concurrency": CONCURRENCY,
+        "duration_seconds": DURATION,
+        "results": {
+            "login": cached["login"],
+            "users_me_cached": cached["users_me"],
+            "users_me_uncached": uncached["users_me"],
+        },
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
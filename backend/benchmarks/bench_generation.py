@@ -0,0 +1,100 @@
+"""Benchmark story and illustration latency against the local OpenAI stub.
+
+The stub sleeps OPENAI_DELAY seconds per completion and IMAGE_DELAY per image,
+so the numbers show how much of each book's latency is our own overhead and
+how well illustration overlaps with story streaming.
+
+Run from the backend directory: ``python benchmarks/bench_generation.py``
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import statistics
+from typing import Awaitable, Callable, Dict, List
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import StubServer
+from services.book_generator import FULL_TIER, PREVIEW_TIER, BookGenerator
+from services.cache import MemoryCache
+from services.scheduler import OpenAIScheduler
+
+BOOKS = int(os.getenv("BENCH_BOOKS", "10"))
+OPENAI_DELAY = float(os.getenv("BENCH_OPENAI_DELAY", "0.5"))
+IMAGE_DELAY = float(os.getenv("BENCH_IMAGE_DELAY", "0.3"))
+
+# Generous limits: this measures our pipeline, not the rate limiter
+RATE_LIMITS = {model: {"rpm": 100000, "tpm": 10000000} for model in ("gpt-4", "gpt-3.5-turbo")}
+RATE_LIMITS["dall-e"] = {"rpm": 100000}
+
+
+def summarize(latencies: List[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_seconds": round(statistics.median(latencies), 3),
+        "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        "max_seconds": round(latencies[-1], 3),
+    }
+
+
+async def timed_books(make_call: Callable[[int], Awaitable]) -> dict:
+    """Start BOOKS generations at once; each gets unique prompts so nothing is served from cache."""
+    async def timed(number: int) -> float:
+        start = time.perf_counter()
+        await make_call(number)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(number) for number in range(BOOKS)))
+    elapsed = time.perf_counter() - start
+    return {**summarize(list(latencies)), "books_per_second": round(BOOKS / elapsed, 2)}
+
+
+def prompts(number: int, run: str) -> dict:
+    return {"name": f"Reader {run}-{number}", "age": "6", "interests": "foxes and rainbows"}
+
+
+async def bench() -> dict:
+    generator = BookGenerator(
+        cache=MemoryCache(max_entries=10000), scheduler=OpenAIScheduler(rate_limits=RATE_LIMITS)
+    )
+
+    async def story(number: int) -> List[Dict]:
+        return await generator.generate_story("children-story", prompts(number, "story"))
+
+    async def full_book(number: int) -> List[Dict]:
+        return await generator.generate_book(
+            "children-story", prompts(number, "full"), tier=FULL_TIER
+        )
+
+    async def preview_book(number: int) -> List[Dict]:
+        return await generator.generate_book(
+            "children-story", prompts(number, "preview"), tier=PREVIEW_TIER
+        )
+
+    return {
+        "generate_story": await timed_books(story),
+        "generate_book_full": await timed_books(full_book),
+        "generate_book_preview": await timed_books(preview_book),
+    }
+
+
+def run() -> dict:
+    with StubServer(openai_delay=OPENAI_DELAY, image_delay=IMAGE_DELAY) as stubs:
+        stubs.configure_clients()
+        results = asyncio.run(bench())
+        calls = dict(stubs.calls)
+    return {
+        "benchmark": "generation",
+        "books": BOOKS,
+        "simulated_delays": {"openai_seconds": OPENAI_DELAY, "image_seconds": IMAGE_DELAY},
+        "provider_calls": calls,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
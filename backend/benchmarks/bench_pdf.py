@@ -0,0 +1,55 @@
+"""Benchmark print PDF assembly for 10-, 50- and 200-page books.
+
+Run from the backend directory: ``python benchmarks/bench_pdf.py``
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pdf import PdfAssembler
+from services.renderer import PageRenderer
+
+PAGE_COUNTS = [10, 50, 200]
+
+
+def bench_pdf(page_count: int, background: bytes) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.pdf")
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(path, "wb") as f, PdfAssembler(f) as pdf:
+            for number in range(page_count):
+                # Every page shares one background, which should be embedded only once
+                pdf.add_page(text=f"Page {number}: once upon a time " * 20, image=background)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = os.path.getsize(path)
+
+    return {
+        "pages": page_count,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(page_count / elapsed, 1),
+        "peak_python_memory_mb": round(peak / 1024 / 1024, 2),
+        "file_size_mb": round(size / 1024 / 1024, 2),
+    }
+
+
+def run() -> dict:
+    background = PageRenderer(width=2550, height=3300, watermark="BACKGROUND").render("")
+    results = {}
+    for page_count in PAGE_COUNTS:
+        result = bench_pdf(page_count, background)
+        del result["pages"]
+        results[f"pages_{page_count}"] = result
+    return {"benchmark": "pdf_assembly", "results": results}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
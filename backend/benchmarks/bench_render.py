@@ -0,0 +1,76 @@
+"""Benchmark page rendering: create_page_image in one process and the shared render pool.
+
+Run from the backend directory: ``python benchmarks/bench_render.py``
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from services.book_generator import FULL_TIER, PREVIEW_TIER, BookGenerator, GenerationTier
+from services.renderer import RenderPool
+
+PAGES = int(os.getenv("BENCH_RENDER_PAGES", "100"))
+TEXT = "Once upon a time, a curious little fox set out to find the end of the rainbow. " * 3
+
+
+def bench_create_page_image(generator: BookGenerator) -> dict:
+    generator.create_page_image(TEXT, None)  # warm fonts and the base canvas
+    start = time.perf_counter()
+    for _ in range(PAGES):
+        generator.create_page_image(TEXT, None)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_per_second": round(PAGES / elapsed, 1),
+        "ms_per_page": round(elapsed / PAGES * 1000, 2),
+    }
+
+
+def web_illustration() -> bytes:
+    """A stand-in for an illustration's stored web variant."""
+    output = io.BytesIO()
+    Image.radial_gradient("L").resize((1024, 1024)).convert("RGB").save(
+        output, format="WEBP", quality=82
+    )
+    return output.getvalue()
+
+
+async def bench_render_pool(
+    generator: BookGenerator, pool: RenderPool, tier: GenerationTier
+) -> dict:
+    pages = [{"text": f"{number}. {TEXT}"} for number in range(PAGES)]
+    # Every page is illustrated, as in a full book
+    illustrations = [web_illustration()] * PAGES
+    await generator.render_book(pages[:pool.max_workers], tier)  # start the workers
+    start = time.perf_counter()
+    images = await generator.render_book(pages, tier, illustrations)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_per_second": round(PAGES / elapsed, 1),
+        "kb_per_page": round(sum(len(image) for image in images) / PAGES / 1024, 1),
+    }
+
+
+def run() -> dict:
+    pool = RenderPool()
+    generator = BookGenerator(render_pool=pool)
+    try:
+        results = {
+            "create_page_image": bench_create_page_image(generator),
+            "render_pool_full": asyncio.run(bench_render_pool(generator, pool, FULL_TIER)),
+            "render_pool_preview": asyncio.run(bench_render_pool(generator, pool, PREVIEW_TIER)),
+        }
+    finally:
+        pool.shutdown()
+    return {"benchmark": "render", "workers": pool.max_workers, "pages": PAGES, "results": results}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
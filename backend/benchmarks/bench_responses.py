@@ -0,0 +1,171 @@
+"""Benchmark the response layer on a 20-page book: serialization time and bytes on the wire.
+
+Serialization compares FastAPI's default path for a returned dict
+(jsonable_encoder, then json.dumps) with FastJSONResponse on the same payload.
+Wire sizes are Content-Length of GET /books/{id} through the app's middleware:
+uncompressed, gzip, brotli (when installed) and with sparse fieldsets.
+
+Run from the backend directory: ``python benchmarks/bench_responses.py``
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if TYPE_CHECKING:
+    from fastapi.testclient import TestClient
+
+ITERATIONS = int(os.getenv("BENCH_RESPONSE_ITERATIONS", "500"))
+BOOK_PAGES = 20
+# The seeded book has no owner, so requests for it carry its access token
+BOOK_HEADERS = {"X-Book-Token": "benchmark-token"}
+WORDS = (
+    "fox rainbow forest river lantern whisper golden meadow curious brave tiny giant moon "
+    "star secret map feather cloud bridge garden tea dragon kite storm quiet laughing old "
+    "oak castle morning evening dream journey friend wander sparkle hidden door key song"
+).split()
+
+
+def story_text(rng: random.Random, words: int = 150) -> str:
+    """Varied prose, so compression ratios resemble real stories rather than repeated lines."""
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 16)))
+        sentences.append(sentence.capitalize() + ".")
+    return " ".join(sentences)
+
+
+def digest(rng: random.Random) -> str:
+    return "%064x" % rng.getrandbits(256)
+
+
+def artifact_key(rng: random.Random, extension: str) -> str:
+    key = digest(rng)
+    return f"{key[:2]}/{key[2:4]}/{key}{extension}"
+
+
+def seed(database_url: str) -> int:
+    """Create the schema and a fully illustrated 20-page book, returning its id."""
+    os.environ["DATABASE_URL"] = database_url
+    from database import SessionLocal, engine
+    from models import Base, Book, BookPage
+
+    rng = random.Random(42)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        book = Book(
+            title="Benchmark book",
+            status="purchased",
+            prompts={"name": "Sam"},
+            access_token=BOOK_HEADERS["X-Book-Token"],
+        )
+        db.add(book)
+        db.flush()
+        for number in range(1, BOOK_PAGES + 1):
+            db.add(BookPage(
+                book_id=book.id,
+                page_number=number,
+                text=story_text(rng),
+                image_prompt=(
+                    "Create a beautiful illustration for this text: "
+                    f"{story_text(rng, 40)}"
+                ),
+                # DALL-E URLs carry a long signed query string
+                image_url=(
+                    "https://oaidalleapiprodscus.blob.core.windows.net/private/"
+                    f"img-{digest(rng)[:24]}.png"
+                    "?st=2024-03-01T10%3A00%3A00Z&se=2024-03-01T12%3A00%3A00Z&sp=r"
+                    f"&sig={digest(rng)}"
+                ),
+                image_variants={
+                    "print": artifact_key(rng, ".jpg"),
+                    "web": artifact_key(rng, ".webp"),
+                    "thumbnail": artifact_key(rng, ".webp"),
+                },
+                page_image=artifact_key(rng, ".png"),
+            ))
+        db.commit()
+        return book.id
+
+
+def ms_per_call(fn: Callable[[], object], iterations: int = ITERATIONS) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1000, 3)
+
+
+def wire_bytes(
+    client: "TestClient", path: str, encoding: str = "identity", fields: Optional[str] = None
+) -> int:
+    response = client.get(
+        path,
+        params={"fields": fields} if fields else None,
+        headers={"Accept-Encoding": encoding},
+    )
+    response.raise_for_status()
+    return int(response.headers["content-length"])
+
+
+def run() -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        book_id = seed(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        os.environ.setdefault("ARTIFACT_DIR", os.path.join(directory, "artifacts"))
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.testclient import TestClient
+        from starlette.responses import JSONResponse
+
+        from main import app
+        from services.responses import CompressionMiddleware, FastJSONResponse, brotli, orjson
+
+        path = f"/books/{book_id}"
+        with TestClient(app, headers=BOOK_HEADERS) as client:
+            payload = client.get(path, headers={"Accept-Encoding": "identity"}).json()
+            payload["created_at"] = datetime.fromisoformat(payload["created_at"])
+            body = FastJSONResponse(payload).body
+
+            wire: Dict[str, int] = {
+                "full": wire_bytes(client, path),
+                "full_gzip": wire_bytes(client, path, "gzip"),
+                "without_page_text": wire_bytes(
+                    client, path, fields="id,title,status,pages.page_number,pages.images"
+                ),
+                "without_page_text_gzip": wire_bytes(
+                    client, path, "gzip", fields="id,title,status,pages.page_number,pages.images"
+                ),
+                "title_status": wire_bytes(client, path, fields="title,status"),
+            }
+            compression = CompressionMiddleware(app)
+            compress = {"gzip_ms": ms_per_call(lambda: compression.compress(body, "gzip"))}
+            if brotli is not None:
+                wire["full_br"] = wire_bytes(client, path, "br")
+                compress["br_ms"] = ms_per_call(lambda: compression.compress(body, "br"))
+
+    return {
+        "benchmark": "responses",
+        "pages": BOOK_PAGES,
+        "serializer": "orjson" if orjson is not None else "json",
+        "brotli": brotli is not None,
+        "results": {
+            "serialize": {
+                "fastapi_default_ms": ms_per_call(
+                    lambda: JSONResponse(jsonable_encoder(payload)).body
+                ),
+                "fast_json_ms": ms_per_call(lambda: FastJSONResponse(payload).body),
+            },
+            "compress": compress,
+            "wire_bytes": wire,
+        },
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
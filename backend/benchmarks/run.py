@@ -0,0 +1,190 @@
+"""Run the benchmark suite and compare it with the stored baseline.
+
+Each benchmark runs in its own process (they configure the database and
+provider clients through the environment) and prints JSON. Every numeric
+metric is compared with ``benchmarks/baseline.json``: throughput
+(``*_per_second``) regresses when it drops, everything else (latency, memory,
+bytes) when it grows, by more than BENCH_TOLERANCE (default 20%). Benchmarks
+that regress are run again, up to BENCH_RETRIES (default 2) more times, and
+each metric keeps its best value, so one noisy run does not fail the suite.
+A saved baseline is the median of 1 + BENCH_RETRIES runs of each benchmark.
+
+Run from the backend directory::
+
+    python benchmarks/run.py                  # run, compare, exit 1 on regressions
+    python benchmarks/run.py --save-baseline  # run and store the results as the new baseline
+    python benchmarks/run.py --only render api
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+
+BENCHMARKS = {
+    "pdf": "bench_pdf.py",
+    "render": "bench_render.py",
+    "generation": "bench_generation.py",
+    "api": "bench_api.py",
+    "auth": "bench_auth.py",
+    "responses": "bench_responses.py",
+}
+
+
+def run_benchmark(script: str) -> Dict:
+    completed = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARK_DIR, script)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def flatten(results: Dict, prefix: str) -> Dict[str, float]:
+    """Turn nested results into ``benchmark.section.metric`` -> value."""
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def keep_best(metrics: Dict[str, float], rerun: Dict[str, float]) -> None:
+    """Merge a re-run into ``metrics``, keeping the better value of each metric."""
+    for name, value in rerun.items():
+        if name not in metrics:
+            metrics[name] = value
+        elif name.endswith("per_second"):
+            metrics[name] = max(metrics[name], value)
+        else:
+            metrics[name] = min(metrics[name], value)
+
+
+def median_metrics(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """The median of each metric over several runs of the same benchmark."""
+    return {
+        name: statistics.median(run[name] for run in runs if name in run) for name in runs[0]
+    }
+
+
+def is_regression(name: str, baseline: float, current: float, tolerance: float) -> bool:
+    if name.endswith("per_second"):
+        return current < baseline * (1 - tolerance)
+    if baseline == 0:
+        return current > 0
+    return current > baseline * (1 + tolerance)
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float], tolerance: float) -> List[Dict]:
+    rows = []
+    for name, value in sorted(current.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        rows.append({
+            "metric": name,
+            "baseline": before,
+            "current": value,
+            "change_pct": round((value - before) / before * 100, 1) if before else None,
+            "regression": is_regression(name, before, value, tolerance),
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store these results as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", "0.2"))
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=int(os.getenv("BENCH_RETRIES", "2")),
+        help="re-run regressed benchmarks up to this many times (extra runs for a baseline)",
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    metrics: Dict[str, float] = {}
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name} benchmark...", file=sys.stderr)
+        result = run_benchmark(BENCHMARKS[name])
+        results[name] = result
+        metrics.update(flatten(result["results"], name))
+
+    baseline: Dict[str, float] = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)["metrics"]
+
+    if args.save_baseline:
+        # A baseline from a single run may be an outlier that later runs can't match
+        for name in args.only or BENCHMARKS:
+            runs = [flatten(results[name]["results"], name)]
+            for _ in range(args.retries):
+                print(f"Running {name} benchmark again for the baseline...", file=sys.stderr)
+                runs.append(flatten(run_benchmark(BENCHMARKS[name])["results"], name))
+            metrics.update(median_metrics(runs))
+    else:
+        for _ in range(args.retries):
+            regressed = sorted({
+                row["metric"].split(".")[0]
+                for row in compare(baseline, metrics, args.tolerance)
+                if row["regression"]
+            })
+            if not regressed:
+                break
+            for name in regressed:
+                print(f"Re-running {name} benchmark after a regression...", file=sys.stderr)
+                results[name] = run_benchmark(BENCHMARKS[name])
+                keep_best(metrics, flatten(results[name]["results"], name))
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump({"results": results, "metrics": metrics}, f, indent=2)
+
+    if args.save_baseline:
+        if not args.only:
+            baseline = {}
+        # With --only, the stored numbers of benchmarks that weren't re-run are kept
+        baseline.update(metrics)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"metrics": baseline}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(json.dumps({"saved_baseline": BASELINE_PATH, "metrics": metrics}, indent=2))
+        return 0
+
+    if not baseline:
+        print(json.dumps({"metrics": metrics, "comparison": None}, indent=2))
+        print("No baseline stored; run with --save-baseline to create one", file=sys.stderr)
+        return 0
+
+    comparison = compare(baseline, metrics, args.tolerance)
+    regressions = [row for row in comparison if row["regression"]]
+    print(json.dumps({
+        "tolerance": args.tolerance,
+        "comparison": comparison,
+        "regressions": [row["metric"] for row in regressions],
+    }, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
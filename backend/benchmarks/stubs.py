@@ -0,0 +1,240 @@
+"""Local stand-ins for OpenAI, Stripe and the publishing service.
+
+The stubs speak just enough of each HTTP API for the app's clients, and
+sleep for a configurable time per call to simulate provider latency, so
+benchmarks run fully offline with realistic waiting. Use::
+
+    with StubServer(openai_delay=0.5, image_delay=0.3) as stubs:
+        stubs.configure_clients()
+        ...
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import threading
+from io import BytesIO
+from typing import Any, AsyncIterator, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from PIL import Image
+
+
+def story_for(body: Dict) -> str:
+    """A six-page story unique to the request, so page illustrations aren't deduplicated."""
+    digest = hashlib.sha256(json.dumps(body["messages"]).encode()).hexdigest()[:8]
+    return "\n\n".join(
+        f"Page {number} of tale {digest}. The little fox found another clue hidden under "
+        f"the old oak tree, and the whole forest leaned in to listen."
+        for number in range(1, 7)
+    )
+
+
+_stub_png: Optional[bytes] = None
+
+
+def stub_png() -> bytes:
+    """A 1024x1024 PNG standing in for a DALL-E illustration, built once."""
+    global _stub_png
+    if _stub_png is None:
+        image = Image.linear_gradient("L").resize((1024, 1024)).convert("RGB")
+        output = BytesIO()
+        image.save(output, format="PNG")
+        _stub_png = output.getvalue()
+    return _stub_png
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def create_stub_app(
+    openai_delay: float, image_delay: float, stripe_delay: float, publishing_delay: float
+) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = {}
+
+    def count(name: str) -> None:
+        app.state.calls[name] = app.state.calls.get(name, 0) + 1
+
+    # OpenAI
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        count("chat")
+        body = await request.json()
+        story = story_for(body)
+        if body.get("stream"):
+            async def chunks() -> AsyncIterator[str]:
+                words = story.split(" ")
+                # Spread the delay over the stream, like tokens arriving
+                for word_number, word in enumerate(words):
+                    await asyncio.sleep(openai_delay / len(words))
+                    content = word if word_number == 0 else " " + word
+                    yield "data: " + json.dumps({
+                        "object": "chat.completion.chunk",
+                        "model": body["model"],
+                        "choices": [
+                            {"index": 0, "delta": {"content": content}, "finish_reason": None}
+                        ],
+                    }) + "\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(openai_delay)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": story},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 120,
+                "completion_tokens": len(story) // 4,
+                "total_tokens": 120 + len(story) // 4,
+            },
+        }
+
+    @app.post("/v1/images/generations")
+    async def image_generations(request: Request):
+        count("image")
+        await asyncio.sleep(image_delay)
+        url = f"{str(request.base_url).rstrip('/')}/stub-image/{app.state.calls['image']}.png"
+        return {"created": int(time.time()), "data": [{"url": url}]}
+
+    @app.get("/stub-image/{name}")
+    async def stub_image(name: str):
+        count("image_download")
+        return Response(stub_png(), media_type="image/png")
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        count("speech")
+        await asyncio.sleep(openai_delay)
+        return Response(b"\x00\x00" * 24000, media_type="application/octet-stream")
+
+    # Stripe (form-encoded requests, JSON responses)
+    @app.post("/v1/payment_intents")
+    async def payment_intents():
+        count("stripe")
+        await asyncio.sleep(stripe_delay)
+        return {
+            "id": "pi_stub",
+            "object": "payment_intent",
+            "client_secret": "pi_stub_secret",
+            "status": "requires_payment_method",
+        }
+
+    @app.post("/v1/checkout/sessions")
+    async def checkout_sessions():
+        count("stripe")
+        await asyncio.sleep(stripe_delay)
+        return {
+            "id": "cs_stub",
+            "object": "checkout.session",
+            "url": "http://127.0.0.1/checkout/cs_stub",
+        }
+
+    @app.get("/v1/prices")
+    async def list_prices():
+        count("stripe")
+        await asyncio.sleep(stripe_delay)
+        return {
+            "object": "list", "data": [{"id": "price_stub", "object": "price"}], "has_more": False
+        }
+
+    # Publishing service
+    @app.post("/publishing/orders")
+    async def create_order():
+        count("publishing")
+        await asyncio.sleep(publishing_delay)
+        return {"id": "order_stub", "status": "received"}
+
+    @app.get("/publishing/orders/{order_id}")
+    async def order_status(order_id: str):
+        count("publishing")
+        await asyncio.sleep(publishing_delay)
+        return {"id": order_id, "status": "printing"}
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+    async def unknown(path: str):
+        return JSONResponse(
+            {"error": {"message": f"Stub has no route for /{path}"}}, status_code=404
+        )
+
+    return app
+
+
+class StubServer:
+    """Runs the stub app under uvicorn on a background thread."""
+
+    def __init__(
+        self,
+        openai_delay: float = 0.5,
+        image_delay: float = 0.3,
+        stripe_delay: float = 0.05,
+        publishing_delay: float = 0.1,
+        port: Optional[int] = None,
+    ):
+        self.port = port or free_port()
+        self.app = create_stub_app(openai_delay, image_delay, stripe_delay, publishing_delay)
+        self._server = uvicorn.Server(
+            uvicorn.Config(
+                self.app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False
+            )
+        )
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def calls(self) -> Dict[str, int]:
+        return self.app.state.calls
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points every provider client at the stubs (for subprocesses)."""
+        return {
+            "OPENAI_API_BASE": f"{self.url}/v1",
+            "OPENAI_API_KEY": "sk-stub",
+            "STRIPE_API_BASE": self.url,
+            "STRIPE_SECRET_KEY": "sk_test_stub",
+            "PUBLISHING_SERVICE_URL": f"{self.url}/publishing",
+            "PUBLISHING_SERVICE_API_KEY": "stub",
+        }
+
+    def configure_clients(self) -> None:
+        """Point the already-imported provider SDKs in this process at the stubs."""
+        import openai
+        import stripe
+
+        os.environ.update(self.env())
+        openai.api_base = f"{self.url}/v1"
+        openai.api_key = "sk-stub"
+        stripe.api_base = self.url
+        stripe.api_key = "sk_test_stub"
+
+    def __enter__(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
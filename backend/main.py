@@ -1,15 +1,94 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query as ORMQuery, Session, undefer
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Optional
+import asyncio
+import json
+import logging
 import os
+import secrets
 from dotenv import load_dotenv
 
+from database import SessionLocal, engine, get_async_db, get_async_engine, get_db, pool_stats
+from models import Book, BookPage, BookType, Order, User
+from schemas import (
+    BookCreateRequest,
+    BookPageUpdate,
+    BookStoryRequest,
+    BookTypeCreate,
+    BookTypeUpdate,
+    ShippingAddress,
+    UserAdminUpdate,
+    UserCreate,
+    UserLogin,
+)
+from services.auth import AuthError, CurrentUser, get_auth_service
+from services.book_generator import PREVIEW_TIER, BookGenerator
+from services.catalog import BookTypeCatalog, create_invalidation_bus_from_env, serialize_book_type
+from services.images import close_download_client
+from services.narration import NarrationQueue
+from services.instrumentation import render_metrics
+from services.jobs import (
+    ACTIVE_STATUSES,
+    CANCELLED,
+    PURCHASED,
+    QUEUED,
+    TERMINAL_STATUSES,
+    InProcessJobQueue,
+    create_job_queue_from_env,
+    request_upgrade,
+)
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, page_of, paginate
+from services.payment import PaymentService, invalidate_price_cache
+from services.publishing import PublishingService, close_http_client
+from services.ratelimit import (
+    AdmissionMiddleware,
+    auth_rules_from_env,
+    create_generation_gate_from_env,
+    generation_rules_from_env,
+)
+from services.renderer import get_render_pool, shutdown_render_pool
+from services.reporting import order_summary
+from services.responses import CompressionMiddleware, FastJSONResponse, Fieldset, InvalidFields
+from services.scheduler import get_scheduler
+from services.templates import compile_book_type, get_template_registry
+from services.webhooks import WebhookProcessor, record_event
+from services.storage import (
+    LocalArtifactStore,
+    S3ArtifactStore,
+    get_artifact_store,
+    iter_file_range,
+    key_digest,
+    parse_range,
+)
+
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Memory Maker API")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Memory Maker API", default_response_class=FastJSONResponse)
+
+# Innermost middleware, so only response bodies the app produced are compressed
+app.add_middleware(CompressionMiddleware)
+
+# Throttle the endpoints that spend OpenAI money; added before CORS so that
+# 429/503 responses still carry CORS headers
+generation_gate = create_generation_gate_from_env()
+app.add_middleware(
+    AdmissionMiddleware,
+    rules=generation_rules_from_env() + auth_rules_from_env(),
+    gate=generation_gate,
+    trust_forwarded=os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes"),
+    identify=get_auth_service().token_subject,
+)
 
 # Configure CORS
 app.add_middleware(
@@ -18,10 +97,149 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
-# OAuth2 scheme for token authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Queued generations beyond this are turned away rather than left to wait for hours
+MAX_QUEUED_GENERATIONS = int(os.getenv("MAX_QUEUED_GENERATIONS", "500"))
+
+# Bearer tokens come from the JSON POST /users/login, not the OAuth2 password form
+bearer_scheme = HTTPBearer(auto_error=False)
+auth_service = get_auth_service()
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[CurrentUser]:
+    if credentials is None:
+        return None
+    try:
+        return await auth_service.authenticate(credentials.credentials)
+    except AuthError as e:
+        raise _unauthorized(str(e))
+
+async def get_current_user(user: Optional[CurrentUser] = Depends(get_optional_user)) -> CurrentUser:
+    if user is None:
+        raise _unauthorized("Not authenticated")
+    return user
+
+def get_fieldset(
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. title,status or pages.page_number"
+    )
+) -> Fieldset:
+    return Fieldset.parse(fields)
+
+def _sparse(payload: Any, fieldset: Fieldset) -> Any:
+    try:
+        return fieldset.apply(payload)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def get_admin_user(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def get_owned_book(
+    book_id: int,
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    x_book_token: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(
+        None, description="Access token of a book created without signing in, for plain links"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+) -> Book:
+    """The book at ``book_id``, if the caller owns it or is an admin.
+
+    Books created without signing in have no owner; they are reachable with the
+    access token returned when they were created, sent as X-Book-Token or
+    ?access_token=. Other people's books are reported as missing rather than forbidden.
+    """
+    book = await db.get(Book, book_id)
+    if book is not None and book.owner_id is None:
+        supplied = x_book_token or access_token
+        valid = bool(book.access_token and supplied) and secrets.compare_digest(
+            book.access_token.encode(), supplied.encode()
+        )
+        if not valid and not (user is not None and user.is_admin):
+            book = None
+    elif book is not None:
+        if user is None:
+            raise HTTPException(
+                status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+            )
+        if book.owner_id != user.id and not user.is_admin:
+            book = None
+    if book is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return book
+
+job_queue = create_job_queue_from_env()
+catalog = BookTypeCatalog()
+
+def _on_catalog_change() -> None:
+    """Drop everything cached from the book_types table."""
+    catalog.invalidate()
+    invalidate_price_cache()
+
+catalog_bus = create_invalidation_bus_from_env(_on_catalog_change)
+webhook_processor = WebhookProcessor(on_upgrade=job_queue.enqueue)
+narration_queue = NarrationQueue()
+
+def _load_templates() -> None:
+    with SessionLocal() as db:
+        for error in get_template_registry().load(db.query(BookType).all()):
+            logger.error("Invalid book type template %s", error)
+
+@app.on_event("startup")
+async def startup() -> None:
+    await run_in_threadpool(_load_templates)
+    await catalog_bus.start()
+    # Redis and database queues are drained by scripts/worker.py instead
+    if isinstance(job_queue, InProcessJobQueue):
+        get_render_pool().start()
+        await job_queue.start(workers=int(os.getenv("JOB_WORKERS", "4")))
+        await webhook_processor.start()
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await catalog_bus.stop()
+    await narration_queue.stop()
+    if isinstance(job_queue, InProcessJobQueue):
+        await job_queue.stop()
+        await webhook_processor.stop()
+    shutdown_render_pool()
+    await close_http_client()
+    await close_download_client()
+    await get_async_engine().dispose()
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms, in-flight gauges and error counters for external calls and renders."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/db")
+async def database_metrics():
+    """Connection pool occupancy and wait times for the sync and async engines."""
+    return {"sync": pool_stats(engine), "async": pool_stats(get_async_engine())}
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Inline generations in flight, waiting for a slot and turned away."""
+    return generation_gate.stats()
+
+@app.get("/metrics/auth")
+async def auth_metrics():
+    """Verified-token cache occupancy and hit rate."""
+    return auth_service.token_cache.stats()
+
+@app.get("/metrics/openai")
+async def openai_metrics():
+    """Rate limiter headroom, coalesced requests and 429s seen by this process."""
+    return get_scheduler().stats()
 
 @app.get("/")
 async def root():
@@ -29,58 +247,619 @@ async def root():
 
 # Book types endpoints
 @app.get("/book-types")
-async def get_book_types():
-    return {
-        "book_types": [
-            {
-                "id": 1,
-                "name": "Children's Bedtime Story",
-                "description": "Create a personalized bedtime story for your child",
-                "price": 19.99,
-                "preview_price": 0.00
-            },
-            {
-                "id": 2,
-                "name": "Spouse Roasting Book",
-                "description": "Create a fun, personalized roasting book for your significant other",
-                "price": 24.99,
-                "preview_price": 0.00
-            }
-        ]
-    }
+async def get_book_types(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Serve the catalog from memory; clients revalidate with If-None-Match and get 304s."""
+    snapshot = await catalog.get(db)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "public, no-cache"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # User endpoints
-@app.post("/users/register")
-async def register_user():
-    # TODO: Implement user registration
-    pass
+@app.post("/users/register", status_code=201)
+async def register_user(request: UserCreate):
+    if "@" not in request.email:
+        raise HTTPException(status_code=400, detail="Invalid email address")
+    if len(request.password) < 8:
+        raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
+    try:
+        user = await auth_service.register(request.email, request.password)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AuthError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": user.id, "email": user.email}
 
 @app.post("/users/login")
-async def login():
-    # TODO: Implement user login
-    pass
+async def login(request: UserLogin):
+    try:
+        token = await auth_service.login(request.email, request.password)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    return {"access_token": token, "token_type": "bearer"}
+
+@app.get("/users/me")
+async def read_current_user(user: CurrentUser = Depends(get_current_user)):
+    return {"id": user.id, "email": user.email, "is_admin": user.is_admin}
 
 # Book creation endpoints
-@app.post("/books/create")
-async def create_book():
-    # TODO: Implement book creation
-    pass
+def _book_status(book: Book) -> dict:
+    return {
+        "book_id": book.id,
+        "status": book.status,
+        "attempts": book.generation_attempts,
+        "error": book.generation_error,
+        "usage": {
+            "prompt_tokens": book.prompt_tokens or 0,
+            "completion_tokens": book.completion_tokens or 0,
+            "images": book.images_generated or 0,
+            "cost": book.generation_cost or 0.0,
+        },
+    }
+
+def _idempotent_books(
+    db: Session, idempotency_key: str, owner_id: Optional[int]
+) -> "ORMQuery[Book]":
+    """Books created with this key by the same caller; keys from other callers never match."""
+    owner = Book.owner_id == owner_id if owner_id is not None else Book.owner_id.is_(None)
+    return db.query(Book).filter(owner, Book.idempotency_key == idempotency_key)
+
+def _queue_book(
+    db: Session,
+    request: BookCreateRequest,
+    idempotency_key: Optional[str],
+    owner_id: Optional[int] = None,
+) -> tuple:
+    if idempotency_key:
+        existing = _idempotent_books(db, idempotency_key, owner_id).first()
+        if existing is not None:
+            return existing, False
+
+    backlog = db.query(func.count(Book.id)).filter(Book.status.in_(ACTIVE_STATUSES)).scalar()
+    if backlog >= MAX_QUEUED_GENERATIONS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many books are being generated",
+            headers={"Retry-After": "60"},
+        )
+
+    book_type = db.get(BookType, request.book_type_id)
+    if book_type is None or not book_type.is_active:
+        raise HTTPException(status_code=404, detail="Book type not found")
+    try:
+        get_template_registry().for_book_type(book_type).render(request.prompts)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    book = Book(
+        title=request.title or book_type.name,
+        book_type_id=book_type.id,
+        prompts=request.prompts,
+        status=QUEUED,
+        idempotency_key=idempotency_key,
+        owner_id=owner_id,
+        access_token=secrets.token_urlsafe(32) if owner_id is None else None,
+    )
+    db.add(book)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request with the same idempotency key won the race
+        db.rollback()
+        return _idempotent_books(db, idempotency_key, owner_id).one(), False
+    db.refresh(book)
+    return book, True
+
+@app.post("/books/create", status_code=202)
+async def create_book(
+    request: BookCreateRequest,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+):
+    book, created = await run_in_threadpool(
+        _queue_book, db, request, idempotency_key, user.id if user is not None else None
+    )
+    if created:
+        await job_queue.enqueue(book.id)
+    status = _book_status(book)
+    if book.owner_id is None:
+        # The only way back to a book created without signing in
+        status["access_token"] = book.access_token
+    return status
+
+# Listings are keyset paginated: pass the returned next_cursor back as ?cursor= for the next page
+def _book_summary(book: Book) -> dict:
+    return {
+        "id": book.id,
+        "title": book.title,
+        "status": book.status,
+        "book_type_id": book.book_type_id,
+        "owner_id": book.owner_id,
+        "created_at": book.created_at,
+        "updated_at": book.updated_at,
+    }
+
+async def _list_books(
+    db: AsyncSession,
+    owner_id: Optional[int],
+    status: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+    fieldset: Fieldset,
+) -> Response:
+    query = select(Book)
+    if owner_id is not None:
+        query = query.where(Book.owner_id == owner_id)
+    if status is not None:
+        query = query.where(Book.status == status)
+    try:
+        query = paginate(query, [Book.id], cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    books, next_cursor = page_of((await db.execute(query)).scalars(), [Book.id], limit)
+    items = _sparse([_book_summary(book) for book in books], fieldset)
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@app.get("/books")
+async def list_books(
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fieldset: Fieldset = Depends(get_fieldset),
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The caller's books, newest first."""
+    return await _list_books(db, user.id, status, cursor, limit, fieldset)
+
+@app.get("/books/{book_id}/status")
+async def get_book_status(book: Book = Depends(get_owned_book)):
+    return _book_status(book)
+
+@app.get("/books/{book_id}/events")
+async def book_events(book_id: int, owned: Book = Depends(get_owned_book)):
+    """Report generation progress as server-sent events until the job finishes."""
+    def load_status() -> Optional[dict]:
+        with SessionLocal() as db:
+            book = db.get(Book, book_id)
+            return _book_status(book) if book is not None else None
+
+    async def events() -> AsyncIterator[str]:
+        last = None
+        while True:
+            status = await run_in_threadpool(load_status)
+            if status != last:
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                last = status
+            if status is None or status["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/books/{book_id}/cancel")
+async def cancel_book(
+    book_id: int, owned: Book = Depends(get_owned_book), db: Session = Depends(get_db)
+):
+    def cancel() -> Book:
+        book = db.get(Book, book_id)
+        if book is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if book.status in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Book generation already {book.status}")
+        book.status = CANCELLED
+        db.commit()
+        return book
+
+    book = await run_in_threadpool(cancel)
+    await job_queue.cancel(book_id)
+    return _book_status(book)
+
+@app.post("/books/{book_id}/upgrade", status_code=202)
+async def upgrade_book(
+    book_id: int, owned: Book = Depends(get_owned_book), db: Session = Depends(get_db)
+):
+    """Regenerate a paid preview at full quality, reusing its story text."""
+    def upgrade() -> Book:
+        book = db.get(Book, book_id)
+        if book is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if not book.price_paid:
+            raise HTTPException(status_code=402, detail="Book has not been paid for")
+        if not request_upgrade(book_id):
+            raise HTTPException(
+                status_code=409, detail=f"Book cannot be upgraded while {book.status}"
+            )
+        db.refresh(book)
+        return book
+
+    book = await run_in_threadpool(upgrade)
+    await job_queue.enqueue(book_id)
+    return _book_status(book)
+
+@app.post("/books/{book_id}/print-order", status_code=201)
+async def create_print_order(
+    book_id: int,
+    shipping_address: ShippingAddress,
+    request: Request,
+    book: Book = Depends(get_owned_book),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Send a paid book's print PDF to the publishing service.
+
+    The PDF is assembled by the last generation stage; the vendor fetches it
+    from the artifact URL, so PUBLIC_API_URL must be reachable from outside.
+    """
+    if book.status != PURCHASED or not book.print_file:
+        raise HTTPException(status_code=409, detail="Book has no print file yet")
+    store = get_artifact_store()
+    if isinstance(store, S3ArtifactStore):
+        print_file_url = await run_in_threadpool(store.presigned_url, book.print_file)
+    else:
+        base_url = os.getenv("PUBLIC_API_URL") or str(request.base_url)
+        print_file_url = f"{base_url.rstrip('/')}/artifacts/{book.print_file}"
+    page_count = await db.scalar(
+        select(func.count(BookPage.id)).where(BookPage.book_id == book_id)
+    )
+    try:
+        return await PublishingService().create_book_order(
+            {"title": book.title, "pages": page_count, "print_file_url": print_file_url},
+            shipping_address.dict(),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.post("/books/create/stream")
+async def stream_book_story(request: BookStoryRequest):
+    """Stream story pages as server-sent events while they are being written."""
+    generator = BookGenerator()
+    try:
+        generator.story_messages(request.book_type, request.prompts)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid book request: {str(e)}")
+
+    async def events() -> AsyncIterator[str]:
+        page_number = 0
+        try:
+            pages = generator.stream_story(request.book_type, request.prompts, PREVIEW_TIER)
+            async for page in pages:
+                page_number += 1
+                yield f"event: page\ndata: {json.dumps({'page_number': page_number, **page})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'pages': page_number})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/books/{book_id}")
-async def get_book(book_id: int):
-    # TODO: Implement get book
-    pass
+async def get_book(
+    book_id: int,
+    fieldset: Fieldset = Depends(get_fieldset),
+    book: Book = Depends(get_owned_book),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """A book with its pages; page rows and their text are loaded only when ``fields`` asks."""
+    payload = {"id": book.id, "title": book.title, "status": book.status}
+    if fieldset.includes("pages"):
+        with_text = fieldset.nested("pages").includes("text")
+        query = select(BookPage).where(BookPage.book_id == book_id).order_by(BookPage.page_number)
+        if with_text:
+            query = query.options(undefer(BookPage.text))
+        payload["pages"] = [
+            {
+                "page_number": page.page_number,
+                **({"text": page.text} if with_text else {}),
+                "image_url": page.image_url,
+                # Stored copies of the illustration; image_url itself expires within the hour
+                "images": {
+                    name: f"/artifacts/{key}" for name, key in (page.image_variants or {}).items()
+                },
+                "page_image": page.page_image,
+            }
+            for page in (await db.execute(query)).scalars()
+        ]
+    payload.update(
+        audio_url=book.audio_url, book_type_id=book.book_type_id, created_at=book.created_at
+    )
+    return FastJSONResponse(_sparse(payload, fieldset))
+
+@app.patch("/books/{book_id}/pages/{page_number}")
+async def update_book_page(
+    book_id: int,
+    page_number: int,
+    request: BookPageUpdate,
+    book: Book = Depends(get_owned_book),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Edit one page's text as a single-row update.
+
+    The page's stale render and the book's print file and narration are cleared.
+    """
+    result = await db.execute(
+        update(BookPage)
+        .where(BookPage.book_id == book_id, BookPage.page_number == page_number)
+        .values(text=request.text, page_image=None)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Page not found")
+    await db.execute(
+        update(Book).where(Book.id == book_id).values(audio_url=None, print_file=None)
+    )
+    await db.commit()
+    return {"book_id": book_id, "page_number": page_number, "text": request.text}
+
+@app.get("/books/{book_id}/audio")
+async def get_book_audio(
+    book_id: int,
+    voice: Optional[str] = None,
+    book: Book = Depends(get_owned_book),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Redirect to the book's narration, or queue it and answer 202 until it is ready.
+
+    Narration is keyed per sentence, so after a page edit only the changed
+    sentences are synthesized again before the file is re-stitched.
+    """
+    narrator = narration_queue.narrator
+    try:
+        voice = narrator.resolve_voice(voice)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    default_voice = voice == narrator.default_voice
+    if book.audio_url and default_voice:
+        return RedirectResponse(book.audio_url)
+
+    texts = list((await db.execute(
+        select(BookPage.text).where(BookPage.book_id == book_id).order_by(BookPage.page_number)
+    )).scalars())
+    if not texts:
+        raise HTTPException(status_code=409, detail="Book has no pages to narrate yet")
+
+    artifact = await narrator.cached(texts, voice)
+    if artifact is None:
+        if not narration_queue.submit(texts, voice):
+            raise HTTPException(
+                status_code=503, detail="Too many narrations queued", headers={"Retry-After": "60"}
+            )
+        return FastJSONResponse(
+            {"book_id": book_id, "voice": voice, "status": "narrating"},
+            status_code=202,
+            headers={"Retry-After": "5"},
+        )
+
+    audio_url = f"/artifacts/{artifact}"
+    if default_voice:
+        await db.execute(update(Book).where(Book.id == book_id).values(audio_url=audio_url))
+        await db.commit()
+    return RedirectResponse(audio_url)
+
+# Payment webhooks
+@app.post("/webhooks/stripe")
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Verify and record a Stripe event, then acknowledge; a worker applies it to orders.
+
+    Redeliveries of an event already recorded are acknowledged without being stored again.
+    """
+    payload = await request.body()
+    try:
+        signature = request.headers.get("stripe-signature", "")
+        event = PaymentService().verify_webhook(payload, signature)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+
+    recorded = await record_event(db, event)
+    if recorded:
+        webhook_processor.notify()
+    return {"received": True, "duplicate": not recorded}
+
+# Artifact downloads
+@app.get("/artifacts/{key:path}")
+async def download_artifact(key: str, request: Request):
+    """Serve a stored artifact with ETag and byte-range support.
+
+    Artifacts are content-addressed, so the key's hash is a strong ETag and the
+    response never changes. When ARTIFACT_ACCEL_REDIRECT is set, the file is
+    handed to the fronting nginx via X-Accel-Redirect so it is sent with
+    sendfile and never passes through Python.
+    """
+    store = get_artifact_store()
+    etag = f'"{key_digest(key)}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    if isinstance(store, S3ArtifactStore):
+        if not await store.exists(key):
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        return RedirectResponse(await run_in_threadpool(store.presigned_url, key))
+
+    if not isinstance(store, LocalArtifactStore):
+        raise HTTPException(status_code=501, detail="Artifact backend does not support downloads")
+
+    try:
+        path = store.path(key)
+        size = (await run_in_threadpool(os.stat, path)).st_size
+    except (ValueError, OSError):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+
+    media_type = store.content_type(key)
+    accel_prefix = os.getenv("ARTIFACT_ACCEL_REDIRECT")
+    if accel_prefix:
+        return Response(
+            media_type=media_type,
+            headers={**cache_headers, "X-Accel-Redirect": f"{accel_prefix.rstrip('/')}/{key}"},
+        )
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return FileResponse(
+            path, media_type=media_type, headers={**cache_headers, "Accept-Ranges": "bytes"}
+        )
+
+    start, end = byte_range["start"], byte_range["end"]
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            **cache_headers,
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        },
+    )
 
 # Admin endpoints
-@app.post("/admin/book-types")
-async def create_book_type():
-    # TODO: Implement book type creation
-    pass
+@app.post("/admin/book-types", status_code=201)
+async def create_book_type(
+    request: BookTypeCreate,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    book_type = BookType(**request.dict())
+    db.add(book_type)
+    await _commit_catalog_change(db, book_type)
+    return serialize_book_type(book_type, include_template=True)
 
 @app.put("/admin/book-types/{book_type_id}")
-async def update_book_type(book_type_id: int):
-    # TODO: Implement book type update
-    pass
+async def update_book_type(
+    book_type_id: int,
+    request: BookTypeUpdate,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    book_type = await db.get(BookType, book_type_id)
+    if book_type is None:
+        raise HTTPException(status_code=404, detail="Book type not found")
+    for field, value in request.dict(exclude_unset=True).items():
+        setattr(book_type, field, value)
+    await _commit_catalog_change(db, book_type)
+    return serialize_book_type(book_type, include_template=True)
+
+@app.patch("/admin/users/{user_id}")
+async def update_user(
+    user_id: int,
+    request: UserAdminUpdate,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Activate, deactivate, promote or demote a user.
+
+    Their cached tokens are dropped here at once; other API processes pick the
+    change up within AUTH_TOKEN_CACHE_SECONDS.
+    """
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    for field, value in request.dict(exclude_unset=True).items():
+        setattr(user, field, value)
+    await db.commit()
+    auth_service.token_cache.evict_user(user_id)
+    return {
+        "id": user.id,
+        "email": user.email,
+        "is_active": user.is_active,
+        "is_admin": user.is_admin,
+    }
+
+@app.get("/admin/books")
+async def admin_list_books(
+    owner_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fieldset: Fieldset = Depends(get_fieldset),
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await _list_books(db, owner_id, status, cursor, limit, fieldset)
+
+@app.get("/admin/orders")
+async def admin_list_orders(
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fieldset: Fieldset = Depends(get_fieldset),
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Orders newest first, optionally by status and within [since, until)."""
+    keys = [Order.created_at, Order.id]
+    query = select(Order)
+    if status is not None:
+        query = query.where(Order.status == status)
+    if since is not None:
+        query = query.where(Order.created_at >= since)
+    if until is not None:
+        query = query.where(Order.created_at < until)
+    try:
+        query = paginate(query, keys, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    orders, next_cursor = page_of((await db.execute(query)).scalars(), keys, limit)
+    items = [
+        {
+            "id": order.id,
+            "stripe_payment_id": order.stripe_payment_id,
+            "amount": order.amount,
+            "status": order.status,
+            "user_id": order.user_id,
+            "book_id": order.book_id,
+            "created_at": order.created_at,
+        }
+        for order in orders
+    ]
+    return FastJSONResponse({"items": _sparse(items, fieldset), "next_cursor": next_cursor})
+
+@app.get("/admin/summary")
+async def admin_summary(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Revenue and order volume per day from the incrementally maintained daily stats.
+
+    Defaults to the last 30 days.
+    """
+    until = until or datetime.utcnow().date()
+    since = since or until - timedelta(days=29)
+    if since > until:
+        raise HTTPException(status_code=400, detail="since must not be after until")
+    return await order_summary(db, since, until)
+
+async def _commit_catalog_change(db: AsyncSession, book_type: BookType) -> None:
+    """Validate the book type's template, commit the write and invalidate every worker's catalog."""
+    try:
+        await db.flush()
+        compile_book_type(book_type)
+        await catalog_bus.prepare(db)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A book type with that name already exists")
+    except (ValueError, KeyError) as e:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=f"Invalid prompt template: {str(e)}")
+    await catalog_bus.publish()
 
 if __name__ == "__main__":
     import uvicorn
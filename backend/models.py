@@ -1,5 +1,8 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Boolean, Column, ForeignKey, Integer, String, Float, Date, DateTime, JSON, Text, Index,
+    UniqueConstraint, text,
+)
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -34,11 +37,29 @@ class Book(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    content = Column(JSON)  # Store the generated content
-    pages = Column(JSON)  # Store the generated pages with images
+    # Legacy JSON blobs, superseded by book_pages and kept only for the backfill
+    content = deferred(Column(JSON))
+    pages = deferred(Column(JSON))
     audio_url = Column(String)  # URL to the generated audio file
-    status = Column(String)  # preview, purchased, published
+    # queued, generating_story, generating_images, ingesting_images, rendering,
+    # assembling_pdf, preview, failed, cancelled, purchased or published
+    status = Column(String)
     price_paid = Column(Float)
+    prompts = Column(JSON)  # The customer's answers the book is generated from
+    idempotency_key = Column(String)  # unique per owner, see __table_args__
+    # Books created without signing in are only reachable with this secret
+    access_token = Column(String)
+    generation_attempts = Column(Integer, default=0)
+    generation_error = Column(String)
+    # Held by the worker generating the book and renewed while it runs; a lapsed lease
+    # means the worker died and the book can be claimed again
+    lease_expires_at = Column(DateTime)
+    print_file = Column(String)  # Artifact key of the print-ready PDF, for paid books
+    # OpenAI usage charged to this book across all generation attempts
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    images_generated = Column(Integer, default=0)
+    generation_cost = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -49,16 +70,93 @@ class Book(Base):
     # Relationships
     owner = relationship("User", back_populates="books")
     book_type = relationship("BookType", back_populates="books")
+    book_pages = relationship(
+        "BookPage",
+        back_populates="book",
+        order_by="BookPage.page_number",
+        cascade="all, delete-orphan",
+        lazy="select",
+    )
+
+    # Listings page through books newest first by id (keyset), so id ends every index they use
+    __table_args__ = (
+        Index("ix_books_owner_id_id", "owner_id", "id"),
+        Index("ix_books_owner_id_status_id", "owner_id", "status", "id"),
+        Index("ix_books_status_id", "status", "id"),
+        # Idempotency keys are chosen by clients, so they only need to be unique per owner;
+        # anonymous books (NULL owner) get their own partial index since NULLs never conflict
+        Index("ix_books_owner_id_idempotency_key", "owner_id", "idempotency_key", unique=True),
+        Index(
+            "ix_books_anonymous_idempotency_key",
+            "idempotency_key",
+            unique=True,
+            postgresql_where=text("owner_id IS NULL"),
+            sqlite_where=text("owner_id IS NULL"),
+        ),
+    )
+
+class BookPage(Base):
+    __tablename__ = "book_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    page_number = Column(Integer, nullable=False)
+    # Heavy text columns are only loaded when accessed
+    text = deferred(Column(Text))
+    image_prompt = deferred(Column(Text))
+    image_url = Column(String)
+    image_variants = Column(JSON)  # Variant name -> artifact key of the ingested illustration
+    page_image = Column(String)  # Artifact key of the rendered page
+    error = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    book = relationship("Book", back_populates="book_pages")
+
+    __table_args__ = (
+        UniqueConstraint("book_id", "page_number", name="uq_book_pages_book_id_page_number"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     stripe_payment_id = Column(String, unique=True)
-    amount = Column(Float)
-    status = Column(String)  # pending, completed, failed
+    amount = Column(Float, nullable=False)
+    status = Column(String)  # pending, completed, failed, refunded
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Foreign keys
-    user_id = Column(Integer, ForeignKey("users.id"))
-    book_id = Column(Integer, ForeignKey("books.id")) 
\ No newline at end of file
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    book_id = Column(Integer, ForeignKey("books.id"), index=True)
+
+    # Admin listings page through orders newest first by (created_at, id)
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    )
+
+class OrderDailyStats(Base):
+    """Order count and amount per creation day and status, kept current as orders are written."""
+    __tablename__ = "order_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class StripeEvent(Base):
+    """Append-only log of verified Stripe webhook events, applied to orders by a worker."""
+    __tablename__ = "stripe_events"
+
+    id = Column(String, primary_key=True)  # Stripe's event id, so retried deliveries collide
+    type = Column(String, nullable=False)
+    # When Stripe created the event; events are applied in this order
+    created = Column(DateTime, nullable=False)
+    payload = Column(JSON, nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+    error = Column(String)
+
+    __table_args__ = (
+        Index("ix_stripe_events_unprocessed", "created", postgresql_where=processed_at.is_(None)),
+    )
@@ -0,0 +1,61 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Union
+
+
+class UserCreate(BaseModel):
+    email: str
+    password: str
+
+
+class UserLogin(BaseModel):
+    email: str
+    password: str
+
+
+class UserAdminUpdate(BaseModel):
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
+
+class BookStoryRequest(BaseModel):
+    book_type: str
+    prompts: Dict[str, str]
+
+
+class BookCreateRequest(BaseModel):
+    book_type_id: int
+    prompts: Dict[str, str]
+    title: Optional[str] = None
+
+
+class BookPageUpdate(BaseModel):
+    text: str
+
+
+class ShippingAddress(BaseModel):
+    name: str
+    address1: str
+    address2: str = ""
+    city: str
+    state: str
+    postal_code: str
+    country: str
+
+
+class BookTypeCreate(BaseModel):
+    name: str
+    description: str
+    price: float
+    preview_price: float = 0.0
+    # Either a list of field labels or {"fields": [...], "template": "...", "system": "..."}
+    prompts: Union[List[str], Dict[str, Any]]
+    is_active: bool = True
+
+
+class BookTypeUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    preview_price: Optional[float] = None
+    prompts: Optional[Union[List[str], Dict[str, Any]]] = None
+    is_active: Optional[bool] = None
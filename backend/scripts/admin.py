@@ -0,0 +1,357 @@
+"""Admin CLI for bulk export, import and backfills.
+
+    python scripts/admin.py export users books book_pages orders --dir dump/
+    python scripts/admin.py import users dump/users.ndjson
+    python scripts/admin.py rerun rendering --status preview purchased --workers 8 \
+        --checkpoint rerender.json
+
+Exports stream rows through server-side cursors and imports go in fixed-size
+batches (COPY on Postgres), so memory stays flat however large the tables are.
+Backfills walk books in id order and checkpoint after every batch; run the
+same command again to resume after an interruption.
+"""
+import io
+import os
+import sys
+import csv
+import json
+import asyncio
+import logging
+import argparse
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, Integer, Table, select, text
+from sqlalchemy.engine import Connection
+from dotenv import load_dotenv
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, dialect_insert, engine
+from models import Base, Book
+from services.jobs import (
+    ASSEMBLING_PDF,
+    GENERATING_IMAGES,
+    INGESTING_IMAGES,
+    RENDERING,
+    BookJobRunner,
+)
+from services.reporting import rebuild_order_stats
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger("admin")
+
+# Parents before children, so imports satisfy foreign keys when run in this order
+TABLES = ["users", "book_types", "books", "book_pages", "orders", "stripe_events"]
+RERUNNABLE_STAGES = [GENERATING_IMAGES, INGESTING_IMAGES, RENDERING, ASSEMBLING_PDF]
+
+
+def _table(name: str) -> Table:
+    return Base.metadata.tables[name]
+
+
+def _to_json(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def iter_rows(table: Table, batch_size: int) -> Iterator[List[Dict]]:
+    """Yield the table's rows in batches from a server-side cursor (plain fetchmany on SQLite)."""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+            select(table).order_by(*table.primary_key.columns)
+        )
+        for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+
+# Parquet export/import
+
+def _arrow_schema(table: Table) -> Any:
+    import pyarrow as pa
+
+    def arrow_type(column: Column) -> Any:
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        return pa.string()  # strings, text and JSON (stored as its JSON text)
+
+    return pa.schema([(column.name, arrow_type(column)) for column in table.columns])
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet export/import requires the 'pyarrow' package to be installed")
+
+
+def export_table(name: str, path: str, format: str = "ndjson", batch_size: int = 1000) -> int:
+    """Write every row of ``name`` to ``path`` as NDJSON or Parquet row groups.
+
+    Returns the number of rows written.
+    """
+    table = _table(name)
+    json_columns = [column.name for column in table.columns if isinstance(column.type, JSON)]
+    count = 0
+
+    if format == "parquet":
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _arrow_schema(table)
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in iter_rows(table, batch_size):
+                for row in rows:
+                    for column in json_columns:
+                        if row[column] is not None:
+                            row[column] = json.dumps(row[column])
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                count += len(rows)
+        return count
+
+    with open(path, "w") as f:
+        for rows in iter_rows(table, batch_size):
+            f.writelines(json.dumps(row, default=_to_json) + "\n" for row in rows)
+            count += len(rows)
+    return count
+
+
+def read_batches(path: str, table: Table, batch_size: int) -> Iterator[List[Dict]]:
+    """Read an export back in batches, converting values to the column types."""
+    datetime_columns = [
+        column.name for column in table.columns if isinstance(column.type, DateTime)
+    ]
+    json_columns = [column.name for column in table.columns if isinstance(column.type, JSON)]
+
+    def convert(row: Dict) -> Dict:
+        for column in datetime_columns:
+            if isinstance(row.get(column), str):
+                row[column] = datetime.fromisoformat(row[column])
+        return row
+
+    if path.endswith(".parquet"):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            rows = batch.to_pylist()
+            for row in rows:
+                for column in json_columns:
+                    if row.get(column) is not None:
+                        row[column] = json.loads(row[column])
+            yield rows
+        return
+
+    batch = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                batch.append(convert(json.loads(line)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _copy_batch(connection: Connection, table: Table, rows: List[Dict]) -> None:
+    """COPY a batch into Postgres through psycopg2, as CSV built in memory."""
+    columns = [column.name for column in table.columns]
+    json_columns = {column.name for column in table.columns if isinstance(column.type, JSON)}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            "\\N" if row.get(column) is None
+            else json.dumps(row[column]) if column in json_columns
+            else row[column].isoformat() if isinstance(row[column], datetime)
+            else row[column]
+            for column in columns
+        ])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+    )
+
+
+def import_table(name: str, path: str, batch_size: int = 1000, skip_existing: bool = False) -> int:
+    """Load an export into ``name``, one transaction per batch; returns the row count.
+
+    Postgres uses COPY unless ``skip_existing`` asks for INSERT ... ON CONFLICT DO NOTHING.
+    """
+    table = _table(name)
+    dialect = engine.dialect.name
+    count = 0
+    for rows in read_batches(path, table, batch_size):
+        with engine.begin() as connection:
+            if dialect == "postgresql" and not skip_existing:
+                _copy_batch(connection, table, rows)
+            elif skip_existing:
+                connection.execute(dialect_insert(dialect)(table).on_conflict_do_nothing(), rows)
+            else:
+                connection.execute(table.insert(), rows)
+        count += len(rows)
+
+    if dialect == "postgresql" and "id" in table.c and isinstance(table.c.id.type, Integer):
+        # Explicit ids bypass the sequence, so move it past the imported rows
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+            ))
+    return count
+
+
+# Backfills
+
+class Checkpoint:
+    """Progress of a backfill, saved atomically after every batch."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.last_id = 0
+        self.done = 0
+        self.failed = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.last_id, self.done, self.failed = state["last_id"], state["done"], state["failed"]
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"last_id": self.last_id, "done": self.done, "failed": self.failed}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def record_failure(self, book_id: int, error: Exception) -> None:
+        self.failed += 1
+        if self.path:
+            with open(self.path + ".failed", "a") as f:
+                f.write(json.dumps({"book_id": book_id, "error": str(error)}) + "\n")
+
+
+def book_id_batches(
+    after_id: int, batch_size: int, statuses: Optional[List[str]], book_type_id: Optional[int]
+) -> Iterator[List[int]]:
+    """Page through matching book ids by keyset, so each query is an index range scan."""
+    while True:
+        query = select(Book.id).where(Book.id > after_id).order_by(Book.id).limit(batch_size)
+        if statuses:
+            query = query.where(Book.status.in_(statuses))
+        if book_type_id is not None:
+            query = query.where(Book.book_type_id == book_type_id)
+        with SessionLocal() as db:
+            ids = list(db.scalars(query))
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+async def rerun_stage(
+    stage: str,
+    statuses: Optional[List[str]] = None,
+    book_type_id: Optional[int] = None,
+    workers: int = 4,
+    batch_size: int = 100,
+    checkpoint_path: Optional[str] = None,
+) -> Checkpoint:
+    """Re-run a generation stage over every matching book with ``workers`` books in flight."""
+    runner = BookJobRunner()
+    checkpoint = Checkpoint(checkpoint_path)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def rerun(book_id: int) -> None:
+        async with semaphore:
+            try:
+                await runner.rerun_stage(book_id, stage)
+                checkpoint.done += 1
+            except Exception as e:
+                logger.warning("Book %s failed: %s", book_id, e)
+                checkpoint.record_failure(book_id, e)
+
+    batches = book_id_batches(checkpoint.last_id, batch_size, statuses, book_type_id)
+    while True:
+        # The id query blocks, so it runs off the event loop like the runner's own queries
+        ids = await asyncio.to_thread(next, batches, None)
+        if ids is None:
+            break
+        await asyncio.gather(*(rerun(book_id) for book_id in ids))
+        checkpoint.last_id = ids[-1]
+        checkpoint.save()
+        logger.info(
+            "Through book %s: %s done, %s failed",
+            checkpoint.last_id,
+            checkpoint.done,
+            checkpoint.failed,
+        )
+    return checkpoint
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Memory Maker admin tasks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="stream tables out as NDJSON or Parquet")
+    export.add_argument("tables", nargs="+", choices=TABLES)
+    export.add_argument("--dir", default=".")
+    export.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    export.add_argument("--batch-size", type=int, default=1000)
+
+    load = commands.add_parser("import", help="bulk load an export into a table")
+    load.add_argument("table", choices=TABLES)
+    load.add_argument("path")
+    load.add_argument("--batch-size", type=int, default=1000)
+    load.add_argument(
+        "--skip-existing", action="store_true", help="ignore rows whose key already exists"
+    )
+
+    rerun = commands.add_parser("rerun", help="re-run a generation stage across many books")
+    rerun.add_argument("stage", choices=RERUNNABLE_STAGES)
+    rerun.add_argument("--status", nargs="+", help="only books in these statuses")
+    rerun.add_argument("--book-type", type=int)
+    rerun.add_argument("--workers", type=int, default=4)
+    rerun.add_argument("--batch-size", type=int, default=100)
+    rerun.add_argument(
+        "--checkpoint", help="progress file; rerunning with it resumes where it stopped"
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.command == "export":
+        os.makedirs(args.dir, exist_ok=True)
+        for name in args.tables:
+            path = os.path.join(args.dir, f"{name}.{args.format}")
+            count = export_table(name, path, args.format, args.batch_size)
+            logger.info("Exported %s rows from %s to %s", count, name, path)
+    elif args.command == "import":
+        count = import_table(args.table, args.path, args.batch_size, args.skip_existing)
+        logger.info("Imported %s rows into %s", count, args.table)
+        if args.table == "orders":
+            # Imported orders bypass the webhook worker that keeps the daily stats current
+            with SessionLocal() as db:
+                rebuild_order_stats(db)
+                db.commit()
+            logger.info("Rebuilt order_daily_stats")
+    elif args.command == "rerun":
+        checkpoint = asyncio.run(rerun_stage(
+            args.stage, args.status, args.book_type, args.workers, args.batch_size, args.checkpoint
+        ))
+        logger.info("Finished: %s done, %s failed", checkpoint.done, checkpoint.failed)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,19 @@ def init_db():
                 description="Create a personalized bedtime story for your child",
                 price=19.99,
                 preview_price=0.00,
-                prompts=["Child's Name", "Age", "Interests", "Favorite Characters"],
+                prompts={
+                    "system": "You are a children's story writer.",
+                    "fields": ["Child's Name", "Age", "Interests", "Favorite Characters"],
+                    "template": (
+                        "Create a children's bedtime story for {childs_name}, "
+                        "who is {age} years old.\n"
+                        "The story should be engaging, include elements about {interests} and "
+                        "feature {favorite_characters}.\n"
+                        "The story should be split into 5-7 pages, "
+                        "with each page being a short paragraph.\n"
+                        "Make it magical and educational."
+                    ),
+                },
                 is_active=True,
                 created_at=datetime.utcnow()
             ),
@@ -38,7 +50,22 @@ def init_db():
                 description="Create a fun, personalized roasting book for your significant other",
                 price=24.99,
                 preview_price=0.00,
-                prompts=["Partner's Name", "Inside Jokes", "Funny Stories", "Favorite Activities"],
+                prompts={
+                    "system": "You are a humorous writer.",
+                    "fields": [
+                        "Partner's Name", "Inside Jokes", "Funny Stories", "Favorite Activities"
+                    ],
+                    "template": (
+                        "Create a fun, light-hearted roasting book for {partners_name}.\n"
+                        "Work in these inside jokes: {inside_jokes}. "
+                        "Retell these stories: {funny_stories}.\n"
+                        "Include references to {favorite_activities} "
+                        "and make it humorous but not mean-spirited.\n"
+                        "The story should be split into 5-7 pages, "
+                        "with each page being a short paragraph.\n"
+                        "Make it funny and personal."
+                    ),
+                },
                 is_active=True,
                 created_at=datetime.utcnow()
             ),
@@ -47,7 +74,18 @@ def init_db():
                 description="Create a personalized family history book with stories and memories",
                 price=29.99,
                 preview_price=0.00,
-                prompts=["Family Name", "Key Events", "Family Members", "Special Memories"],
+                prompts={
+                    "system": "You are a family historian and storyteller.",
+                    "fields": ["Family Name", "Key Events", "Family Members", "Special Memories"],
+                    "template": (
+                        "Write a warm family history book about the {family_name} family.\n"
+                        "Introduce {family_members}, walk through {key_events} and celebrate "
+                        "{special_memories}.\n"
+                        "The story should be split into 5-7 pages, "
+                        "with each page being a short paragraph.\n"
+                        "Make it heartfelt and suitable for sharing across generations."
+                    ),
+                },
                 is_active=True,
                 created_at=datetime.utcnow()
             ),
@@ -56,7 +94,20 @@ def init_db():
                 description="Create a fun adventure story featuring your pet as the main character",
                 price=19.99,
                 preview_price=0.00,
-                prompts=["Pet's Name", "Pet's Species", "Pet's Personality", "Favorite Activities"],
+                prompts={
+                    "system": "You are a playful adventure story writer.",
+                    "fields": [
+                        "Pet's Name", "Pet's Species", "Pet's Personality", "Favorite Activities"
+                    ],
+                    "template": (
+                        "Create an adventure story starring {pets_name}, a {pets_species} who is "
+                        "{pets_personality}.\n"
+                        "The adventure should revolve around {favorite_activities}.\n"
+                        "The story should be split into 5-7 pages, "
+                        "with each page being a short paragraph.\n"
+                        "Make it exciting and full of heart."
+                    ),
+                },
                 is_active=True,
                 created_at=datetime.utcnow()
             )
@@ -0,0 +1,31 @@
+import os
+import sys
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.jobs import create_job_queue_from_env
+from services.renderer import get_render_pool
+from services.webhooks import WebhookProcessor
+
+# Load environment variables
+load_dotenv()
+
+async def run_worker() -> None:
+    get_render_pool().start()
+    queue = create_job_queue_from_env()
+    webhooks = WebhookProcessor(on_upgrade=queue.enqueue)
+    await queue.start(workers=int(os.getenv("JOB_WORKERS", "4")))
+    await webhooks.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await webhooks.stop()
+        await queue.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
@@ -0,0 +1,286 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+import bcrypt
+from jose import JWTError, jwt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from models import User
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+# bcrypt only looks at the first 72 bytes, and recent versions refuse longer input
+MAX_PASSWORD_BYTES = 72
+
+
+class AuthError(Exception):
+    pass
+
+
+class PasswordHasher:
+    """bcrypt (or argon2 with PASSWORD_HASHER=argon2) on a bounded thread pool.
+
+    Both libraries release the GIL while hashing, so the pool uses every core
+    without blocking the event loop, and its size caps how much CPU a burst of
+    logins can take from everything else.
+    """
+
+    def __init__(
+        self,
+        scheme: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        rounds: Optional[int] = None,
+    ):
+        self.scheme = scheme or os.getenv("PASSWORD_HASHER", "bcrypt")
+        self.rounds = rounds or int(os.getenv("BCRYPT_ROUNDS", "12"))
+        if self.scheme not in ("bcrypt", "argon2"):
+            raise ValueError(f"Unknown password hasher: {self.scheme}")
+        self._argon2 = None
+        if self.scheme == "argon2":
+            self._argon2_hasher()
+        self._executor = ThreadPoolExecutor(
+            max_workers=(
+                max_workers or int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or os.cpu_count()
+            ),
+            thread_name_prefix="password-hash",
+        )
+        self._dummy_hash: Optional[str] = None
+
+    def _argon2_hasher(self) -> Any:
+        if self._argon2 is None:
+            try:
+                from argon2 import PasswordHasher as Argon2Hasher
+            except ImportError:
+                raise ImportError(
+                    "Argon2 hashing requires the 'argon2-cffi' package to be installed"
+                )
+            self._argon2 = Argon2Hasher()
+        return self._argon2
+
+    def _hash(self, password: str) -> str:
+        if self.scheme == "argon2":
+            return self._argon2_hasher().hash(password)
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    def _verify(self, password: str, hashed: str) -> bool:
+        # Checked by prefix, so hashes from either scheme keep working after a switch
+        if hashed.startswith("$argon2"):
+            from argon2.exceptions import VerificationError
+
+            try:
+                return self._argon2_hasher().verify(hashed, password)
+            except VerificationError:
+                return False
+        return bcrypt.checkpw(password.encode()[:MAX_PASSWORD_BYTES], hashed.encode())
+
+    async def hash(self, password: str) -> str:
+        if len(password.encode()) > MAX_PASSWORD_BYTES:
+            raise ValueError(f"Password must be at most {MAX_PASSWORD_BYTES} bytes")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._hash, password)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> bool:
+        """Check a password.
+
+        With no stored hash (unknown email), burn the same CPU and fail, so timing doesn't leak.
+        """
+        if hashed is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._verify, password, self._dummy_hash
+            )
+            return False
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._verify, password, hashed)
+
+
+class CurrentUser:
+    """The parts of a User that authenticated requests need, safe to cache across sessions."""
+
+    __slots__ = ("id", "email", "is_admin")
+
+    def __init__(self, id: int, email: str, is_admin: bool):
+        self.id = id
+        self.email = email
+        self.is_admin = is_admin
+
+
+class TokenCache:
+    """LRU of verified tokens, keyed by token hash.
+
+    Entries are kept until the token expires or for ``ttl`` seconds, whichever is
+    sooner. evict_user only reaches this process, so the TTL bounds how long
+    other processes keep serving a deactivated user or a demoted admin.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[float, CurrentUser]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, token: str, user: CurrentUser, expires_at: float) -> None:
+        key = self._key(token)
+        self._entries[key] = (min(expires_at, time.time() + self.ttl), user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict_user(self, user_id: int) -> None:
+        """Drop a user's cached tokens, e.g. after deactivating or demoting them."""
+        for key in [key for key, (_, user) in self._entries.items() if user.id == user_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class AuthService:
+    """Registration, login and bearer token verification."""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        hasher: Optional[PasswordHasher] = None,
+        secret_key: Optional[str] = None,
+        token_cache: Optional[TokenCache] = None,
+    ):
+        self.session_factory = session_factory
+        self.hasher = hasher or PasswordHasher()
+        self.secret_key = secret_key or os.getenv("JWT_SECRET_KEY")
+        if not self.secret_key:
+            logger.warning(
+                "JWT_SECRET_KEY is not set; "
+                "tokens will not survive a restart or work across processes"
+            )
+            self.secret_key = secrets.token_urlsafe(32)
+        self.token_cache = token_cache or TokenCache(
+            int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+            float(os.getenv("AUTH_TOKEN_CACHE_SECONDS", "60")),
+        )
+
+    async def register(self, email: str, password: str) -> User:
+        """Create a user; raises AuthError when the email is already registered."""
+        email = email.strip().lower()
+
+        def exists() -> bool:
+            with self.session_factory() as db:
+                return db.query(User.id).filter(User.email == email).first() is not None
+
+        # Checked before hashing so duplicate sign-ups don't cost a bcrypt round
+        if await asyncio.to_thread(exists):
+            raise AuthError("Email already registered")
+        hashed = await self.hasher.hash(password)
+
+        def create() -> User:
+            with self.session_factory() as db:
+                user = User(email=email, hashed_password=hashed)
+                db.add(user)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # A concurrent registration with the same email won the race
+                    raise AuthError("Email already registered")
+                db.refresh(user)
+                return user
+
+        return await asyncio.to_thread(create)
+
+    async def login(self, email: str, password: str) -> str:
+        """Check credentials and return a new access token."""
+        email = email.strip().lower()
+
+        def load() -> Optional[User]:
+            with self.session_factory() as db:
+                return db.query(User).filter(User.email == email).first()
+
+        user = await asyncio.to_thread(load)
+        hashed = user.hashed_password if user is not None else None
+        if not await self.hasher.verify(password, hashed):
+            raise AuthError("Incorrect email or password")
+        if not user.is_active:
+            raise AuthError("User is inactive")
+        return self.create_access_token(user)
+
+    def create_access_token(self, user: User) -> str:
+        expires = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        return jwt.encode(
+            {"sub": str(user.id), "exp": expires}, self.secret_key, algorithm=JWT_ALGORITHM
+        )
+
+    def token_subject(self, token: str) -> Optional[str]:
+        """The verified subject (user id) of a token, or None if invalid. No database lookup."""
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            return str(cached.id)
+        try:
+            return str(jwt.decode(token, self.secret_key, algorithms=[JWT_ALGORITHM])["sub"])
+        except (JWTError, KeyError):
+            return None
+
+    async def authenticate(self, token: str) -> CurrentUser:
+        """Resolve a bearer token to its user, from the cache when it was verified before."""
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            return cached
+
+        try:
+            claims = jwt.decode(token, self.secret_key, algorithms=[JWT_ALGORITHM])
+            user_id = int(claims["sub"])
+        except (JWTError, KeyError, ValueError):
+            raise AuthError("Invalid token")
+
+        def load() -> Optional[User]:
+            with self.session_factory() as db:
+                return db.get(User, user_id)
+
+        user = await asyncio.to_thread(load)
+        if user is None or not user.is_active:
+            raise AuthError("Invalid token")
+        current = CurrentUser(user.id, user.email, bool(user.is_admin))
+        self.token_cache.set(token, current, float(claims["exp"]))
+        return current
+
+
+_default_auth: Optional[AuthService] = None
+
+
+def get_auth_service() -> AuthService:
+    """Return the process-wide auth service, creating it on first use."""
+    global _default_auth
+    if _default_auth is None:
+        _default_auth = AuthService()
+    return _default_auth
@@ -1,72 +1,223 @@
 import os
-from typing import Dict, List, Optional
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 import openai
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
-import io
-import base64
 from dotenv import load_dotenv
 
+from services.cache import CacheBackend, get_default_cache, make_cache_key
+from services.instrumentation import instrument
+from services.narration import Narrator, get_narrator
+from services.renderer import PageRenderer, RenderPool, get_render_pool
+from services.scheduler import OpenAIScheduler, estimate_tokens, get_scheduler
+from services.templates import TemplateRegistry, get_template_registry
+
 load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
+# Point at a local fake server for load tests, e.g. http://localhost:8080/v1
+openai.api_base = os.getenv("OPENAI_API_BASE", openai.api_base)
+
+# Completion budget reserved against the TPM limit until the real usage is known
+STORY_COMPLETION_TOKENS = int(os.getenv("STORY_COMPLETION_TOKENS", "1200"))
+
+
+def _chat_usage(response: Dict) -> Tuple[int, int]:
+    usage = response.get("usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+RENDER_EXTENSIONS = {"PNG": ".png", "WEBP": ".webp", "JPEG": ".jpg"}
+
+
+class GenerationTier:
+    """Model, illustration and render settings for one quality level of a book."""
+
+    def __init__(
+        self,
+        name: str,
+        story_model: str,
+        image_size: str,
+        illustrated_pages: Optional[int],
+        render_format: str,
+        render_options: Dict,
+    ):
+        self.name = name
+        self.story_model = story_model
+        self.image_size = image_size
+        self.illustrated_pages = illustrated_pages  # None illustrates every page
+        self.render_format = render_format
+        self.render_options = render_options
+
+    @property
+    def render_extension(self) -> str:
+        return RENDER_EXTENSIONS[self.render_format]
+
+
+# Free previews: a cheaper model, a few small illustrations and compressed, watermarked thumbnails
+PREVIEW_TIER = GenerationTier(
+    "preview",
+    story_model=os.getenv("PREVIEW_STORY_MODEL", "gpt-3.5-turbo"),
+    image_size=os.getenv("PREVIEW_IMAGE_SIZE", "256x256"),
+    illustrated_pages=int(os.getenv("PREVIEW_ILLUSTRATED_PAGES", "2")),
+    render_format=os.getenv("PREVIEW_RENDER_FORMAT", "WEBP"),
+    render_options={
+        "width": 600,
+        "height": 400,
+        "font_size": 18,
+        "margin": 25,
+        "watermark": "PREVIEW",
+        "quality": 60,
+    },
+)
+
+# Paid books: every page illustrated at full size and rendered losslessly without the watermark
+FULL_TIER = GenerationTier(
+    "full",
+    story_model=os.getenv("STORY_MODEL", "gpt-4"),
+    image_size="1024x1024",
+    illustrated_pages=None,
+    render_format="PNG",
+    render_options={"watermark": None},
+)
+
 
 class BookGenerator:
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        render_pool: Optional[RenderPool] = None,
+        templates: Optional[TemplateRegistry] = None,
+        scheduler: Optional[OpenAIScheduler] = None,
+        narrator: Optional[Narrator] = None,
+    ):
+        self.cache = cache or get_default_cache()
+        self.templates = templates or get_template_registry()
+        self.scheduler = scheduler or get_scheduler()
+        # DALL-E URLs expire after about an hour, so cached image URLs must not outlive them
+        self.image_cache_ttl = float(os.getenv("IMAGE_CACHE_TTL", "3000"))
         self.image_width = 1200
         self.image_height = 800
         self.font_size = 36
         self.line_spacing = 10
         self.margin = 50
+        self.renderer = PageRenderer(
+            self.image_width, self.image_height, self.font_size, self.margin
+        )
+        self._render_pool = render_pool
+        self._narrator = narrator
+        self.image_concurrency = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+        self.image_timeout = float(os.getenv("IMAGE_TIMEOUT", "60"))
 
-    async def generate_story(self, book_type: str, prompts: Dict[str, str]) -> List[Dict]:
+    @instrument("generator", "generate_story")
+    async def generate_story(
+        self, book_type: str, prompts: Dict[str, str], tier: GenerationTier = FULL_TIER
+    ) -> List[Dict]:
         """Generate a story based on the book type and prompts."""
-        if book_type == "children-story":
-            return await self._generate_children_story(prompts)
-        elif book_type == "spouse-roasting":
-            return await self._generate_spouse_roasting(prompts)
-        else:
-            raise ValueError(f"Unknown book type: {book_type}")
-
-    async def _generate_children_story(self, prompts: Dict[str, str]) -> List[Dict]:
-        """Generate a children's story."""
-        story_prompt = f"""Create a children's bedtime story for {prompts['name']}, who is {prompts['age']} years old.
-        The story should be engaging and include elements about {prompts['interests']}.
-        The story should be split into 5-7 pages, with each page being a short paragraph.
-        Make it magical and educational."""
-
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a children's story writer."},
-                {"role": "user", "content": story_prompt}
-            ]
+        system_prompt, story_prompt = self.story_messages(book_type, prompts)
+        return await self._complete_story(system_prompt, story_prompt, model=tier.story_model)
+
+    async def stream_story(
+        self, book_type: str, prompts: Dict[str, str], tier: GenerationTier = FULL_TIER
+    ) -> AsyncIterator[Dict]:
+        """Stream a story, yielding each page as soon as its paragraph is complete."""
+        system_prompt, story_prompt = self.story_messages(book_type, prompts)
+        model = tier.story_model
+        cache_key = make_cache_key(model, system_prompt, story_prompt)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            for page in cached:
+                yield page
+            return
+
+        # Streams can't be shared between callers, so they are admitted but not coalesced
+        estimated_tokens = estimate_tokens(system_prompt + story_prompt) + STORY_COMPLETION_TOKENS
+        response = await self.scheduler.submit(
+            model,
+            None,
+            lambda: openai.ChatCompletion.acreate(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": story_prompt}
+                ],
+                stream=True
+            ),
+            estimated_tokens=estimated_tokens,
         )
 
-        story = response.choices[0].message.content
-        pages = story.split('\n\n')
-        
-        return [{"text": page.strip(), "image_prompt": self._generate_image_prompt(page)} for page in pages]
-
-    async def _generate_spouse_roasting(self, prompts: Dict[str, str]) -> List[Dict]:
-        """Generate a spouse roasting book."""
-        story_prompt = f"""Create a fun, light-hearted roasting book for {prompts['name']}.
-        Include references to {prompts['interests']} and make it humorous but not mean-spirited.
-        The story should be split into 5-7 pages, with each page being a short paragraph.
-        Make it funny and personal."""
-
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a humorous writer."},
-                {"role": "user", "content": story_prompt}
-            ]
+        pages = []
+        buffer = ""
+        story = ""
+        # The scheduler only sees the time to the first chunk; this covers the whole stream.
+        # Started rather than entered, since it stays open across yields to the consumer
+        operation = instrument("generator", "stream_story").start()
+        try:
+            async for chunk in response:
+                content = chunk.choices[0].delta.get("content") or ""
+                story += content
+                buffer += content
+                while "\n\n" in buffer:
+                    page, buffer = buffer.split("\n\n", 1)
+                    if page.strip():
+                        pages.append(self._make_page(page))
+                        yield pages[-1]
+        except BaseException as error:
+            operation.end(error)
+            raise
+        operation.end()
+
+        if buffer.strip():
+            pages.append(self._make_page(buffer))
+            yield pages[-1]
+
+        # Streamed responses carry no usage block, so settle on an estimate
+        self.scheduler.settle(
+            model,
+            estimated_tokens,
+            estimate_tokens(system_prompt + story_prompt),
+            estimate_tokens(story),
+        )
+        await self.cache.set(cache_key, pages)
+
+    def story_messages(self, book_type: str, prompts: Dict[str, str]) -> Tuple[str, str]:
+        """Build the system and user prompts from the book type's compiled template."""
+        return self.templates.get(book_type).render(prompts)
+
+    async def _complete_story(
+        self, system_prompt: str, story_prompt: str, model: str = FULL_TIER.story_model
+    ) -> List[Dict]:
+        """Run a full (non-streaming) completion and split it into pages."""
+        cache_key = make_cache_key(model, system_prompt, story_prompt)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = await self.scheduler.submit(
+            model,
+            cache_key,
+            lambda: openai.ChatCompletion.acreate(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": story_prompt}
+                ]
+            ),
+            estimated_tokens=(
+                estimate_tokens(system_prompt + story_prompt) + STORY_COMPLETION_TOKENS
+            ),
+            usage_of=_chat_usage,
         )
 
         story = response.choices[0].message.content
-        pages = story.split('\n\n')
-        
-        return [{"text": page.strip(), "image_prompt": self._generate_image_prompt(page)} for page in pages]
+        # Blank paragraphs are skipped here as in stream_story, since both fill the same cache key
+        pages = [self._make_page(page) for page in story.split('\n\n') if page.strip()]
+
+        await self.cache.set(cache_key, pages)
+        return pages
+
+    def _make_page(self, text: str) -> Dict:
+        """Build a page dict from a paragraph of story text."""
+        return {"text": text.strip(), "image_prompt": self._generate_image_prompt(text)}
 
     def _generate_image_prompt(self, text: str) -> str:
         """Generate an image prompt based on the text."""
@@ -76,42 +227,139 @@ class BookGenerator:
 
         return prompt
 
-    async def generate_image(self, prompt: str) -> str:
+    @instrument("generator", "generate_image")
+    async def generate_image(self, prompt: str, size: str = "1024x1024") -> str:
         """Generate an image using DALL-E."""
-        response = await openai.Image.acreate(
-            prompt=prompt,
-            n=1,
-            size="1024x1024"
+        cache_key = make_cache_key("dall-e", "", prompt, size=size)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = await self.scheduler.submit(
+            "dall-e",
+            cache_key,
+            lambda: openai.Image.acreate(
+                prompt=prompt,
+                n=1,
+                size=size
+            ),
+            images=1,
         )
 
-        return response.data[0].url
-
-    def create_page_image(self, text: str, image_url: str) -> bytes:
-        """Create a page image with text and background image."""
-        # Create a new image with white background
-        image = Image.new('RGB', (self.image_width, self.image_height), 'white')
-        draw = ImageDraw.Draw(image)
-
-        # Add watermark
-        watermark = "PREVIEW"
-        font = ImageFont.truetype("arial.ttf", 72)
-        watermark_width = draw.textlength(watermark, font=font)
-        watermark_height = 72
-        watermark_x = (self.image_width - watermark_width) // 2
-        watermark_y = (self.image_height - watermark_height) // 2
-        draw.text((watermark_x, watermark_y), watermark, fill=(200, 200, 200, 128), font=font)
-
-        # Add text
-        font = ImageFont.truetype("arial.ttf", self.font_size)
-        wrapped_text = textwrap.fill(text, width=40)
-        draw.text((self.margin, self.margin), wrapped_text, fill='black', font=font)
-
-        # Convert to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        return img_byte_arr.getvalue()
+        image_url = response.data[0].url
+        await self.cache.set(cache_key, image_url, ttl=self.image_cache_ttl)
+        return image_url
+
+    @instrument("generator", "generate_book")
+    async def generate_book(
+        self,
+        book_type: str,
+        prompts: Dict[str, str],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        tier: GenerationTier = FULL_TIER,
+    ) -> List[Dict]:
+        """Generate the story and illustrate its pages concurrently.
+
+        Pages whose illustration fails or times out are still returned, with
+        ``image_url`` set to None and the failure recorded under ``error``.
+        """
+        illustrate = self._illustrator(max_concurrency, timeout, tier)
+
+        # Illustrations start as soon as each page is streamed, so page 1 is
+        # being drawn while later pages are still being written.
+        tasks = []
+        try:
+            async for page in self.stream_story(book_type, prompts, tier):
+                if tier.illustrated_pages is not None and len(tasks) >= tier.illustrated_pages:
+                    tasks.append(asyncio.ensure_future(self._unillustrated(page)))
+                else:
+                    tasks.append(asyncio.ensure_future(illustrate(page)))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return list(await asyncio.gather(*tasks))
+
+    @instrument("generator", "illustrate_pages")
+    async def illustrate_pages(
+        self,
+        pages: List[Dict],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        tier: GenerationTier = FULL_TIER,
+    ) -> List[Dict]:
+        """Illustrate already-generated pages concurrently, keeping partial results.
+
+        Only the tier's first ``illustrated_pages`` pages get an image; the rest
+        are returned without one.
+        """
+        illustrate = self._illustrator(max_concurrency, timeout, tier)
+        limit = len(pages) if tier.illustrated_pages is None else tier.illustrated_pages
+        return list(await asyncio.gather(
+            *(illustrate(page) for page in pages[:limit]),
+            *(self._unillustrated(page) for page in pages[limit:]),
+        ))
+
+    async def _unillustrated(self, page: Dict) -> Dict:
+        return {**page, "image_url": None, "error": None}
+
+    def _illustrator(
+        self,
+        max_concurrency: Optional[int],
+        timeout: Optional[float],
+        tier: GenerationTier = FULL_TIER,
+    ) -> Callable[[Dict], Awaitable[Dict]]:
+        """Build a page illustrator sharing one concurrency limit and per-call timeout."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.image_concurrency)
+        timeout = timeout or self.image_timeout
+
+        async def illustrate(page: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    image_url = await asyncio.wait_for(
+                        self.generate_image(page["image_prompt"], tier.image_size), timeout
+                    )
+                    return {**page, "image_url": image_url, "error": None}
+                except asyncio.TimeoutError:
+                    error = f"Image generation timed out after {timeout}s"
+                    return {**page, "image_url": None, "error": error}
+                except Exception as e:
+                    return {**page, "image_url": None, "error": f"Error generating image: {str(e)}"}
+
+        return illustrate
+
+    @instrument("render", "page")
+    def create_page_image(self, text: str, image: Optional[bytes] = None) -> bytes:
+        """Create a page image with text and, when given, its encoded illustration."""
+        return self.renderer.render(text, image=image)
+
+    async def render_book(
+        self,
+        pages: List[Dict],
+        tier: GenerationTier = FULL_TIER,
+        images: Optional[List[Optional[bytes]]] = None,
+    ) -> List[bytes]:
+        """Render every page of a book in the shared process pool at the tier's size and format.
+
+        ``images`` holds each page's encoded illustration (None for text-only pages).
+        """
+        render_pool = self._render_pool or get_render_pool()
+        with instrument("render", f"book_{tier.name}"):
+            return await render_pool.render_pages(
+                [page["text"] for page in pages],
+                tier.render_format,
+                images,
+                **tier.render_options,
+            )
 
     async def generate_audio(self, text: str, voice_type: str) -> str:
-        """Generate audio narration for the text."""
-        # TODO: Implement text-to-speech using appropriate service
-        pass 
\ No newline at end of file
+        """Generate audio narration for the text, returning the WAV artifact key."""
+        return await self.narrate_book([text], voice_type)
+
+    @instrument("generator", "narrate_book")
+    async def narrate_book(self, pages: List[str], voice_type: str) -> str:
+        """Narrate a book's pages into one WAV artifact, reusing audio for unchanged sentences."""
+        narrator = self._narrator or get_narrator()
+        return await narrator.narrate(pages, voice_type)
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def make_cache_key(model: str, system_prompt: str, user_prompt: str, **params: Any) -> str:
+    """Build a content-addressed key from a normalized model call."""
+    normalized = {
+        "model": model.strip().lower(),
+        "system": " ".join(system_prompt.split()),
+        "user": " ".join(user_prompt.split()),
+        "params": params,
+    }
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    """Base class for cache tiers. Values must be JSON-serializable."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_with_ttl(key))[0]
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """Return (value, seconds until it expires); the TTL is None if it never expires."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _record(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL and a maximum entry count."""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._record(None), None
+        value, expires_at = entry
+        now = time.monotonic()
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            return self._record(None), None
+        self._entries.move_to_end(key)
+        return self._record(value), expires_at - now if expires_at is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class DiskCache(CacheBackend):
+    """On-disk cache storing one JSON file per key, evicting oldest files past max_entries.
+
+    The entry count is taken from one directory scan and then tracked as files
+    are written and removed, so writes don't rescan the directory.
+    """
+
+    def __init__(
+        self, directory: str, max_entries: int = 10000, default_ttl: Optional[float] = None
+    ):
+        super().__init__()
+        self.directory = directory
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: Optional[int] = None  # counted on the first write
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if entry["expires_at"] is None:
+            return entry["value"], None
+        remaining = entry["expires_at"] - time.time()
+        if remaining <= 0:
+            self._remove(key)
+            return None, None
+        return entry["value"], remaining
+
+    def _write(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        tmp_path = f"{self._path(key)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"value": value, "expires_at": expires_at}, f)
+        created = not os.path.exists(self._path(key))
+        os.replace(tmp_path, self._path(key))
+        if created:
+            self._track(1)
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        self._track(-1)
+
+    def _track(self, change: int) -> None:
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._scan_count()
+            else:
+                self._entries += change
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _scan_count(self) -> int:
+        return sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json"))
+
+    def _evict(self) -> None:
+        """Remove the oldest files down to 90% of max_entries.
+
+        The headroom means a full cache rescans once per batch of new entries
+        rather than on every write. The scan also corrects the tracked count
+        for files other processes wrote or removed.
+        """
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        keep = int(self.max_entries * 0.9)
+        self._entries = len(entries)
+        if len(entries) <= keep:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[: len(entries) - keep]:
+            try:
+                os.remove(entry.path)
+                self._entries -= 1
+            except OSError:
+                pass
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        value, ttl = await asyncio.to_thread(self._read, key)
+        return self._record(value), ttl
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        await asyncio.to_thread(self._write, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, key)
+
+
+class RedisCache(CacheBackend):
+    """Redis-backed cache tier. Eviction is left to Redis (TTL plus maxmemory policy)."""
+
+    def __init__(
+        self, url: str, prefix: str = "memorymaker:cache:", default_ttl: Optional[float] = None
+    ):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RedisCache requires the 'redis' package to be installed")
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            raw, pttl = await pipe.get(self.prefix + key).pttl(self.prefix + key).execute()
+        if raw is None:
+            return self._record(None), None
+        # PTTL is -1 for keys without an expiry
+        return self._record(json.loads(raw)), pttl / 1000 if pttl >= 0 else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        await self.client.set(
+            self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl is not None else None
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+class TieredCache(CacheBackend):
+    """Checks a fast local tier first, then a shared tier, promoting shared hits locally.
+
+    Promoted entries keep the shared entry's remaining TTL, so short-lived values
+    such as expiring image URLs are not served locally past their expiry.
+    """
+
+    def __init__(self, local: CacheBackend, shared: Optional[CacheBackend] = None):
+        super().__init__()
+        self.local = local
+        self.shared = shared
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        value, ttl = await self.local.get_with_ttl(key)
+        if value is None and self.shared is not None:
+            value, ttl = await self.shared.get_with_ttl(key)
+            if value is not None:
+                await self.local.set(key, value, ttl)
+        return self._record(value), ttl
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.local.set(key, value, ttl)
+        if self.shared is not None:
+            await self.shared.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {**super().stats(), "local": self.local.stats()}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+def create_cache_from_env() -> CacheBackend:
+    """Build the generation cache from CACHE_* settings (and REDIS_URL for the redis tier)."""
+    ttl = float(os.getenv("CACHE_TTL", "86400"))
+    local = MemoryCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")), default_ttl=ttl)
+
+    backend = os.getenv("CACHE_BACKEND", "memory")
+    if backend == "memory":
+        shared = None
+    elif backend == "disk":
+        shared = DiskCache(os.getenv("CACHE_DIR", ".cache/generation"), default_ttl=ttl)
+    elif backend == "redis":
+        shared = RedisCache(os.getenv("REDIS_URL", "redis://localhost:6379"), default_ttl=ttl)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+
+    return TieredCache(local, shared)
+
+
+_default_cache: Optional[CacheBackend] = None
+
+
+def get_default_cache() -> CacheBackend:
+    """Return the process-wide generation cache, creating it on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = create_cache_from_env()
+    return _default_cache
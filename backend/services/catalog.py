@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from models import BookType
+from services.templates import prompt_fields
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "book_types_changed"
+
+
+def serialize_book_type(book_type: BookType, include_template: bool = False) -> Dict:
+    """A book type as customers see it: ``prompts`` is only the list of field labels.
+
+    System prompts and story templates are only included for admin responses.
+    """
+    serialized = {
+        "id": book_type.id,
+        "name": book_type.name,
+        "description": book_type.description,
+        "price": book_type.price,
+        "preview_price": book_type.preview_price,
+        "prompts": prompt_fields(book_type.prompts),
+    }
+    if include_template:
+        serialized["is_active"] = book_type.is_active
+        serialized["template"] = book_type.prompts if isinstance(book_type.prompts, dict) else None
+    return serialized
+
+
+class CatalogSnapshot:
+    """The serialized catalog body together with its ETag."""
+
+    def __init__(self, book_types: List[Dict]):
+        self.book_types = book_types
+        self.body = json.dumps({"book_types": book_types}, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.loaded_at = time.monotonic()
+
+
+class BookTypeCatalog:
+    """Read-through, in-process cache of the active book types.
+
+    The first request after startup or an invalidation loads the table once;
+    everything else is served from the pre-serialized snapshot. A TTL bounds
+    staleness in case an invalidation message is ever missed.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOG_TTL", "300"))
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+        # Bumped by every invalidation, so a reload that raced one is not cached
+        self._generation = 0
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+            return snapshot
+        async with self._lock:
+            # Another request may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.loaded_at >= self.ttl:
+                generation = self._generation
+                result = await db.execute(
+                    select(BookType).where(BookType.is_active.is_(True)).order_by(BookType.id)
+                )
+                snapshot = CatalogSnapshot([serialize_book_type(row) for row in result.scalars()])
+                # An invalidation during the query may mean it read the old rows; serve them
+                # to this request only and let the next one load again
+                if generation == self._generation:
+                    self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+
+
+class InvalidationBus:
+    """Broadcasts catalog changes to every API worker. The base class only reaches this process."""
+
+    def __init__(self, on_invalidate: Callable[[], None]):
+        self.on_invalidate = on_invalidate
+
+    async def prepare(self, db: AsyncSession) -> None:
+        """Called inside the admin write's transaction, before it commits."""
+
+    async def publish(self) -> None:
+        """Called after the admin write has committed."""
+        self.on_invalidate()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Fans invalidations out over a Redis pub/sub channel."""
+
+    def __init__(self, on_invalidate: Callable[[], None], url: str):
+        super().__init__(on_invalidate)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RedisInvalidationBus requires the 'redis' package to be installed")
+
+        self.client = redis.from_url(url)
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self) -> None:
+        self.on_invalidate()
+        await self.client.publish(INVALIDATION_CHANNEL, "1")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything may have changed while we were disconnected
+                self.on_invalidate()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.on_invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog invalidation listener lost its Redis connection")
+                await asyncio.sleep(1)
+
+
+class PostgresInvalidationBus(InvalidationBus):
+    """Uses Postgres LISTEN/NOTIFY; the NOTIFY rides the admin write's transaction."""
+
+    def __init__(self, on_invalidate: Callable[[], None], url: str):
+        super().__init__(on_invalidate)
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._connection = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def prepare(self, db: AsyncSession) -> None:
+        """Queue a NOTIFY on the write's session; Postgres delivers it only if the write commits."""
+        await db.execute(text("SELECT pg_notify(:channel, '1')"), {"channel": INVALIDATION_CHANNEL})
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._connection is not None:
+            await self._connection.close()
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        while True:
+            try:
+                self._connection = await asyncpg.connect(self.dsn)
+                await self._connection.add_listener(
+                    INVALIDATION_CHANNEL, lambda *args: self.on_invalidate()
+                )
+                self.on_invalidate()
+                while not self._connection.is_closed():
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog invalidation listener lost its Postgres connection")
+                await asyncio.sleep(1)
+
+
+def create_invalidation_bus_from_env(on_invalidate: Callable[[], None]) -> InvalidationBus:
+    """Build the bus selected by CATALOG_INVALIDATION (local, redis or postgres).
+
+    ``on_invalidate`` runs in every worker whenever the book types change.
+    """
+    backend = os.getenv("CATALOG_INVALIDATION", "local")
+    if backend == "local":
+        return InvalidationBus(on_invalidate)
+    elif backend == "redis":
+        return RedisInvalidationBus(on_invalidate, os.getenv("REDIS_URL", "redis://localhost:6379"))
+    elif backend == "postgres":
+        from database import SQLALCHEMY_DATABASE_URL
+
+        return PostgresInvalidationBus(on_invalidate, SQLALCHEMY_DATABASE_URL)
+    else:
+        raise ValueError(f"Unknown catalog invalidation backend: {backend}")
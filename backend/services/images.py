@@ -0,0 +1,161 @@
+import io
+import os
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+import httpx
+from PIL import Image
+from dotenv import load_dotenv
+
+from services.instrumentation import instrument
+from services.renderer import RenderPool, get_render_pool
+from services.storage import ArtifactStore, get_artifact_store
+
+load_dotenv()
+
+# Print is laid out at 300 DPI; illustrations span PRINT_IMAGE_INCHES of the page width
+PRINT_DPI = 300
+PRINT_IMAGE_INCHES = float(os.getenv("PRINT_IMAGE_INCHES", "8"))
+
+
+class ImageVariant:
+    """One stored rendition of an illustration."""
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        format: str,
+        extension: str,
+        mode: str = "RGB",
+        upscale: bool = False,
+        **save_options: Any,
+    ) -> None:
+        self.name = name
+        self.max_size = max_size  # longest side in pixels
+        self.upscale = upscale  # enlarge smaller sources to max_size rather than keeping their size
+        self.format = format
+        self.extension = extension
+        self.mode = mode
+        self.save_options = save_options
+
+
+THUMBNAIL = ImageVariant("thumbnail", 256, "WEBP", ".webp", quality=70, method=4)
+WEB = ImageVariant("web", 1024, "WEBP", ".webp", quality=82, method=4)
+PRINT = ImageVariant(
+    "print", int(PRINT_IMAGE_INCHES * PRINT_DPI), "JPEG", ".jpg", mode="CMYK", upscale=True,
+    quality=95, dpi=(PRINT_DPI, PRINT_DPI), subsampling=0,
+)
+
+# Largest first, so each smaller variant is downscaled from the one before it rather
+# than from the full decode
+VARIANTS: Dict[str, ImageVariant] = {variant.name: variant for variant in (PRINT, WEB, THUMBNAIL)}
+
+# Previews are 256px and never printed, so they only get the screen renditions
+PREVIEW_VARIANTS = ("web", "thumbnail")
+FULL_VARIANTS = ("print", "web", "thumbnail")
+
+
+def make_variants(data: bytes, names: Sequence[str]) -> Dict[str, bytes]:
+    """Decode an image once and encode every requested variant from it.
+
+    Runs in the render pool's worker processes.
+    """
+    source = Image.open(io.BytesIO(data)).convert("RGB")
+    encoded = {}
+    for variant in VARIANTS.values():
+        if variant.name not in names:
+            continue
+        image = source
+        scale = variant.max_size / max(source.size)
+        if scale < 1 or (scale > 1 and variant.upscale):
+            size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+            image = source.resize(size, Image.LANCZOS)
+        if scale < 1:
+            # Upscaled images never feed the smaller variants, which would only lose detail
+            source = image
+        output = io.BytesIO()
+        image.convert(variant.mode).save(output, format=variant.format, **variant.save_options)
+        encoded[variant.name] = output.getvalue()
+    return encoded
+
+
+_download_client: Optional[httpx.AsyncClient] = None
+
+
+def get_download_client() -> httpx.AsyncClient:
+    """Return the process-wide keep-alive client used to fetch generated images."""
+    global _download_client
+    if _download_client is None or _download_client.is_closed:
+        _download_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30")), connect=5),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("IMAGE_DOWNLOAD_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("IMAGE_DOWNLOAD_MAX_KEEPALIVE", "10")),
+            ),
+            follow_redirects=True,
+        )
+    return _download_client
+
+
+async def close_download_client() -> None:
+    global _download_client
+    if _download_client is not None:
+        await _download_client.aclose()
+        _download_client = None
+
+
+class ImageIngestor:
+    """Downloads generated illustrations before their URLs expire and stores their variants.
+
+    Each image is fetched once over the pooled client, decoded once in the render
+    pool, and every variant is stored under its content hash, so identical
+    images share artifacts.
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        store: Optional[ArtifactStore] = None,
+        render_pool: Optional[RenderPool] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self._client = client
+        self.store = store or get_artifact_store()
+        self._render_pool = render_pool
+        self.concurrency = concurrency or int(os.getenv("IMAGE_INGEST_CONCURRENCY", "8"))
+
+    @instrument("images", "download")
+    async def download(self, url: str) -> bytes:
+        response = await (self._client or get_download_client()).get(url)
+        response.raise_for_status()
+        return response.content
+
+    async def ingest(self, url: str, variants: Sequence[str] = FULL_VARIANTS) -> Dict[str, str]:
+        """Fetch one image and return its variant name -> artifact key."""
+        data = await self.download(url)
+        render_pool = self._render_pool or get_render_pool()
+        with instrument("images", "variants"):
+            encoded = await render_pool.submit(make_variants, data, tuple(variants))
+        keys = await asyncio.gather(
+            *(self.store.put(image, VARIANTS[name].extension) for name, image in encoded.items())
+        )
+        return dict(zip(encoded, keys))
+
+    async def ingest_pages(
+        self, pages: List[Dict], variants: Sequence[str] = FULL_VARIANTS
+    ) -> List[Dict]:
+        """Ingest every illustrated page concurrently, recording failures on the page."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def ingest_page(page: Dict) -> Dict:
+            if not page.get("image_url"):
+                return {**page, "image_variants": None}
+            async with semaphore:
+                try:
+                    stored = await self.ingest(page["image_url"], variants)
+                    return {**page, "image_variants": stored}
+                except Exception as e:
+                    error = f"Error ingesting image: {str(e)}"
+                    return {**page, "image_variants": None, "error": error}
+
+        return list(await asyncio.gather(*(ingest_page(page) for page in pages)))
@@ -0,0 +1,282 @@
+import os
+import time
+import bisect
+import functools
+import inspect
+import threading
+import contextvars
+from types import TracebackType
+from typing import Any, Callable, Dict, Optional, Tuple, Type, Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Timing is on by default; it costs a lock and a perf_counter pair per call.
+# With METRICS_ENABLED=false decorators return the function untouched and
+# instrument() hands back a shared no-op.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+# OpenTelemetry spans are opened by instrument() too, so they also need metrics
+# enabled, plus opentelemetry-api and an SDK/exporter configured
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+METRIC_PREFIX = "memorymaker"
+
+# Seconds; wide enough for both a page render and a slow DALL-E call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# The book being generated, attached to every span so a slow book can be traced end to end
+current_book_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "current_book_id", default=None
+)
+
+
+class OperationStats:
+    """Latency histogram, in-flight count and errors by type for one (component, operation)."""
+
+    __slots__ = ("bucket_counts", "count", "total_seconds", "in_flight", "errors")
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * (bucket_count + 1)  # the last slot is +Inf
+        self.count = 0
+        self.total_seconds = 0.0
+        self.in_flight = 0
+        self.errors: Dict[str, int] = {}
+
+
+class MetricsRegistry:
+    """In-process store of operation metrics, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._operations: Dict[Tuple[str, str], OperationStats] = {}
+        self._lock = threading.Lock()
+
+    def started(self, component: str, operation: str) -> OperationStats:
+        with self._lock:
+            stats = self._operations.get((component, operation))
+            if stats is None:
+                stats = self._operations[(component, operation)] = OperationStats(len(self.buckets))
+            stats.in_flight += 1
+        return stats
+
+    def finished(self, stats: OperationStats, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            stats.in_flight -= 1
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            if error is not None:
+                stats.errors[error] = stats.errors.get(error, 0) + 1
+
+    def snapshot(self) -> Dict[Tuple[str, str], Dict]:
+        with self._lock:
+            return {
+                key: {
+                    "bucket_counts": list(stats.bucket_counts),
+                    "count": stats.count,
+                    "total_seconds": stats.total_seconds,
+                    "in_flight": stats.in_flight,
+                    "errors": dict(stats.errors),
+                }
+                for key, stats in self._operations.items()
+            }
+
+    def render(self) -> str:
+        duration = f"{METRIC_PREFIX}_operation_duration_seconds"
+        in_flight = f"{METRIC_PREFIX}_operations_in_flight"
+        errors = f"{METRIC_PREFIX}_operation_errors_total"
+        snapshot = sorted(self.snapshot().items())
+
+        lines = [
+            f"# HELP {duration} Latency of external calls and render steps.",
+            f"# TYPE {duration} histogram",
+        ]
+        for (component, operation), stats in snapshot:
+            labels = f'component="{_escape(component)}",operation="{_escape(operation)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), stats["bucket_counts"]):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{duration}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{duration}_sum{{{labels}}} {stats['total_seconds']!r}")
+            lines.append(f"{duration}_count{{{labels}}} {stats['count']}")
+
+        lines += [f"# HELP {in_flight} Calls currently in progress.", f"# TYPE {in_flight} gauge"]
+        for (component, operation), stats in snapshot:
+            labels = f'component="{_escape(component)}",operation="{_escape(operation)}"'
+            lines.append(f"{in_flight}{{{labels}}} {stats['in_flight']}")
+
+        lines += [
+            f"# HELP {errors} Calls that raised, by exception type.",
+            f"# TYPE {errors} counter",
+        ]
+        for (component, operation), stats in snapshot:
+            for error, count in sorted(stats["errors"].items()):
+                labels = (
+                    f'component="{_escape(component)}",operation="{_escape(operation)}",'
+                    f'error="{_escape(error)}"'
+                )
+                lines.append(f"{errors}{{{labels}}} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def render_metrics() -> str:
+    """The process's operation metrics in the Prometheus text exposition format."""
+    return _registry.render()
+
+
+_tracer = None
+
+
+def _get_tracer() -> Any:
+    global _tracer
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "TRACING_ENABLED requires the 'opentelemetry-api' package to be installed"
+            )
+        _tracer = trace.get_tracer(METRIC_PREFIX)
+    return _tracer
+
+
+class _Operation:
+    """Times one call: a context manager, or a decorator that times every call of a function."""
+
+    __slots__ = ("component", "operation", "_stats", "_start", "_span")
+
+    def __init__(self, component: str, operation: str):
+        self.component = component
+        self.operation = operation
+        self._span: Any = None
+
+    def _span_attributes(self) -> Dict[str, Any]:
+        attributes: Dict[str, Any] = {"component": self.component, "operation": self.operation}
+        book_id = current_book_id.get()
+        if book_id is not None:
+            attributes["book.id"] = book_id
+        return attributes
+
+    def __enter__(self) -> "_Operation":
+        if TRACING_ENABLED:
+            self._span = _get_tracer().start_as_current_span(
+                f"{self.component}.{self.operation}", attributes=self._span_attributes()
+            )
+            self._span.__enter__()
+        self._stats = _registry.started(self.component, self.operation)
+        self._start = time.perf_counter()
+        return self
+
+    def start(self) -> "_Operation":
+        """Start timing without entering a context; finish with end().
+
+        For work that spans yields, such as an async generator: a ``with`` block
+        there would attach the span to the context on one resumption and detach
+        it on another. The span is a child of the current one but never becomes
+        current itself.
+        """
+        if TRACING_ENABLED:
+            self._span = _get_tracer().start_span(
+                f"{self.component}.{self.operation}", attributes=self._span_attributes()
+            )
+        self._stats = _registry.started(self.component, self.operation)
+        self._start = time.perf_counter()
+        return self
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Finish a start()ed operation.
+
+        GeneratorExit only means the consumer stopped early, so it isn't counted as an error.
+        """
+        if isinstance(error, GeneratorExit):
+            error = None
+        error_name = type(error).__name__ if error is not None else None
+        _registry.finished(self._stats, time.perf_counter() - self._start, error_name)
+        if self._span is not None:
+            if error is not None:
+                from opentelemetry.trace import Status, StatusCode
+
+                self._span.record_exception(error)
+                self._span.set_status(Status(StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+            self._span.end()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        error_name = exc_type.__name__ if exc_type is not None else None
+        _registry.finished(self._stats, time.perf_counter() - self._start, error_name)
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+
+    def __call__(self, func: Callable) -> Callable:
+        component, operation = self.component, self.operation
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with _Operation(component, operation):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with _Operation(component, operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class _NoOperation:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoOperation":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        pass
+
+    def start(self) -> "_NoOperation":
+        return self
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __call__(self, func: Callable) -> Callable:
+        return func
+
+
+_NO_OPERATION = _NoOperation()
+
+
+def instrument(component: str, operation: str) -> Union[_Operation, _NoOperation]:
+    """Time a call to ``component`` (e.g. "openai", "stripe", "render") as ``operation``.
+
+    Use as ``with instrument("openai", model): ...`` or as a decorator on a sync
+    or async function. Each call feeds the latency histogram, in-flight gauge and
+    error counter, and becomes a span tagged with the current book when tracing is on.
+    """
+    if not METRICS_ENABLED:
+        return _NO_OPERATION
+    return _Operation(component, operation)
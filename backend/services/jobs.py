@@ -0,0 +1,624 @@
+import os
+import json
+import random
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import ColumnElement, and_, or_
+from sqlalchemy.orm import sessionmaker, undefer
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from models import Book, BookPage
+from services.book_generator import FULL_TIER, PREVIEW_TIER, BookGenerator, GenerationTier
+from services.images import FULL_VARIANTS, PREVIEW_VARIANTS, ImageIngestor
+from services.instrumentation import current_book_id, instrument
+from services.pdf import assemble_book_pdf
+from services.scheduler import (
+    PRIORITY_PAID,
+    PRIORITY_PREVIEW,
+    Usage,
+    current_usage,
+    generation_priority,
+)
+from services.storage import ArtifactStore, get_artifact_store
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Book.status values owned by the generation pipeline
+QUEUED = "queued"
+GENERATING_STORY = "generating_story"
+GENERATING_IMAGES = "generating_images"
+INGESTING_IMAGES = "ingesting_images"
+RENDERING = "rendering"
+ASSEMBLING_PDF = "assembling_pdf"
+COMPLETED = "preview"
+PURCHASED = "purchased"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATUSES = {COMPLETED, PURCHASED, FAILED, CANCELLED}
+ACTIVE_STATUSES = [
+    QUEUED, GENERATING_STORY, GENERATING_IMAGES, INGESTING_IMAGES, RENDERING, ASSEMBLING_PDF
+]
+
+# A worker leases the book it generates and renews the lease while it runs, so a
+# book is generated by one worker at a time and a crashed worker's books are picked
+# up again once their lease lapses
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# How long a Redis queue entry keeps later enqueues of the same book out; it is
+# cleared when a worker takes the entry and only expires if that worker dies first
+JOB_PENDING_SECONDS = int(os.getenv("JOB_PENDING_SECONDS", "3600"))
+
+
+PAGE_FIELDS = ("text", "image_prompt", "image_url", "image_variants", "page_image", "error")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def tier_for(book: Book) -> GenerationTier:
+    """Paid books are generated at full quality; everything else gets the cheap preview."""
+    return FULL_TIER if book.price_paid else PREVIEW_TIER
+
+
+def page_to_dict(row: BookPage) -> Dict:
+    """The plain-dict page shape the generator and renderer work with."""
+    page = {"page_number": row.page_number}
+    for field in PAGE_FIELDS:
+        page[field] = getattr(row, field)
+    return page
+
+
+class BookJobRunner:
+    """Runs a queued book through the generation stages, persisting progress on Book.status.
+
+    Each stage reads the book's pages, does its work and writes the changed pages
+    back as book_pages rows before the next status is recorded, so a job picked up
+    again after a crash resumes from the last completed stage.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        generator: Optional[BookGenerator] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        store: Optional[ArtifactStore] = None,
+        ingestor: Optional[ImageIngestor] = None,
+    ):
+        self.session_factory = session_factory
+        self.generator = generator or BookGenerator()
+        self.store = store or get_artifact_store()
+        self.ingestor = ingestor or ImageIngestor(store=self.store)
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.backoff_base = backoff_base or float(os.getenv("JOB_BACKOFF_BASE", "2"))
+        self.stages: List[Tuple[str, Callable[[Book, List[Dict]], Awaitable[List[Dict]]]]] = [
+            (GENERATING_STORY, self._generate_story),
+            (GENERATING_IMAGES, self._generate_images),
+            (INGESTING_IMAGES, self._ingest_images),
+            (RENDERING, self._render_pages),
+            (ASSEMBLING_PDF, self._assemble_pdf),
+        ]
+
+    async def run(self, book_id: int) -> str:
+        """Run all remaining stages for a book, retrying failed stages with backoff.
+
+        The caller must hold the book's lease (see ``claim_job``); it is renewed
+        while the stages run and released with the final status.
+        """
+        book = await self._load(book_id)
+        # Books already paid for jump ahead of free previews for OpenAI capacity
+        generation_priority.set(PRIORITY_PAID if book.price_paid else PRIORITY_PREVIEW)
+        current_usage.set(Usage())
+        current_book_id.set(book_id)
+        heartbeat = asyncio.create_task(self._renew_lease(book_id))
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    await self._run_stages(book_id)
+                    paid = tier_for(await self._load(book_id)) is FULL_TIER
+                    status = PURCHASED if paid else COMPLETED
+                    await self._update(
+                        book_id, status=status, generation_error=None, lease_expires_at=None
+                    )
+                    return status
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning("Book %s generation attempt %s failed: %s", book_id, attempt, e)
+                    await self._update(
+                        book_id, generation_attempts=attempt, generation_error=str(e)
+                    )
+                    if attempt < self.max_attempts:
+                        # Exponential backoff with full jitter, so retries don't stampede providers
+                        await asyncio.sleep(random.uniform(0, self.backoff_base ** attempt))
+            await self._update(book_id, status=FAILED, lease_expires_at=None)
+            return FAILED
+        except JobCancelled:
+            return CANCELLED
+        finally:
+            heartbeat.cancel()
+
+    async def _renew_lease(self, book_id: int) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(renew_lease, book_id, self.session_factory)
+            except Exception:
+                logger.exception("Could not renew the lease on book %s", book_id)
+
+    async def _run_stages(self, book_id: int) -> None:
+        book = await self._load(book_id)
+        completed = [status for status, _ in self.stages]
+        # Resume after the last stage whose output was persisted
+        start = completed.index(book.status) if book.status in completed else 0
+        for status, stage in self.stages[start:]:
+            book = await self._load(book_id)
+            if book.status == CANCELLED:
+                raise JobCancelled()
+            await self._update(book_id, status=status)
+            pages = await self._load_pages(book_id)
+            try:
+                with instrument("job", status):
+                    pages = await stage(book, pages)
+            finally:
+                # Tokens spent by a failed stage were still billed
+                await self._charge_usage(book_id)
+            await self._save_pages(book_id, pages)
+
+    async def rerun_stage(self, book_id: int, status: str) -> None:
+        """Run one stage again for a book, e.g. re-rendering every page after a template change.
+
+        The book's status is left alone; only the stage's page output is replaced.
+        The story stage keeps existing pages, so only later stages are worth re-running.
+        """
+        stage = dict(self.stages)[status]
+        generation_priority.set(PRIORITY_PREVIEW)  # backfills never jump ahead of live books
+        current_usage.set(Usage())
+        current_book_id.set(book_id)
+        book = await self._load(book_id)
+        pages = await self._load_pages(book_id)
+        try:
+            with instrument("job", status):
+                pages = await stage(book, pages)
+        finally:
+            await self._charge_usage(book_id)
+        await self._save_pages(book_id, pages)
+
+    async def _generate_story(self, book: Book, pages: List[Dict]) -> List[Dict]:
+        if pages:
+            # A preview being upgraded (or a re-queued book) keeps the story it already has
+            return pages
+        template = self.generator.templates.for_book_type(book.book_type)
+        story = await self.generator.generate_story(
+            template.key, book.prompts or {}, tier_for(book)
+        )
+        # A fresh story invalidates any illustrations left over from an earlier attempt
+        return [
+            {
+                **page,
+                "page_number": number,
+                "image_url": None,
+                "image_variants": None,
+                "page_image": None,
+                "error": None,
+            }
+            for number, page in enumerate(story, start=1)
+        ]
+
+    async def _generate_images(self, book: Book, pages: List[Dict]) -> List[Dict]:
+        return await self.generator.illustrate_pages(pages, tier=tier_for(book))
+
+    async def _ingest_images(self, book: Book, pages: List[Dict]) -> List[Dict]:
+        # DALL-E URLs expire within the hour, so the images are copied into the store straight away
+        variants = FULL_VARIANTS if tier_for(book) is FULL_TIER else PREVIEW_VARIANTS
+        return await self.ingestor.ingest_pages(pages, variants)
+
+    async def _render_pages(self, book: Book, pages: List[Dict]) -> List[Dict]:
+        tier = tier_for(book)
+        # Pages are rendered with the web-sized copy of their stored illustration
+        illustrations = await asyncio.gather(*(self._illustration(page, "web") for page in pages))
+        images = await self.generator.render_book(pages, tier, illustrations)
+        keys = await asyncio.gather(
+            *(self.store.put(image, tier.render_extension) for image in images)
+        )
+        return [{**page, "page_image": key} for page, key in zip(pages, keys)]
+
+    async def _illustration(self, page: Dict, variant: str) -> Optional[bytes]:
+        key = (page.get("image_variants") or {}).get(variant)
+        return await self.store.get(key) if key else None
+
+    async def _assemble_pdf(self, book: Book, pages: List[Dict]) -> List[Dict]:
+        """Store the print PDF of a paid book on Book.print_file; previews are never printed."""
+        if tier_for(book) is not FULL_TIER:
+            return pages
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.pdf")
+            await assemble_book_pdf(pages, self.store, path)
+            key = await self.store.put_file(path, ".pdf")
+        await self._update(book.id, print_file=key)
+        return pages
+
+    async def _charge_usage(self, book_id: int) -> None:
+        usage = current_usage.get()
+        if usage is None or not (usage.prompt_tokens or usage.completion_tokens or usage.images):
+            return
+        charged = usage.as_dict()
+        usage.reset()
+
+        def charge() -> None:
+            with self.session_factory() as db:
+                db.query(Book).filter(Book.id == book_id).update(
+                    {
+                        Book.prompt_tokens: Book.prompt_tokens + charged["prompt_tokens"],
+                        Book.completion_tokens: (
+                            Book.completion_tokens + charged["completion_tokens"]
+                        ),
+                        Book.images_generated: Book.images_generated + charged["images"],
+                        Book.generation_cost: Book.generation_cost + charged["cost"],
+                    },
+                    synchronize_session=False,
+                )
+                db.commit()
+
+        await asyncio.to_thread(charge)
+
+    async def _load(self, book_id: int) -> Book:
+        def load() -> Book:
+            with self.session_factory() as db:
+                book = db.get(Book, book_id)
+                if book is None:
+                    raise ValueError(f"Book {book_id} not found")
+                book.book_type  # load before the session closes
+                db.expunge(book)
+                return book
+
+        return await asyncio.to_thread(load)
+
+    async def _load_pages(self, book_id: int) -> List[Dict]:
+        def load() -> List[Dict]:
+            with self.session_factory() as db:
+                rows = (
+                    db.query(BookPage)
+                    .options(undefer(BookPage.text), undefer(BookPage.image_prompt))
+                    .filter(BookPage.book_id == book_id)
+                    .order_by(BookPage.page_number)
+                    .all()
+                )
+                return [page_to_dict(row) for row in rows]
+
+        return await asyncio.to_thread(load)
+
+    async def _save_pages(self, book_id: int, pages: List[Dict]) -> None:
+        """Upsert one book_pages row per page, removing pages the stage dropped."""
+        def save() -> None:
+            with self.session_factory() as db:
+                existing = {
+                    row.page_number: row
+                    for row in db.query(BookPage).filter(BookPage.book_id == book_id)
+                }
+                for page in pages:
+                    row = existing.pop(page["page_number"], None)
+                    if row is None:
+                        row = BookPage(book_id=book_id, page_number=page["page_number"])
+                        db.add(row)
+                    for field in PAGE_FIELDS:
+                        if field in page:
+                            setattr(row, field, page[field])
+                for row in existing.values():
+                    db.delete(row)
+                db.commit()
+
+        await asyncio.to_thread(save)
+
+    async def _update(self, book_id: int, **fields: Any) -> None:
+        def update() -> None:
+            with self.session_factory() as db:
+                # Never overwrite a cancellation that landed while a stage was running
+                query = db.query(Book).filter(Book.id == book_id, Book.status != CANCELLED)
+                if query.update(fields, synchronize_session=False) == 0 and "status" in fields:
+                    raise JobCancelled()
+                db.commit()
+
+        await asyncio.to_thread(update)
+
+
+class JobQueue:
+    """Base class for book generation queues."""
+
+    def __init__(self, runner: BookJobRunner):
+        self.runner = runner
+
+    async def enqueue(self, book_id: int) -> None:
+        """Queue a book for generation; a book already waiting on this queue isn't added again."""
+        raise NotImplementedError
+
+    async def cancel(self, book_id: int) -> None:
+        """Stop a job. Status is flipped by the caller; runners notice between stages."""
+
+    async def start(self, workers: int = 1) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+    async def _recover(self) -> None:
+        """Periodically re-enqueue books that no worker holds a lease on.
+
+        That includes every queued book, so queues skip books they already hold.
+        Every process may run this; workers claim a book before running it, so a
+        book enqueued by several processes is still generated only once.
+        """
+        while True:
+            try:
+                for book_id in await asyncio.to_thread(recover_jobs, self.runner.session_factory):
+                    await self.enqueue(book_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job recovery failed")
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+
+    async def _run_claimed(self, book_id: int) -> None:
+        """Run a book if its lease can be claimed; otherwise another worker has it."""
+        if await asyncio.to_thread(claim_job, book_id, self.runner.session_factory) is None:
+            return
+        await self.runner.run(book_id)
+
+
+class InProcessJobQueue(JobQueue):
+    """Runs jobs on asyncio tasks inside the API process."""
+
+    def __init__(self, runner: BookJobRunner):
+        super().__init__(runner)
+        self._queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}
+        self._cancelled: Set[int] = set()
+        self._pending: Set[int] = set()
+
+    async def enqueue(self, book_id: int) -> None:
+        if book_id in self._pending or book_id in self._running:
+            return
+        self._pending.add(book_id)
+        self._queue.put_nowait(book_id)
+
+    async def cancel(self, book_id: int) -> None:
+        task = self._running.get(book_id)
+        if task is not None:
+            self._cancelled.add(book_id)
+            task.cancel()
+
+    async def start(self, workers: int = 1) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+        self._workers.append(asyncio.create_task(self._recover()))
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            book_id = await self._queue.get()
+            self._pending.discard(book_id)
+            task = asyncio.create_task(self._run_claimed(book_id))
+            self._running[book_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if book_id not in self._cancelled:
+                    raise
+            except Exception:
+                logger.exception("Book %s generation crashed", book_id)
+            finally:
+                self._running.pop(book_id, None)
+                self._cancelled.discard(book_id)
+                self._queue.task_done()
+
+
+# Push a book only if no entry for it is pending, atomically with marking it pending
+_ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[2], '1', 'NX', 'EX', ARGV[2]) then
+    redis.call('LPUSH', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """Pushes book ids onto a Redis list consumed by separate worker processes.
+
+    Each entry has a pending marker key, so a book is on the list at most once
+    however many processes re-enqueue it.
+    """
+
+    def __init__(self, runner: BookJobRunner, url: str, key: str = "memorymaker:jobs"):
+        super().__init__(runner)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RedisJobQueue requires the 'redis' package to be installed")
+
+        self.client = redis.from_url(url)
+        self.key = key
+        self._workers: List[asyncio.Task] = []
+        self._enqueue = self.client.register_script(_ENQUEUE_SCRIPT)
+
+    def _pending_key(self, book_id: int) -> str:
+        return f"{self.key}:pending:{book_id}"
+
+    async def enqueue(self, book_id: int) -> None:
+        await self._enqueue(
+            keys=[self.key, self._pending_key(book_id)],
+            args=[json.dumps({"book_id": book_id}), JOB_PENDING_SECONDS],
+        )
+
+    async def start(self, workers: int = 1) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+        self._workers.append(asyncio.create_task(self._recover()))
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            _, raw = await self.client.brpop(self.key)
+            book_id = json.loads(raw)["book_id"]
+            await self.client.delete(self._pending_key(book_id))
+            try:
+                await self._run_claimed(book_id)
+            except Exception:
+                logger.exception("Book %s generation crashed", book_id)
+
+
+class DatabaseJobQueue(JobQueue):
+    """Uses the books table itself as the queue, claiming rows with SKIP LOCKED (Postgres).
+
+    Queued books and books whose lease lapsed are claimed alike, so no separate
+    recovery is needed.
+    """
+
+    def __init__(self, runner: BookJobRunner, poll_interval: float = 1.0):
+        super().__init__(runner)
+        self.poll_interval = poll_interval
+        self._workers: List[asyncio.Task] = []
+
+    async def enqueue(self, book_id: int) -> None:
+        # The queued row is the job; workers will find it on their next poll
+        pass
+
+    async def start(self, workers: int = 1) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        while True:
+            book_id = await asyncio.to_thread(claim_job, None, self.runner.session_factory)
+            if book_id is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.runner.run(book_id)
+            except Exception:
+                logger.exception("Book %s generation crashed", book_id)
+
+
+def request_upgrade(book_id: int, session_factory: sessionmaker = SessionLocal) -> bool:
+    """Re-queue a paid, finished preview so it is regenerated at full quality.
+
+    The story pages are kept; only the illustrations and renders are redone.
+    Returns False when the book isn't paid for or isn't a finished preview.
+    """
+    with session_factory() as db:
+        updated = (
+            db.query(Book)
+            .filter(Book.id == book_id, Book.price_paid > 0, Book.status.in_([COMPLETED, FAILED]))
+            .update(
+                {
+                    Book.status: QUEUED,
+                    Book.generation_attempts: 0,
+                    Book.generation_error: None,
+                    Book.lease_expires_at: None,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return updated == 1
+
+
+def _claimable(now: datetime) -> ColumnElement[bool]:
+    return and_(
+        Book.status.in_(ACTIVE_STATUSES),
+        or_(Book.lease_expires_at.is_(None), Book.lease_expires_at < now),
+    )
+
+
+def claim_job(
+    book_id: Optional[int] = None, session_factory: sessionmaker = SessionLocal
+) -> Optional[int]:
+    """Lease ``book_id`` (or else the oldest claimable book) for generation.
+
+    Returns the claimed book's id, or None when the book is finished or another
+    worker holds its lease.
+    """
+    with session_factory() as db:
+        now = datetime.utcnow()
+        query = db.query(Book.id).filter(_claimable(now))
+        if book_id is not None:
+            query = query.filter(Book.id == book_id)
+        if db.get_bind().dialect.name == "postgresql":
+            # Concurrent workers skip each other's candidates instead of queueing behind them
+            query = query.with_for_update(skip_locked=True)
+        row = query.order_by(Book.id).first()
+        if row is None:
+            return None
+        # Conditional on the lease still being free, for databases without row locks
+        claimed = (
+            db.query(Book)
+            .filter(Book.id == row.id, _claimable(now))
+            .update(
+                {Book.lease_expires_at: now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return row.id if claimed else None
+
+
+def renew_lease(book_id: int, session_factory: sessionmaker = SessionLocal) -> None:
+    with session_factory() as db:
+        db.query(Book).filter(Book.id == book_id, Book.status.in_(ACTIVE_STATUSES)).update(
+            {Book.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)},
+            synchronize_session=False,
+        )
+        db.commit()
+
+
+def recover_jobs(session_factory: sessionmaker = SessionLocal) -> List[int]:
+    """Return books no worker holds a lease on: queued, or abandoned mid-generation.
+
+    Queued books are usually already on a queue, which skips them (see
+    ``JobQueue.enqueue``); they are included because an in-process queue loses
+    its entries when the process restarts.
+    """
+    with session_factory() as db:
+        rows = (
+            db.query(Book.id)
+            .filter(_claimable(datetime.utcnow()))
+            .order_by(Book.id)
+            .all()
+        )
+        return [row.id for row in rows]
+
+
+def create_job_queue_from_env(runner: Optional[BookJobRunner] = None) -> JobQueue:
+    """Build the job queue selected by JOB_QUEUE_BACKEND (inprocess, redis or database)."""
+    runner = runner or BookJobRunner()
+    backend = os.getenv("JOB_QUEUE_BACKEND", "inprocess")
+    if backend == "inprocess":
+        return InProcessJobQueue(runner)
+    elif backend == "redis":
+        return RedisJobQueue(runner, os.getenv("REDIS_URL", "redis://localhost:6379"))
+    elif backend == "database":
+        return DatabaseJobQueue(runner)
+    else:
+        raise ValueError(f"Unknown job queue backend: {backend}")
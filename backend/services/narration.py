@@ -0,0 +1,366 @@
+import io
+import os
+import re
+import sys
+import math
+import wave
+import array
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import subprocess
+import httpx
+from typing import Dict, FrozenSet, List, Optional
+from dotenv import load_dotenv
+
+from services.cache import CacheBackend, get_default_cache, make_cache_key
+from services.scheduler import OpenAIScheduler, get_scheduler
+from services.storage import ArtifactStore, get_artifact_store
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Whitespace after terminal punctuation, optionally followed by a closing quote or bracket
+SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"')\]]))\s+")
+
+
+def split_sentences(text: str, max_chars: int = 400) -> List[str]:
+    """Split text into chunks that end on sentence boundaries and stay under ``max_chars``.
+
+    A single sentence longer than ``max_chars`` becomes its own chunk rather than
+    being cut mid-sentence, which would put an audible seam inside it.
+    """
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END.split(" ".join(text.split())):
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TTSBackend:
+    """Base class for text-to-speech engines.
+
+    ``synthesize`` returns raw 16-bit little-endian mono PCM at ``sample_rate``,
+    so chunks from the same backend can be stitched without re-encoding.
+    """
+
+    name = "base"
+    sample_rate = 24000
+    default_voice = "default"
+    # None accepts any voice name
+    voices: Optional[FrozenSet[str]] = None
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAITTSBackend(TTSBackend):
+    """OpenAI's speech endpoint, admitted through the shared OpenAI scheduler."""
+
+    name = "openai"
+    sample_rate = 24000  # response_format=pcm is always 24kHz
+    default_voice = "alloy"
+    voices = frozenset({"alloy", "echo", "fable", "onyx", "nova", "shimmer"})
+
+    def __init__(self, model: Optional[str] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.model = model or os.getenv("TTS_MODEL", "tts-1")
+        self.api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+        self.scheduler = scheduler or get_scheduler()
+        self.client = httpx.AsyncClient(
+            timeout=float(os.getenv("TTS_TIMEOUT", "60")),
+            headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"},
+        )
+
+    async def _speech(self, text: str, voice: str) -> bytes:
+        response = await self.client.post(
+            f"{self.api_base}/audio/speech",
+            json={"model": self.model, "input": text, "voice": voice, "response_format": "pcm"},
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        return await self.scheduler.submit(self.model, None, lambda: self._speech(text, voice))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class EspeakTTSBackend(TTSBackend):
+    """Offline synthesis with the espeak-ng command line tool."""
+
+    name = "espeak"
+    sample_rate = 22050
+    default_voice = "en"
+
+    def __init__(self, executable: Optional[str] = None):
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.executable is None:
+            raise RuntimeError("EspeakTTSBackend requires espeak-ng to be installed")
+        self.voices = self._list_voices()
+
+    def _list_voices(self) -> FrozenSet[str]:
+        """Language codes and voice names accepted by ``-v``, from ``--voices``."""
+        listing = subprocess.run(
+            [self.executable, "--voices"], capture_output=True, text=True, check=True
+        )
+        voices = set()
+        # Columns: Pty Language Age/Gender VoiceName File Other Languages
+        for line in listing.stdout.splitlines()[1:]:
+            columns = line.split()
+            if len(columns) >= 4:
+                voices.update((columns[1], columns[3]))
+        return frozenset(voices)
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.executable, "--stdout", "-v", voice, text,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        output, error = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"espeak failed: {error.decode(errors='replace').strip()}")
+        with wave.open(io.BytesIO(output)) as audio:
+            return audio.readframes(audio.getnframes())
+
+
+class ToneTTSBackend(TTSBackend):
+    """Deterministic offline engine for tests: one short tone per word, no dependencies."""
+
+    name = "tone"
+    sample_rate = 16000
+    default_voice = "tone"
+
+    def __init__(self, word_seconds: float = 0.12, gap_seconds: float = 0.04):
+        self.word_seconds = word_seconds
+        self.gap_seconds = gap_seconds
+
+    def _render(self, text: str, voice: str) -> bytes:
+        samples = array.array("h")
+        gap = [0] * int(self.gap_seconds * self.sample_rate)
+        for word in text.split():
+            digest = hashlib.sha256(f"{voice}:{word}".encode()).digest()
+            frequency = 220 + digest[0] * 2
+            for n in range(int(self.word_seconds * self.sample_rate)):
+                samples.append(int(8000 * math.sin(2 * math.pi * frequency * n / self.sample_rate)))
+            samples.extend(gap)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return samples.tobytes()
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        return await asyncio.to_thread(self._render, text, voice)
+
+
+def create_tts_backend_from_env() -> TTSBackend:
+    """Build the TTS engine selected by TTS_BACKEND (openai, espeak or tone)."""
+    backend = os.getenv("TTS_BACKEND", "openai")
+    if backend == "openai":
+        return OpenAITTSBackend()
+    elif backend == "espeak":
+        return EspeakTTSBackend()
+    elif backend == "tone":
+        return ToneTTSBackend()
+    else:
+        raise ValueError(f"Unknown TTS backend: {backend}")
+
+
+class Narrator:
+    """Turns page texts into one stitched WAV narration.
+
+    Text is split into sentence-bounded chunks that are synthesized
+    concurrently. Each chunk's audio is stored as an artifact and indexed in
+    the generation cache by a hash of its text and voice, so after a page edit
+    only the chunks whose text changed are synthesized again.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[TTSBackend] = None,
+        cache: Optional[CacheBackend] = None,
+        store: Optional[ArtifactStore] = None,
+        concurrency: Optional[int] = None,
+        max_chunk_chars: Optional[int] = None,
+        page_pause: Optional[float] = None,
+    ):
+        self.backend = backend or create_tts_backend_from_env()
+        self.cache = cache or get_default_cache()
+        self.store = store or get_artifact_store()
+        self.concurrency = concurrency or int(os.getenv("TTS_CONCURRENCY", "4"))
+        self.max_chunk_chars = max_chunk_chars or int(os.getenv("TTS_CHUNK_CHARS", "400"))
+        if page_pause is None:
+            page_pause = float(os.getenv("TTS_PAGE_PAUSE", "0.6"))
+        self.page_pause = page_pause
+        self.default_voice = self.resolve_voice(
+            os.getenv("NARRATION_VOICE") or self.backend.default_voice
+        )
+        self.synthesized = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def resolve_voice(self, voice: Optional[str]) -> str:
+        """``voice``, or the default when it is None; raises ValueError if the backend lacks it."""
+        if voice is None:
+            return self.default_voice
+        if self.backend.voices is not None and voice not in self.backend.voices:
+            raise ValueError(f"Unknown voice for the {self.backend.name} backend: {voice}")
+        return voice
+
+    def narration_key(self, pages: List[str], voice: str) -> str:
+        return make_cache_key(f"narration:{self.backend.name}", voice, "\x00".join(pages))
+
+    async def cached(self, pages: List[str], voice: str) -> Optional[str]:
+        """The artifact key of an earlier narration of exactly these pages, if still stored."""
+        artifact = await self.cache.get(self.narration_key(pages, voice))
+        if artifact is not None and await self.store.exists(artifact):
+            return artifact
+        return None
+
+    def _chunk_cache_key(self, text: str, voice: str) -> str:
+        return make_cache_key(
+            f"tts:{self.backend.name}", voice, text, sample_rate=self.backend.sample_rate
+        )
+
+    async def _chunk(self, text: str, voice: str, semaphore: asyncio.Semaphore) -> str:
+        """Return the artifact key of a chunk's PCM audio, synthesizing it only on a cache miss."""
+        cache_key = self._chunk_cache_key(text, voice)
+        artifact = await self.cache.get(cache_key)
+        if artifact is not None and await self.store.exists(artifact):
+            return artifact
+
+        async with semaphore:
+            audio = await self.backend.synthesize(text, voice)
+        self.synthesized += 1
+        artifact = await self.store.put(audio, ".pcm")
+        await self.cache.set(cache_key, artifact)
+        return artifact
+
+    async def narrate(self, pages: List[str], voice: str) -> str:
+        """Narrate the pages in order and return the artifact key of the stitched WAV."""
+        # Concurrent requests for the same narration (e.g. several QR scans) share one run
+        key = self.narration_key(pages, voice)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._narrate(pages, voice)
+            await self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _narrate(self, pages: List[str], voice: str) -> str:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        page_chunks = [split_sentences(text or "", self.max_chunk_chars) for text in pages]
+        artifacts = await asyncio.gather(*(
+            self._chunk(chunk, voice, semaphore) for chunks in page_chunks for chunk in chunks
+        ))
+
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            await self._stitch(page_chunks, list(artifacts), path)
+            return await self.store.put_file(path, ".wav")
+        finally:
+            os.remove(path)
+
+    async def _stitch(self, page_chunks: List[List[str]], artifacts: List[str], path: str) -> None:
+        """Write the chunks to a WAV file one at a time, with a pause between pages."""
+        pause = b"\x00\x00" * int(self.page_pause * self.backend.sample_rate)
+        remaining = iter(artifacts)
+        # wave patches the header sizes on close, so the file is written in a single pass
+        with wave.open(path, "wb") as output:
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(self.backend.sample_rate)
+            for number, chunks in enumerate(page_chunks):
+                if number and chunks:
+                    await asyncio.to_thread(output.writeframes, pause)
+                for _ in chunks:
+                    audio = await self.store.get(next(remaining))
+                    await asyncio.to_thread(output.writeframes, audio)
+
+
+class NarrationQueue:
+    """Narrates books on background tasks instead of inside the request.
+
+    Each narration (pages and voice) runs at most once at a time, at most
+    ``concurrency`` run together, and at most ``max_pending`` may be waiting.
+    Finished narrations are found again through ``Narrator.cached``.
+    """
+
+    def __init__(
+        self,
+        narrator: Optional[Narrator] = None,
+        concurrency: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self._narrator = narrator
+        self.concurrency = concurrency or int(os.getenv("NARRATION_JOBS", "2"))
+        self.max_pending = max_pending or int(os.getenv("NARRATION_MAX_PENDING", "100"))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def narrator(self) -> Narrator:
+        return self._narrator or get_narrator()
+
+    def submit(self, pages: List[str], voice: str) -> bool:
+        """Queue a narration unless it is already queued; False when the queue is full."""
+        key = self.narrator.narration_key(pages, voice)
+        if key in self._tasks:
+            return True
+        if len(self._tasks) >= self.max_pending:
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        task = asyncio.create_task(self._run(pages, voice))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return True
+
+    async def _run(self, pages: List[str], voice: str) -> None:
+        async with self._semaphore:
+            try:
+                await self.narrator.narrate(pages, voice)
+            except Exception:
+                logger.exception("Narration failed")
+
+    async def stop(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+
+_default_narrator: Optional[Narrator] = None
+
+
+def get_narrator() -> Narrator:
+    """Return the process-wide narrator, creating it on first use."""
+    global _default_narrator
+    if _default_narrator is None:
+        _default_narrator = Narrator()
+    return _default_narrator
@@ -0,0 +1,71 @@
+import os
+import json
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from sqlalchemy import DateTime, Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor holding the sort key of the last row on a page."""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[InstrumentedAttribute]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("wrong number of values")
+        return [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime) else value
+            for key, value in zip(keys, values)
+        ]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {str(e)}")
+
+
+def paginate(
+    query: Select,
+    keys: Sequence[InstrumentedAttribute],
+    cursor: Optional[str],
+    limit: int,
+) -> Select:
+    """Order ``query`` newest first by ``keys`` and start after ``cursor``.
+
+    The cursor is a row-value comparison on the sort key, so with an index ending
+    in ``keys`` every page is one index range scan however deep it is, unlike
+    OFFSET which reads and discards every earlier row. One extra row is fetched
+    to tell whether another page follows.
+    """
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        if len(keys) == 1:
+            query = query.where(keys[0] < values[0])
+        else:
+            query = query.where(tuple_(*keys) < tuple_(*values))
+    return query.order_by(*(key.desc() for key in keys)).limit(limit + 1)
+
+
+def page_of(
+    rows: Sequence, keys: Sequence[InstrumentedAttribute], limit: int
+) -> Tuple[List, Optional[str]]:
+    """Split the rows of a ``paginate`` query into this page and the next page's cursor."""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], key.key) for key in keys])
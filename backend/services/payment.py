@@ -1,23 +1,111 @@
 import os
+import json
+import asyncio
 import stripe
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+from services.instrumentation import instrument
+
 load_dotenv()
 
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# Overridable so load tests can point the SDK at a local stub
+stripe.api_base = os.getenv("STRIPE_API_BASE", stripe.api_base)
+
+# The Stripe SDK is synchronous, so its calls run on a small bounded pool
+# instead of blocking the event loop.
+_stripe_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STRIPE_MAX_WORKERS", "8")), thread_name_prefix="stripe"
+)
+
+# Stripe price ids reused across orders, keyed by (book type, unit amount in cents, currency)
+_price_cache: Dict[Tuple[str, int, str], str] = {}
+# One lookup-or-create per key at a time, so concurrent checkouts don't each create a price
+_price_locks: Dict[Tuple[str, int, str], asyncio.Lock] = {}
+
+
+def invalidate_price_cache(book_type: Optional[str] = None) -> None:
+    """Forget cached Stripe prices, for one book type or all of them.
+
+    Called with the catalog invalidation, so an edited book type looks its price up again.
+    """
+    for key in list(_price_cache):
+        if book_type is None or key[0] == book_type:
+            del _price_cache[key]
+
 
 class PaymentService:
     def __init__(self):
         self.stripe = stripe
 
-    async def create_payment_intent(self, amount: float, currency: str = "usd") -> Dict:
-        """Create a payment intent for the given amount."""
+    async def _call(self, method: Callable, **kwargs: Any) -> Any:
+        """Run a blocking Stripe SDK call on the bounded Stripe executor."""
+        loop = asyncio.get_running_loop()
+        # SDK resource methods are classmethods, e.g. "Price.list" or "Session.create"
+        operation = f"{getattr(method.__self__, '__name__', 'stripe')}.{method.__name__}"
+        with instrument("stripe", operation):
+            return await loop.run_in_executor(_stripe_executor, partial(method, **kwargs))
+
+    async def get_physical_book_price(
+        self, book_type: str, unit_amount: int = 2999, currency: str = "usd"
+    ) -> str:
+        """Return a reusable Stripe price id for a physical book, creating it only once.
+
+        Prices carry a lookup_key, so after a restart the existing price is found
+        instead of creating a duplicate Product/Price pair. Within a process the
+        lookup is serialized per key; across processes, ``transfer_lookup_key``
+        makes a racing create take over the key, so every later lookup still
+        resolves to a single price.
+        """
+        cache_key = (book_type, unit_amount, currency)
+        price_id = _price_cache.get(cache_key)
+        if price_id is not None:
+            return price_id
+
+        async with _price_locks.setdefault(cache_key, asyncio.Lock()):
+            price_id = _price_cache.get(cache_key)
+            if price_id is not None:
+                return price_id
+
+            lookup_key = f"physical-book:{book_type}:{unit_amount}:{currency}"
+            prices = await self._call(
+                self.stripe.Price.list, lookup_keys=[lookup_key], active=True, limit=1
+            )
+            if prices.data:
+                price_id = prices.data[0].id
+            else:
+                # Creating the product inline saves a separate Product.create round trip
+                price = await self._call(
+                    self.stripe.Price.create,
+                    unit_amount=unit_amount,
+                    currency=currency,
+                    lookup_key=lookup_key,
+                    transfer_lookup_key=True,
+                    product_data={"name": f"Physical Book - {book_type}"},
+                )
+                price_id = price.id
+
+            _price_cache[cache_key] = price_id
+            return price_id
+
+    async def create_payment_intent(
+        self, amount: float, currency: str = "usd", metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """Create a payment intent for the given amount.
+
+        ``metadata`` (e.g. book_id and user_id) is echoed back on webhook events,
+        which is how payments are matched to books.
+        """
         try:
-            intent = self.stripe.PaymentIntent.create(
+            intent = await self._call(
+                self.stripe.PaymentIntent.create,
                 amount=int(amount * 100),  # Convert to cents
                 currency=currency,
                 automatic_payment_methods={"enabled": True},
+                metadata=metadata or {},
             )
             return {
                 "client_secret": intent.client_secret,
@@ -29,7 +117,8 @@ class PaymentService:
     async def create_checkout_session(self, book_id: int, price: float, success_url: str, cancel_url: str) -> Dict:
         """Create a checkout session for the book purchase."""
         try:
-            session = self.stripe.checkout.Session.create(
+            session = await self._call(
+                self.stripe.checkout.Session.create,
                 payment_method_types=["card"],
                 line_items=[{
                     "price_data": {
@@ -44,6 +133,10 @@ class PaymentService:
                 mode="payment",
                 success_url=success_url,
                 cancel_url=cancel_url,
+                client_reference_id=str(book_id),
+                metadata={"book_id": book_id},
+                # Carried onto the payment intent so its events can be matched to the book too
+                payment_intent_data={"metadata": {"book_id": book_id}},
             )
             return {
                 "session_id": session.id,
@@ -52,55 +145,26 @@ class PaymentService:
         except Exception as e:
             raise Exception(f"Error creating checkout session: {str(e)}")
 
-    async def handle_webhook(self, payload: bytes, sig_header: str) -> Optional[Dict]:
-        """Handle Stripe webhook events."""
-        try:
-            event = self.stripe.Webhook.construct_event(
-                payload, sig_header, os.getenv("STRIPE_WEBHOOK_SECRET")
-            )
+    def verify_webhook(self, payload: bytes, sig_header: str) -> Dict:
+        """Check the webhook signature and return the event as a plain dict.
 
-            if event.type == "payment_intent.succeeded":
-                payment_intent = event.data.object
-                return {
-                    "type": "payment_intent.succeeded",
-                    "payment_intent_id": payment_intent.id,
-                    "amount": payment_intent.amount / 100,  # Convert from cents
-                    "status": payment_intent.status
-                }
-            elif event.type == "checkout.session.completed":
-                session = event.data.object
-                return {
-                    "type": "checkout.session.completed",
-                    "session_id": session.id,
-                    "amount": session.amount_total / 100,  # Convert from cents
-                    "status": session.status
-                }
-
-            return None
-        except Exception as e:
-            raise Exception(f"Error handling webhook: {str(e)}")
+        Raises ``stripe.error.SignatureVerificationError`` (or ValueError for a
+        malformed payload) when the request didn't come from Stripe.
+        """
+        self.stripe.Webhook.construct_event(payload, sig_header, os.getenv("STRIPE_WEBHOOK_SECRET"))
+        return json.loads(payload)
 
     async def create_publishing_order(self, book_id: int, book_type: str, shipping_address: Dict) -> Dict:
         """Create an order for physical book publishing."""
         try:
-            # Create a product for the physical book
-            product = self.stripe.Product.create(
-                name=f"Physical Book - {book_type}",
-                description=f"Physical copy of your personalized {book_type} book"
-            )
-
-            # Create a price for the physical book
-            price = self.stripe.Price.create(
-                product=product.id,
-                unit_amount=2999,  # $29.99
-                currency="usd"
-            )
+            price_id = await self.get_physical_book_price(book_type)
 
             # Create a checkout session for the physical book
-            session = self.stripe.checkout.Session.create(
+            session = await self._call(
+                self.stripe.checkout.Session.create,
                 payment_method_types=["card"],
                 line_items=[{
-                    "price": price.id,
+                    "price": price_id,
                     "quantity": 1,
                 }],
                 mode="payment",
@@ -109,6 +173,10 @@ class PaymentService:
                 },
                 success_url=f"{os.getenv('FRONTEND_URL')}/order/success?session_id={{CHECKOUT_SESSION_ID}}",
                 cancel_url=f"{os.getenv('FRONTEND_URL')}/order/cancel",
+                client_reference_id=str(book_id),
+                # Lets the webhook processor attach the physical order to its book
+                metadata={"book_id": book_id},
+                payment_intent_data={"metadata": {"book_id": book_id}},
             )
 
             return {
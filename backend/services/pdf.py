@@ -0,0 +1,495 @@
+import io
+import os
+import zlib
+import struct
+import asyncio
+import hashlib
+from functools import lru_cache
+from types import TracebackType
+from typing import BinaryIO, Dict, List, Optional, Tuple, Type
+from PIL import Image, ImageFont
+
+from services.instrumentation import instrument
+from services.renderer import FONT_PATH, FontNotFoundError
+from services.storage import ArtifactStore
+
+# 8.5x11 inches in PDF points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+# Defaults to the font pages are rendered with, so print and preview text match
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", FONT_PATH)
+
+
+def _pdf_name(name: str) -> str:
+    """Drop characters that would need escaping in a PDF name."""
+    return "".join(c for c in name if c.isascii() and (c.isalnum() or c in "-_"))
+
+
+class TrueTypeFont:
+    """The metrics and character map of a TrueType font, which is embedded whole in the PDF.
+
+    Text is written as glyph ids (Identity-H), so any character the font has can be
+    printed, and a ToUnicode map keeps it searchable and copyable.
+    """
+
+    def __init__(self, data: bytes, name: str = "Font"):
+        if data[:4] == b"ttcf":
+            raise ValueError("Font collections (.ttc) are not supported; use a single .ttf")
+        if data[:4] == b"OTTO":
+            raise ValueError("Only fonts with TrueType outlines can be embedded")
+        self.data = data
+        self._tables: Dict[bytes, Tuple[int, int]] = {}
+        for index in range(self._u16(4)):
+            tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * index)
+            self._tables[tag] = (offset, length)
+
+        head = self._table(b"head")
+        self.units_per_em = self._u16(head + 18)
+        self.bbox = [self._scale(self._i16(head + 36 + 2 * i)) for i in range(4)]
+        hhea = self._table(b"hhea")
+        self.ascent = self._scale(self._i16(hhea + 4))
+        self.descent = self._scale(self._i16(hhea + 6))
+        self.cap_height = self.ascent
+        if b"OS/2" in self._tables:
+            os2 = self._table(b"OS/2")
+            if self._u16(os2) >= 2:
+                self.cap_height = self._scale(self._i16(os2 + 88))
+        self.italic_angle = 0.0
+        if b"post" in self._tables:
+            self.italic_angle = struct.unpack_from(">i", data, self._table(b"post") + 4)[0] / 65536
+
+        metrics = self._u16(hhea + 34)
+        hmtx = self._table(b"hmtx")
+        self._advances = [self._u16(hmtx + 4 * i) for i in range(metrics)]
+        self.cmap = self._read_cmap()
+        self.name = _pdf_name(self._read_name() or "") or _pdf_name(name) or "Font"
+
+    def _u16(self, offset: int) -> int:
+        return int(struct.unpack_from(">H", self.data, offset)[0])
+
+    def _i16(self, offset: int) -> int:
+        return int(struct.unpack_from(">h", self.data, offset)[0])
+
+    def _u32(self, offset: int) -> int:
+        return int(struct.unpack_from(">I", self.data, offset)[0])
+
+    def _table(self, tag: bytes) -> int:
+        if tag not in self._tables:
+            raise ValueError(f"Font has no '{tag.decode()}' table")
+        return self._tables[tag][0]
+
+    def _scale(self, value: float) -> int:
+        """Font units to the 1/1000 em units PDF font metrics use."""
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self) -> Dict[int, int]:
+        """Map code points to glyph ids from the best Unicode subtable (format 12, then 4)."""
+        cmap = self._table(b"cmap")
+        subtables: Dict[int, int] = {}
+        for index in range(self._u16(cmap + 2)):
+            platform, encoding, offset = struct.unpack_from(">HHI", self.data, cmap + 4 + 8 * index)
+            if platform == 0 or (platform == 3 and encoding in (1, 10)):
+                subtables.setdefault(self._u16(cmap + offset), cmap + offset)
+
+        glyphs: Dict[int, int] = {}
+        if 12 in subtables:
+            offset = subtables[12]
+            for index in range(self._u32(offset + 12)):
+                start, end, glyph = struct.unpack_from(">III", self.data, offset + 16 + 12 * index)
+                for code in range(start, end + 1):
+                    glyphs[code] = glyph + code - start
+        elif 4 in subtables:
+            offset = subtables[4]
+            segments = self._u16(offset + 6) // 2
+            ends = offset + 14
+            starts = ends + 2 * segments + 2
+            deltas = starts + 2 * segments
+            range_offsets = deltas + 2 * segments
+            for index in range(segments):
+                start, end = self._u16(starts + 2 * index), self._u16(ends + 2 * index)
+                delta = self._u16(deltas + 2 * index)
+                range_offset = self._u16(range_offsets + 2 * index)
+                for code in range(start, min(end, 0xFFFE) + 1):
+                    if range_offset == 0:
+                        glyph = (code + delta) & 0xFFFF
+                    else:
+                        address = range_offsets + 2 * index + range_offset + 2 * (code - start)
+                        glyph = self._u16(address)
+                        if glyph:
+                            glyph = (glyph + delta) & 0xFFFF
+                    if glyph:
+                        glyphs[code] = glyph
+        else:
+            raise ValueError("Font has no Unicode character map")
+        return glyphs
+
+    def _read_name(self) -> Optional[str]:
+        """The PostScript name (name id 6), if the font has one."""
+        if b"name" not in self._tables:
+            return None
+        table = self._table(b"name")
+        strings = table + self._u16(table + 4)
+        for index in range(self._u16(table + 2)):
+            platform, _, _, name_id, length, offset = struct.unpack_from(
+                ">6H", self.data, table + 6 + 12 * index
+            )
+            if name_id != 6 or platform not in (1, 3):
+                continue
+            raw = self.data[strings + offset:strings + offset + length]
+            return raw.decode("utf-16-be" if platform == 3 else "latin-1", errors="ignore")
+        return None
+
+    def glyph(self, char: str) -> int:
+        """The glyph id for a character; 0 (.notdef) when the font doesn't have it."""
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, glyph: int) -> int:
+        """Advance width of a glyph in 1/1000 em."""
+        return self._scale(self._advances[min(glyph, len(self._advances) - 1)])
+
+    def text_width(self, text: str, size: float) -> float:
+        return sum(self.advance(self.glyph(char)) for char in text) * size / 1000
+
+
+@lru_cache(maxsize=None)
+def load_pdf_font(path: str = PDF_FONT_PATH) -> TrueTypeFont:
+    """Load and parse the print font once per process.
+
+    ``path`` may be a bare file name, which is looked up in the system font
+    directories the same way page rendering finds its font.
+    """
+    try:
+        resolved = str(ImageFont.truetype(path, 12).path)
+    except OSError:
+        raise FontNotFoundError(
+            f"PDF font {path!r} was not found; set PDF_FONT_PATH to a TrueType (.ttf) font"
+        )
+    with open(resolved, "rb") as f:
+        return TrueTypeFont(f.read(), os.path.splitext(os.path.basename(resolved))[0])
+
+
+class PdfAssembler:
+    """Writes a print-ready 8.5x11 PDF one page at a time.
+
+    Every object is written to the output as soon as it is built, so only the
+    byte offsets of written objects stay in memory. Identical images (e.g. a
+    shared background) are embedded once and referenced from every page that
+    uses them. Text is set in an embedded TrueType font (``PDF_FONT_PATH``),
+    shared by every page and loaded only once a page has text.
+
+    Usage::
+
+        with open(path, "wb") as f, PdfAssembler(f) as pdf:
+            for page in pages:
+                pdf.add_page(text=page["text"], image=page_png)
+    """
+
+    def __init__(
+        self,
+        output: BinaryIO,
+        font_size: int = 14,
+        margin: int = 54,
+        font: Optional[TrueTypeFont] = None,
+    ):
+        self.output = output
+        self.font_size = font_size
+        self.margin = margin
+        self._font = font
+        self._font_id: Optional[int] = None
+        self._glyphs: Dict[int, str] = {}  # glyph id -> character, for the ToUnicode map
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 3  # 1: catalog, 2: page tree
+        self._page_ids: List[int] = []
+        self._images: Dict[str, Tuple[int, int, int]] = {}
+        self._position = 0
+        self._closed = False
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self) -> "PdfAssembler":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _write(self, data: bytes) -> None:
+        self.output.write(data)
+        self._position += len(data)
+
+    def _allocate(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(self, object_id: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        self._offsets[object_id] = self._position
+        self._write(f"{object_id} 0 obj\n".encode() + body)
+        if stream is not None:
+            self._write(b"\nstream\n" + stream + b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def _image_object(self, data: bytes) -> Tuple[int, int, int]:
+        """Embed an image once per distinct content and return (object id, width, height)."""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._images:
+            return self._images[digest]
+
+        image: Image.Image = Image.open(io.BytesIO(data))
+        width, height = image.size
+
+        if image.format == "JPEG" and image.mode in ("RGB", "L", "CMYK"):
+            # JPEG data can be embedded as-is without decoding
+            stream, filter_name = data, "/DCTDecode"
+            color_space = {
+                "RGB": "/DeviceRGB", "L": "/DeviceGray", "CMYK": "/DeviceCMYK"
+            }[image.mode]
+        else:
+            image = image.convert("RGB")
+            stream, filter_name = zlib.compress(image.tobytes(), 6), "/FlateDecode"
+            color_space = "/DeviceRGB"
+        # Adobe writes inverted CMYK JPEGs, so undo it with a Decode array
+        decode = b" /Decode [1 0 1 0 1 0 1 0]" if color_space == "/DeviceCMYK" else b""
+
+        object_id = self._allocate()
+        self._write_object(
+            object_id,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter {filter_name} "
+            f"/Length {len(stream)}".encode() + decode + b" >>",
+            stream,
+        )
+        self._images[digest] = (object_id, width, height)
+        return self._images[digest]
+
+    def _wrap(self, paragraph: str, width: float) -> List[str]:
+        """Break a paragraph into lines no wider than ``width`` points, splitting long words."""
+        def measure(text: str) -> float:
+            return self.font.text_width(text, self.font_size)
+
+        space = measure(" ")
+        lines: List[str] = []
+        line, line_width = "", 0.0
+        for word in paragraph.split():
+            word_width = measure(word)
+            if line and line_width + space + word_width <= width:
+                line, line_width = f"{line} {word}", line_width + space + word_width
+                continue
+            if line:
+                lines.append(line)
+            line, line_width = "", 0.0
+            if word_width <= width:
+                line, line_width = word, word_width
+                continue
+            for char in word:
+                char_width = measure(char)
+                if line and line_width + char_width > width:
+                    lines.append(line)
+                    line, line_width = "", 0.0
+                line, line_width = line + char, line_width + char_width
+        lines.append(line)
+        return lines
+
+    def _encode(self, line: str) -> bytes:
+        """A line as a hex string of two-byte glyph ids, recording each glyph used."""
+        glyphs = []
+        for char in line:
+            glyph = self.font.glyph(char)
+            if glyph:
+                self._glyphs.setdefault(glyph, char)
+            glyphs.append(glyph)
+        return b"<" + struct.pack(f">{len(glyphs)}H", *glyphs).hex().encode() + b">"
+
+    @property
+    def font(self) -> TrueTypeFont:
+        """The text font, loaded only once a page has text."""
+        if self._font is None:
+            self._font = load_pdf_font()
+        return self._font
+
+    @property
+    def leading(self) -> float:
+        return self.font_size * 1.4
+
+    def _lines(self, text: str) -> List[str]:
+        width = PAGE_WIDTH - 2 * self.margin
+        lines = []
+        for paragraph in text.splitlines() or [""]:
+            lines.extend(self._wrap(paragraph, width))
+        return lines
+
+    def _text_operations(self, lines: List[str], top: float) -> bytes:
+        """Set ``lines`` with the first baseline at ``top``."""
+        ops = [
+            f"BT /F1 {self.font_size} Tf {self.leading:.1f} TL {self.margin} {top:.2f} Td".encode()
+        ]
+        for line in lines:
+            ops.append(self._encode(line) + b" Tj T*")
+        ops.append(b"ET")
+        return b"\n".join(ops)
+
+    def add_page(self, text: Optional[str] = None, image: Optional[bytes] = None) -> None:
+        """Append a page with an optional image and optional text.
+
+        Images are scaled to fit, never cropped: an image alone fills as much of
+        the page as its aspect ratio allows, and an image with text is fitted
+        inside the margins above the text, leaving at least half the page for it.
+        """
+        if self._closed:
+            raise ValueError("Cannot add pages to a closed PDF")
+
+        resources = b""
+        ops = []
+        lines = self._lines(text) if text else []
+        top: float = PAGE_HEIGHT - self.margin - self.font_size
+        if image is not None:
+            image_id, width, height = self._image_object(image)
+            if lines:
+                content_height = PAGE_HEIGHT - 2 * self.margin
+                box_x, box_width = self.margin, PAGE_WIDTH - 2 * self.margin
+                text_height = (len(lines) + 1) * self.leading
+                box_height = max(content_height - text_height, content_height / 2)
+                box_top = PAGE_HEIGHT - self.margin
+            else:
+                box_x, box_width, box_height, box_top = 0, PAGE_WIDTH, PAGE_HEIGHT, PAGE_HEIGHT
+            scale = min(box_width / width, box_height / height)
+            draw_width, draw_height = width * scale, height * scale
+            # Centered across the box; the image sits at the top of it so text follows directly
+            x = box_x + (box_width - draw_width) / 2
+            y = box_top - draw_height if lines else (PAGE_HEIGHT - draw_height) / 2
+            placement = f"{draw_width:.2f} 0 0 {draw_height:.2f} {x:.2f} {y:.2f} cm"
+            ops.append(f"q {placement} /Im{image_id} Do Q".encode())
+            resources += f" /XObject << /Im{image_id} {image_id} 0 R >>".encode()
+            top = y - self.leading
+        if lines:
+            ops.append(self._text_operations(lines, top))
+            if self._font_id is None:
+                self._font_id = self._allocate()
+            resources += f" /Font << /F1 {self._font_id} 0 R >>".encode()
+
+        content = zlib.compress(b"\n".join(ops))
+        content_id = self._allocate()
+        self._write_object(
+            content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>".encode(), content
+        )
+
+        page_id = self._allocate()
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Contents {content_id} 0 R /Resources << ".encode() + resources + b" >> >>",
+        )
+        self._page_ids.append(page_id)
+
+    def _write_font(self, font_id: int) -> None:
+        """Embed the font as a Type 0 font over its glyph ids, with widths and a ToUnicode map.
+
+        Written last, so the widths and ToUnicode map only cover glyphs the pages used.
+        """
+        font = self.font
+        name = font.name.encode()
+        descendant_id, descriptor_id = self._allocate(), self._allocate()
+        file_id, to_unicode_id = self._allocate(), self._allocate()
+
+        self._write_object(
+            font_id,
+            b"<< /Type /Font /Subtype /Type0 /BaseFont /" + name + b" /Encoding /Identity-H "
+            + f"/DescendantFonts [{descendant_id} 0 R] /ToUnicode {to_unicode_id} 0 R >>".encode(),
+        )
+        widths = " ".join(f"{glyph} [{font.advance(glyph)}]" for glyph in sorted(self._glyphs))
+        self._write_object(
+            descendant_id,
+            b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /" + name
+            + b" /CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            + f"/FontDescriptor {descriptor_id} 0 R /DW {font.advance(0)} /W [{widths}] "
+            f"/CIDToGIDMap /Identity >>".encode(),
+        )
+        bbox = " ".join(str(value) for value in font.bbox)
+        self._write_object(
+            descriptor_id,
+            b"<< /Type /FontDescriptor /FontName /" + name
+            + f" /Flags 32 /FontBBox [{bbox}] /ItalicAngle {font.italic_angle:g} "
+            f"/Ascent {font.ascent} /Descent {font.descent} /CapHeight {font.cap_height} "
+            f"/StemV 80 /FontFile2 {file_id} 0 R >>".encode(),
+        )
+        data = zlib.compress(font.data, 6)
+        self._write_object(
+            file_id,
+            f"<< /Length {len(data)} /Length1 {len(font.data)} /Filter /FlateDecode >>".encode(),
+            data,
+        )
+
+        mappings = sorted(self._glyphs.items())
+        cmap = [
+            b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+            b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            b"/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+            b"1 begincodespacerange <0000> <FFFF> endcodespacerange",
+        ]
+        # bfchar blocks hold at most 100 entries
+        for start in range(0, len(mappings), 100):
+            chunk = mappings[start:start + 100]
+            cmap.append(f"{len(chunk)} beginbfchar".encode())
+            for glyph, char in chunk:
+                cmap.append(f"<{glyph:04X}> <{char.encode('utf-16-be').hex().upper()}>".encode())
+            cmap.append(b"endbfchar")
+        cmap.append(b"endcmap CMapName currentdict /CMapType get defineresource pop end end")
+        stream = zlib.compress(b"\n".join(cmap))
+        self._write_object(
+            to_unicode_id, f"<< /Length {len(stream)} /Filter /FlateDecode >>".encode(), stream
+        )
+
+    def close(self) -> None:
+        """Write the font, page tree, catalog, cross-reference table and trailer."""
+        if self._closed:
+            return
+        if self._font_id is not None:
+            self._write_font(self._font_id)
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        count = len(self._page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._position
+        size = self._next_id
+        self._write(f"xref\n0 {size}\n".encode())
+        self._write(b"0000000000 65535 f \n")
+        for object_id in range(1, size):
+            self._write(f"{self._offsets[object_id]:010d} 00000 n \n".encode())
+        self._write(f"trailer\n<< /Size {size} /Root 1 0 R >>\n".encode())
+        self._write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        self._closed = True
+
+
+@instrument("render", "book_pdf")
+async def assemble_book_pdf(pages: List[Dict], store: ArtifactStore, path: str) -> None:
+    """Write a book's print PDF to ``path``, fetching one page image at a time.
+
+    Illustrated pages are laid out from the 300 DPI ``print`` variant of their
+    illustration with the text set as vector type below it. Other pages with a
+    ``page_image`` render are printed from that, fitted to the page, and the
+    rest fall back to plain text.
+    """
+    with open(path, "wb") as f:
+        pdf = PdfAssembler(f)
+        for page in pages:
+            print_image = (page.get("image_variants") or {}).get("print")
+            if print_image:
+                image = await store.get(print_image)
+                await asyncio.to_thread(pdf.add_page, text=page.get("text"), image=image)
+            elif page.get("page_image"):
+                image = await store.get(page["page_image"])
+                await asyncio.to_thread(pdf.add_page, image=image)
+            else:
+                await asyncio.to_thread(pdf.add_page, text=page.get("text", ""))
+        await asyncio.to_thread(pdf.close)
@@ -1,19 +1,82 @@
 import os
-import requests
-from typing import Dict, List
+import random
+import asyncio
+import httpx
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
+from services.instrumentation import instrument
+
 load_dotenv()
 
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide keep-alive client used for print vendor calls."""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                float(os.getenv("PUBLISHING_TIMEOUT", "30")),
+                connect=float(os.getenv("PUBLISHING_CONNECT_TIMEOUT", "5")),
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("PUBLISHING_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("PUBLISHING_MAX_KEEPALIVE", "10")),
+            ),
+        )
+    return _shared_client
+
+
+async def close_http_client() -> None:
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+
 class PublishingService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.api_key = os.getenv("PUBLISHING_SERVICE_API_KEY")
         self.api_url = os.getenv("PUBLISHING_SERVICE_URL")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.client = client or get_http_client()
+        self.max_retries = int(os.getenv("PUBLISHING_MAX_RETRIES", "3"))
+        self.retry_backoff = float(os.getenv("PUBLISHING_RETRY_BACKOFF", "0.5"))
+        self.status_concurrency = int(os.getenv("PUBLISHING_STATUS_CONCURRENCY", "10"))
+
+    async def _request(
+        self, method: str, path: str, idempotent: bool = True, **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request over the pooled client, retrying transient failures with jitter.
 
+        Non-idempotent requests are only retried when the connection could not be
+        established, so an order is never submitted twice.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.request(
+                    method, f"{self.api_url}{path}", headers=self.headers, **kwargs
+                )
+                retry = response.status_code in RETRY_STATUS_CODES and idempotent
+                if not retry or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt == self.max_retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    @instrument("publishing", "create_book_order")
     async def create_book_order(self, book_data: Dict, shipping_address: Dict) -> Dict:
         """Create a physical book order with the publishing service."""
         try:
@@ -23,6 +86,7 @@ class PublishingService:
                     "title": book_data["title"],
                     "author": "Memory Maker",
                     "pages": book_data["pages"],
+                    "print_file_url": book_data.get("print_file_url"),  # PDF from services.pdf
                     "cover_type": "hardcover",  # or "paperback"
                     "size": "8.5x11",  # Standard book size
                     "paper_type": "premium",
@@ -41,80 +105,75 @@ class PublishingService:
             }
 
             # Send the order to the publishing service
-            response = requests.post(
-                f"{self.api_url}/orders",
-                json=order_data,
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("POST", "/orders", idempotent=False, json=order_data)
 
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error creating book order: {str(e)}")
 
+    @instrument("publishing", "get_order_status")
     async def get_order_status(self, order_id: str) -> Dict:
         """Get the status of a book order."""
         try:
-            response = requests.get(
-                f"{self.api_url}/orders/{order_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("GET", f"/orders/{order_id}")
 
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error getting order status: {str(e)}")
 
+    async def get_order_statuses(self, order_ids: List[str]) -> Dict[str, Dict]:
+        """Get the status of many orders concurrently.
+
+        Orders whose lookup fails map to ``{"error": ...}`` instead of failing the batch.
+        """
+        semaphore = asyncio.Semaphore(self.status_concurrency)
+
+        async def fetch(order_id: str) -> Dict:
+            async with semaphore:
+                try:
+                    return await self.get_order_status(order_id)
+                except Exception as e:
+                    return {"error": str(e)}
+
+        statuses = await asyncio.gather(*(fetch(order_id) for order_id in order_ids))
+        return dict(zip(order_ids, statuses))
+
+    @instrument("publishing", "get_shipping_estimate")
     async def get_shipping_estimate(self, shipping_address: Dict) -> Dict:
         """Get shipping cost and time estimate."""
         try:
-            response = requests.post(
-                f"{self.api_url}/shipping/estimate",
-                json=shipping_address,
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("POST", "/shipping/estimate", json=shipping_address)
 
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error getting shipping estimate: {str(e)}")
 
+    @instrument("publishing", "cancel_order")
     async def cancel_order(self, order_id: str) -> Dict:
         """Cancel a book order if it hasn't been printed yet."""
         try:
-            response = requests.post(
-                f"{self.api_url}/orders/{order_id}/cancel",
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("POST", f"/orders/{order_id}/cancel")
 
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error canceling order: {str(e)}")
 
+    @instrument("publishing", "get_available_formats")
     async def get_available_formats(self) -> List[Dict]:
         """Get available book formats and options."""
         try:
-            response = requests.get(
-                f"{self.api_url}/formats",
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("GET", "/formats")
 
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error getting available formats: {str(e)}")
 
+    @instrument("publishing", "validate_book_data")
     async def validate_book_data(self, book_data: Dict) -> Dict:
         """Validate book data before sending to publishing service."""
         try:
-            response = requests.post(
-                f"{self.api_url}/validate",
-                json=book_data,
-                headers=self.headers
-            )
-            response.raise_for_status()
+            response = await self._request("POST", "/validate", json=book_data)
 
             return response.json()
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Error validating book data: {str(e)}") 
\ No newline at end of file
+        except httpx.HTTPError as e:
+            raise Exception(f"Error validating book data: {str(e)}")
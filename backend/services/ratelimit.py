@@ -0,0 +1,413 @@
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Pattern, Sequence, Tuple
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimit:
+    """At most ``limit`` requests per sliding ``window`` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """Parse "10/hour", "5/minute" or "100/3600" (requests per seconds)."""
+        limit, _, window = value.partition("/")
+        window = window.strip().lower()
+        if window.replace(".", "", 1).isdigit():
+            seconds = float(window)
+        else:
+            seconds = WINDOW_SECONDS.get(window.rstrip("s"))
+        if seconds is None:
+            raise ValueError(f"Invalid rate limit: {value!r}")
+        return cls(int(limit), seconds)
+
+
+def sliding_window(now: float, rate: RateLimit, current: int, previous: int) -> Tuple[bool, float]:
+    """Decide one request against a sliding-window counter.
+
+    The previous fixed window's count is weighted by how much of it still overlaps
+    the sliding window. Returns (allowed, seconds until a request would be allowed).
+    A limit of zero or less rejects every request.
+    """
+    window = rate.window
+    if rate.limit <= 0:
+        return False, float(window)
+    elapsed = now % window
+    estimate = previous * (window - elapsed) / window + current
+    if estimate + 1 <= rate.limit:
+        return True, 0.0
+    if current + 1 > rate.limit:
+        # This window alone is full: wait for it to end and for its weight to decay
+        return False, (window - elapsed) + max(0.0, window * (1 - (rate.limit - 1) / current))
+    return False, max(0.0, (window - elapsed) - window * (rate.limit - 1 - current) / previous)
+
+
+class RateLimiter:
+    """Base class for sliding-window request counters."""
+
+    async def hit(self, key: str, rate: RateLimit) -> float:
+        """Count a request against ``key``; return 0 if allowed, else seconds to wait.
+
+        Rejected requests are not counted, so Retry-After is honest.
+        """
+        return await self.hit_all([(key, rate)])
+
+    async def hit_all(self, hits: Sequence[Tuple[str, RateLimit]]) -> float:
+        """Count a request against every key only if all of them allow it.
+
+        Returns 0 if allowed, else the longest wait among the limits that refused.
+        A request rejected by one limit therefore uses up none of the others.
+        """
+        raise NotImplementedError
+
+
+def _longest_wait(decisions: Sequence[Tuple[bool, float]]) -> float:
+    return max((retry_after for allowed, retry_after in decisions if not allowed), default=0.0)
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Per-process counters, least recently used keys evicted beyond ``max_keys``."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [window index, count in that window, count in the window before]
+        self._counters: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def _counter(self, key: str, rate: RateLimit, now: float) -> List[int]:
+        index = int(now // rate.window)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [index, 0, 0]
+            if len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+            if counter[0] != index:
+                counter[2] = counter[1] if counter[0] == index - 1 else 0
+                counter[0], counter[1] = index, 0
+        return counter
+
+    async def hit_all(self, hits: Sequence[Tuple[str, RateLimit]]) -> float:
+        now = time.time()
+        counters = [self._counter(key, rate, now) for key, rate in hits]
+        decisions = [
+            sliding_window(now, rate, counter[1], counter[2])
+            for (_, rate), counter in zip(hits, counters)
+        ]
+        if not all(allowed for allowed, _ in decisions):
+            return _longest_wait(decisions)
+        for counter in counters:
+            counter[1] += 1
+        return 0.0
+
+
+# Checks every limit, then increments all of them or none, atomically so concurrent
+# API processes can't overshoot. KEYS are (current, previous) window pairs and ARGV
+# (weight of the previous window, limit, expiry in ms) triples, one per limit.
+_HIT_SCRIPT = """
+local reply = {1}
+for i = 1, #KEYS / 2 do
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    if previous * tonumber(ARGV[3 * i - 2]) + current + 1 > tonumber(ARGV[3 * i - 1]) then
+        reply[1] = 0
+    end
+    table.insert(reply, current)
+    table.insert(reply, previous)
+end
+if reply[1] == 1 then
+    for i = 1, #KEYS / 2 do
+        redis.call('INCR', KEYS[2 * i - 1])
+        redis.call('PEXPIRE', KEYS[2 * i - 1], ARGV[3 * i])
+    end
+end
+return reply
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """Counters shared by every API process, one Redis key per key and fixed window."""
+
+    def __init__(self, url: str, prefix: str = "memorymaker:ratelimit:", timeout: float = 0.1):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RedisRateLimiter requires the 'redis' package to be installed")
+
+        # A short timeout keeps a struggling Redis from adding latency to every request
+        self.client = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.prefix = prefix
+        self._script = self.client.register_script(_HIT_SCRIPT)
+
+    async def hit_all(self, hits: Sequence[Tuple[str, RateLimit]]) -> float:
+        now = time.time()
+        keys, args = [], []
+        for key, rate in hits:
+            index = int(now // rate.window)
+            keys += [f"{self.prefix}{key}:{index}", f"{self.prefix}{key}:{index - 1}"]
+            weight = (rate.window - now % rate.window) / rate.window
+            args += [repr(weight), rate.limit, int(rate.window * 2000)]
+        reply = await self._script(keys=keys, args=args)
+        if reply[0]:
+            return 0.0
+        return _longest_wait([
+            sliding_window(now, rate, int(reply[2 * i + 1]), int(reply[2 * i + 2]))
+            for i, (_, rate) in enumerate(hits)
+        ])
+
+
+class FallbackRateLimiter(RateLimiter):
+    """Uses ``primary`` (Redis), switching to ``fallback`` for a while when it errors."""
+
+    def __init__(self, primary: RateLimiter, fallback: RateLimiter, retry_interval: float = 5.0):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+
+    async def hit_all(self, hits: Sequence[Tuple[str, RateLimit]]) -> float:
+        if time.monotonic() >= self._down_until:
+            try:
+                return await self.primary.hit_all(hits)
+            except Exception as e:
+                logger.warning("Rate limiter backend unavailable, using in-memory limits: %s", e)
+                self._down_until = time.monotonic() + self.retry_interval
+        return await self.fallback.hit_all(hits)
+
+
+def create_rate_limiter_from_env() -> RateLimiter:
+    """Build the limiter selected by RATE_LIMIT_BACKEND (memory or redis)."""
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryRateLimiter()
+    if backend == "redis":
+        return FallbackRateLimiter(
+            RedisRateLimiter(
+                os.getenv("REDIS_URL", "redis://localhost:6379"),
+                timeout=float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.1")),
+            ),
+            MemoryRateLimiter(),
+        )
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """Caps in-flight generations in this process.
+
+    Requests beyond ``max_in_flight`` wait in a queue of at most ``max_waiting``
+    for up to ``wait_timeout`` seconds; anything else is rejected straight away,
+    so a burst can't pile up unbounded work behind the cap.
+    """
+
+    def __init__(
+        self, max_in_flight: int, max_waiting: int, wait_timeout: float, retry_after: float = 5.0
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionRule:
+    """Limits for requests matching ``method`` and the ``path`` regex.
+
+    Rules sharing a ``bucket`` share counters, so e.g. streamed and queued
+    generations draw on the same per-user allowance.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        bucket: str,
+        per_user: Optional[RateLimit] = None,
+        per_ip: Optional[RateLimit] = None,
+        gated: bool = False,
+    ):
+        self.method = method
+        self.path: Pattern = re.compile(path)
+        self.bucket = bucket
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.gated = gated
+
+
+def _too_many(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Rate limits and concurrency caps for the expensive endpoints.
+
+    Requests that match no rule pass straight through after one dict lookup, so
+    other endpoints' latency is unaffected while generation endpoints are throttled.
+    Users are identified by ``identify``, which maps a bearer token to its verified
+    subject (None for invalid tokens, which only get the per-IP limit), and clients
+    by IP (the first X-Forwarded-For hop when ``trust_forwarded`` is set behind a proxy).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: List[AdmissionRule],
+        limiter: Optional[RateLimiter] = None,
+        gate: Optional[ConcurrencyGate] = None,
+        trust_forwarded: bool = False,
+        identify: Optional[Callable[[str], Optional[str]]] = None,
+    ):
+        self.app = app
+        self.identify = identify
+        self.rules = {}
+        for rule in rules:
+            self.rules.setdefault(rule.method, []).append(rule)
+        self.limiter = limiter or create_rate_limiter_from_env()
+        self.gate = gate
+        self.trust_forwarded = trust_forwarded
+
+    def _match(self, scope: Scope) -> Optional[AdmissionRule]:
+        for rule in self.rules.get(scope["method"], ()):
+            if rule.path.fullmatch(scope["path"]):
+                return rule
+        return None
+
+    def _client_ip(self, scope: Scope, headers: dict) -> str:
+        if self.trust_forwarded and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].split(b",")[0].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = self._match(scope) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        checks = []
+        if rule.per_ip is not None:
+            checks.append((f"{rule.bucket}:ip:{self._client_ip(scope, headers)}", rule.per_ip))
+        authorization = headers.get(b"authorization", b"")
+        if (
+            rule.per_user is not None
+            and self.identify is not None
+            and authorization.lower().startswith(b"bearer ")
+        ):
+            # Keyed on the token's subject, so minting new tokens doesn't reset the allowance
+            user = self.identify(authorization[7:].strip().decode("latin-1"))
+            if user is not None:
+                checks.append((f"{rule.bucket}:user:{user}", rule.per_user))
+
+        retry_after = await self.limiter.hit_all(checks) if checks else 0.0
+        if retry_after:
+            await _too_many(429, "Rate limit exceeded", retry_after)(scope, receive, send)
+            return
+
+        if not rule.gated or self.gate is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            async with self.gate.slot():
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            reject = _too_many(503, "Too many generations in progress", e.retry_after)
+            await reject(scope, receive, send)
+
+
+def generation_rules_from_env() -> List[AdmissionRule]:
+    """Limits for the endpoints that spend OpenAI money, from GENERATION_RATE_LIMIT_* settings."""
+    per_user = RateLimit.parse(os.getenv("GENERATION_RATE_LIMIT_USER", "10/hour"))
+    per_ip = RateLimit.parse(os.getenv("GENERATION_RATE_LIMIT_IP", "30/hour"))
+    return [
+        AdmissionRule("POST", r"/books/create", "generation", per_user, per_ip),
+        AdmissionRule("POST", r"/books/create/stream", "generation", per_user, per_ip, gated=True),
+        AdmissionRule("POST", r"/books/\d+/upgrade", "generation", per_user, per_ip),
+        # Narration is synthesized (and paid for) on a book's first audio request; clients
+        # poll while it is queued, so the allowance covers polling as well
+        AdmissionRule(
+            "GET",
+            r"/books/\d+/audio",
+            "narration",
+            RateLimit.parse(os.getenv("NARRATION_RATE_LIMIT_USER", "120/hour")),
+            RateLimit.parse(os.getenv("NARRATION_RATE_LIMIT_IP", "300/hour")),
+        ),
+    ]
+
+
+def auth_rules_from_env() -> List[AdmissionRule]:
+    """Per-IP limits on password hashing endpoints, against credential stuffing and CPU use."""
+    per_ip = RateLimit.parse(os.getenv("LOGIN_RATE_LIMIT_IP", "20/minute"))
+    return [
+        AdmissionRule("POST", r"/users/login", "login", per_ip=per_ip),
+        AdmissionRule("POST", r"/users/register", "login", per_ip=per_ip),
+    ]
+
+
+def create_generation_gate_from_env() -> ConcurrencyGate:
+    return ConcurrencyGate(
+        max_in_flight=int(os.getenv("GENERATION_MAX_IN_FLIGHT", "8")),
+        max_waiting=int(os.getenv("GENERATION_MAX_WAITING", "16")),
+        wait_timeout=float(os.getenv("GENERATION_WAIT_TIMEOUT", "10")),
+    )
@@ -0,0 +1,241 @@
+import os
+import io
+import asyncio
+import logging
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+from PIL import Image, ImageDraw, ImageFont
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# DejaVu Sans ships with the fonts-dejavu-core package, which the Docker image installs
+FONT_PATH = os.getenv("PAGE_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+LOSSY_FORMATS = {"JPEG", "WEBP"}
+
+
+class FontNotFoundError(RuntimeError):
+    """The configured page font could not be loaded."""
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int) -> ImageFont.FreeTypeFont:
+    """Load the page font once per process and size.
+
+    There is deliberately no fallback: Pillow's default font would print every
+    book in a tiny bitmap face. See check_font().
+    """
+    return ImageFont.truetype(FONT_PATH, size)
+
+
+def check_font() -> None:
+    """Raise with a clear message when PAGE_FONT_PATH can't be loaded."""
+    try:
+        load_font(12)
+    except OSError as error:
+        logger.error("Page font %r could not be loaded: %s", FONT_PATH, error)
+        raise FontNotFoundError(
+            f"Page font {FONT_PATH!r} was not found; set PAGE_FONT_PATH to a TrueType font"
+        ) from error
+
+
+class PageRenderer:
+    """Renders book pages from a cached base canvas that already carries the watermark."""
+
+    def __init__(
+        self,
+        width: int = 1200,
+        height: int = 800,
+        font_size: int = 36,
+        margin: int = 50,
+        watermark: Optional[str] = "PREVIEW",
+        quality: int = 80,
+    ):
+        self.width = width
+        self.height = height
+        self.font_size = font_size
+        self.margin = margin
+        self.watermark = watermark
+        self.quality = quality  # Only used by lossy formats
+        self._base: Optional[Image.Image] = None
+
+    def _draw_watermark(self, draw: ImageDraw.ImageDraw) -> None:
+        if self.watermark:
+            watermark_size = max(self.height * 72 // 800, 12)
+            font = load_font(watermark_size)
+            watermark_width = draw.textlength(self.watermark, font=font)
+            watermark_x = (self.width - watermark_width) // 2
+            watermark_y = (self.height - watermark_size) // 2
+            draw.text((watermark_x, watermark_y), self.watermark, fill=(200, 200, 200), font=font)
+
+    def _base_canvas(self) -> Image.Image:
+        """Build the white page with the watermark drawn on it, once per renderer."""
+        if self._base is None:
+            base = Image.new('RGB', (self.width, self.height), 'white')
+            self._draw_watermark(ImageDraw.Draw(base))
+            self._base = base
+        return self._base
+
+    def _wrap(self, text: str, width: float) -> str:
+        """Wrap text to lines no wider than ``width`` pixels in the page font."""
+        font = load_font(self.font_size)
+        lines = []
+        for paragraph in text.splitlines() or [""]:
+            line = ""
+            for word in paragraph.split():
+                candidate = f"{line} {word}" if line else word
+                if line and font.getlength(candidate) > width:
+                    lines.append(line)
+                    candidate = word
+                line = candidate
+            lines.append(line)
+        return "\n".join(lines)
+
+    def render(self, text: str, format: str = "PNG", image: Optional[bytes] = None) -> bytes:
+        """Render a single page to encoded image bytes.
+
+        With ``image`` (an encoded illustration), the illustration is fitted into
+        the right half of the page and the text wraps in the left half.
+        """
+        page = self._base_canvas().copy()
+        draw = ImageDraw.Draw(page)
+        font = load_font(self.font_size)
+        if image is None:
+            wrapped_text = textwrap.fill(text, width=40)
+        else:
+            column = (self.width - 3 * self.margin) // 2
+            illustration = Image.open(io.BytesIO(image)).convert("RGB")
+            illustration.thumbnail((column, self.height - 2 * self.margin), Image.LANCZOS)
+            x = self.width - self.margin - column + (column - illustration.width) // 2
+            page.paste(illustration, (x, (self.height - illustration.height) // 2))
+            # Previews stay watermarked over the illustration too
+            self._draw_watermark(draw)
+            wrapped_text = self._wrap(text, column)
+        draw.text((self.margin, self.margin), wrapped_text, fill='black', font=font)
+
+        img_byte_arr = io.BytesIO()
+        if format.upper() in LOSSY_FORMATS:
+            page.save(img_byte_arr, format=format, quality=self.quality)
+        else:
+            page.save(img_byte_arr, format=format)
+        return img_byte_arr.getvalue()
+
+
+# Each pool worker keeps one renderer per option set (e.g. preview and full
+# quality), so fonts and base canvases are built once per process rather than
+# once per page.
+_worker_renderers: Dict[tuple, PageRenderer] = {}
+
+
+def _worker_renderer(options: Dict) -> PageRenderer:
+    key = tuple(sorted(options.items()))
+    renderer = _worker_renderers.get(key)
+    if renderer is None:
+        renderer = _worker_renderers[key] = PageRenderer(**options)
+        renderer._base_canvas()
+    return renderer
+
+
+def _init_worker(options: Dict) -> None:
+    _worker_renderer(options)
+
+
+def _render_in_worker(
+    text: str, format: str, options: Dict, image: Optional[bytes] = None
+) -> bytes:
+    return _worker_renderer(options).render(text, format, image)
+
+
+class RenderPool:
+    """Async front end that renders pages in a process pool, off the event loop."""
+
+    def __init__(self, max_workers: Optional[int] = None, **renderer_options: Any) -> None:
+        self.max_workers = max_workers or int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count()
+        self.renderer_options = renderer_options
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        """Check the page font and create the pool.
+
+        Called at service start-up so a missing font fails there, not as a broken
+        pool (the workers load it in their initializer) on the first book.
+        """
+        if self._executor is None:
+            check_font()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.renderer_options,),
+            )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        self.start()
+        return self._executor
+
+    async def render_page(
+        self, text: str, format: str = "PNG", image: Optional[bytes] = None, **options: Any
+    ) -> bytes:
+        """Render one page in the pool; ``options`` override the pool's renderer options."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            _render_in_worker,
+            text,
+            format,
+            {**self.renderer_options, **options},
+            image,
+        )
+
+    async def render_pages(
+        self,
+        texts: List[str],
+        format: str = "PNG",
+        images: Optional[List[Optional[bytes]]] = None,
+        **options: Any,
+    ) -> List[bytes]:
+        """Render every page of a book in parallel, preserving page order.
+
+        ``images`` holds each page's illustration, or None for text-only pages.
+        """
+        images = images or [None] * len(texts)
+        return list(
+            await asyncio.gather(
+                *(
+                    self.render_page(text, format, image, **options)
+                    for text, image in zip(texts, images)
+                )
+            )
+        )
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        """Run any other picklable CPU-bound function (e.g. image conversion) in the pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_default_pool: Optional[RenderPool] = None
+
+
+def get_render_pool() -> RenderPool:
+    """Return the process-wide render pool, creating it on first use."""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = RenderPool()
+    return _default_pool
+
+
+def shutdown_render_pool() -> None:
+    global _default_pool
+    if _default_pool is not None:
+        _default_pool.shutdown()
+        _default_pool = None
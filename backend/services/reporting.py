@@ -0,0 +1,102 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Order, OrderDailyStats
+
+# Status whose order amounts count as revenue; refunds move an order out of it
+REVENUE_STATUS = "completed"
+
+
+class OrderStatsDelta:
+    """Changes to order_daily_stats from one batch of order writes, applied as a single upsert.
+
+    Orders are bucketed by the day they were created, so a status change moves
+    the order (and its amount) from one status bucket of that day to another.
+    The summary is always up to date without rescanning orders.
+    """
+
+    def __init__(self) -> None:
+        self._changes: Dict[Tuple[date, str], List] = defaultdict(lambda: [0, 0.0])
+
+    def record(self, before: Optional[Dict], after: Dict, created_at: datetime) -> None:
+        """Account for one order going from ``before`` (None if new) to ``after``."""
+        day = created_at.date()
+        if before is not None:
+            self._add(day, before["status"], -1, -(before["amount"] or 0))
+        self._add(day, after["status"], 1, after["amount"] or 0)
+
+    def _add(self, day: date, status: str, count: int, revenue: float) -> None:
+        change = self._changes[(day, status)]
+        change[0] += count
+        change[1] += revenue
+
+    def apply(self, db: Session) -> None:
+        rows = [
+            {"day": day, "status": status, "order_count": count, "revenue": revenue}
+            for (day, status), (count, revenue) in self._changes.items()
+            if count or revenue
+        ]
+        if not rows:
+            return
+        statement = dialect_insert(db.get_bind().dialect.name)(OrderDailyStats)
+        db.execute(
+            statement.values(rows).on_conflict_do_update(
+                index_elements=[OrderDailyStats.day, OrderDailyStats.status],
+                set_={
+                    "order_count": OrderDailyStats.order_count + statement.excluded.order_count,
+                    "revenue": OrderDailyStats.revenue + statement.excluded.revenue,
+                },
+            )
+        )
+
+
+def rebuild_order_stats(db: Session) -> None:
+    """Recompute order_daily_stats from orders.
+
+    Use after a bulk import that bypassed the webhook worker.
+    """
+    day = func.date(Order.created_at)
+    db.execute(delete(OrderDailyStats))
+    db.execute(
+        insert(OrderDailyStats).from_select(
+            ["day", "status", "order_count", "revenue"],
+            select(day, Order.status, func.count(), func.coalesce(func.sum(Order.amount), 0))
+            .where(Order.created_at.is_not(None), Order.status.is_not(None))
+            .group_by(day, Order.status),
+        )
+    )
+
+
+async def order_summary(db: AsyncSession, since: date, until: date) -> Dict:
+    """Revenue and order volume per day and status between two dates, inclusive.
+
+    Reads at most one row per day and status.
+    """
+    rows = (await db.execute(
+        select(OrderDailyStats)
+        .where(OrderDailyStats.day >= since, OrderDailyStats.day <= until)
+        .order_by(OrderDailyStats.day)
+    )).scalars()
+
+    days: Dict[date, Dict] = {}
+    totals: Dict[str, int] = defaultdict(int)
+    revenue = 0.0
+    for row in rows:
+        entry = days.setdefault(row.day, {"day": row.day, "revenue": 0.0, "orders": {}})
+        entry["orders"][row.status] = row.order_count
+        totals[row.status] += row.order_count
+        if row.status == REVENUE_STATUS:
+            entry["revenue"] = row.revenue
+            revenue += row.revenue
+    return {
+        "since": since,
+        "until": until,
+        "revenue": round(revenue, 2),
+        "orders": dict(totals),
+        "days": list(days.values()),
+    }
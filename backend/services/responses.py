@@ -0,0 +1,210 @@
+import os
+import json
+import gzip
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # pip install .[speedups]
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON rendered with orjson when it is installed, compact stdlib json otherwise.
+
+    Both render datetimes as ISO 8601, so output matches whichever is in use.
+    Endpoints that build large payloads return this directly, which also skips
+    FastAPI's jsonable_encoder pass over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+
+# Already-compressed media (images, audio, PDFs) only gets bigger when compressed again
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings the client accepts (q > 0), from an Accept-Encoding header."""
+    accepted = []
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compresses responses of at least ``minimum_size`` bytes with brotli (if installed) or gzip.
+
+    Only complete, text-like bodies are compressed. Streamed responses (server-sent
+    events, artifact downloads), byte ranges and bodies that already carry a
+    Content-Encoding pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size or int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.gzip_level = gzip_level or int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+        # Quality 11 is meant for static assets; 4 is about gzip's speed with smaller output
+        self.brotli_quality = brotli_quality or int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = accepted_encodings(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk shows whether to compress
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or "content-range" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                start = None
+                await send(message)
+                return
+
+            body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class Fieldset:
+    """A parsed ``?fields=`` selection.
+
+    Names are comma separated; dotted names select inside nested objects and
+    lists, e.g. ``title,pages.page_number,pages.page_image``. No selection
+    means every field.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, "Fieldset"]] = None) -> None:
+        self.fields = fields  # None selects everything
+
+    @classmethod
+    def parse(cls, fields: Optional[str]) -> "Fieldset":
+        paths = [name.strip() for name in (fields or "").split(",") if name.strip()]
+        return cls._from_paths(paths) if paths else cls()
+
+    @classmethod
+    def _from_paths(cls, paths: List[str]) -> "Fieldset":
+        groups: Dict[str, List[str]] = {}
+        for path in paths:
+            head, _, rest = path.partition(".")
+            groups.setdefault(head, []).append(rest)
+        return cls({
+            head: cls() if "" in rests else cls._from_paths(rests)
+            for head, rests in groups.items()
+        })
+
+    def includes(self, name: str) -> bool:
+        return self.fields is None or name in self.fields
+
+    def nested(self, name: str) -> "Fieldset":
+        """The selection inside ``name``; everything when no subfields were named."""
+        return self if self.fields is None else self.fields.get(name, Fieldset({}))
+
+    def apply(self, value: Any, strict: bool = True) -> Any:
+        """Trim a payload (or each item of a list) to the selection.
+
+        Unknown top-level names raise InvalidFields; nested objects such as
+        per-page image maps vary in shape, so missing names there are skipped.
+        """
+        if self.fields is None:
+            return value
+        if isinstance(value, list):
+            return [self.apply(item, strict) for item in value]
+        if not isinstance(value, dict):
+            return value
+        unknown = [name for name in self.fields if name not in value]
+        if strict and unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+        return {
+            name: self.fields[name].apply(item, strict=False)
+            for name, item in value.items()
+            if name in self.fields
+        }
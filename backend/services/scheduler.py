@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from services.instrumentation import instrument
+
+load_dotenv()
+
+# Lower numbers are served first
+PRIORITY_PAID = 0
+PRIORITY_PREVIEW = 1
+
+# Requests/tokens per minute; override with OPENAI_RATE_LIMITS (same JSON shape)
+DEFAULT_RATE_LIMITS = {
+    "gpt-4": {"rpm": 500, "tpm": 30000},
+    "gpt-3.5-turbo": {"rpm": 3500, "tpm": 90000},
+    "dall-e": {"rpm": 50},
+    "tts-1": {"rpm": 50},
+}
+
+# USD per 1K prompt/completion tokens, or per image; override with OPENAI_PRICING
+DEFAULT_PRICING = {
+    "gpt-4": {"prompt": 0.03, "completion": 0.06},
+    "gpt-3.5-turbo": {"prompt": 0.0015, "completion": 0.002},
+    "dall-e": {"image": 0.02},
+}
+
+generation_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "generation_priority", default=PRIORITY_PREVIEW
+)
+
+
+class Usage:
+    """Token and cost totals accumulated for one book's generation."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.images = 0
+        self.cost = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "images": self.images,
+            "cost": round(self.cost, 6),
+        }
+
+
+current_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar(
+    "current_usage", default=None
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return max(1, len(text) // 4)
+
+
+class PriorityTokenBucket:
+    """Token bucket that hands out capacity to waiters in priority order."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float, priority: int = PRIORITY_PREVIEW) -> None:
+        amount = min(amount, self.capacity)
+        entry = (priority, next(self._sequence))
+        async with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry and self.tokens >= amount:
+                        heapq.heappop(self._waiters)
+                        self.tokens -= amount
+                        self._condition.notify_all()
+                        return
+                    # The head waiter sleeps until its tokens have refilled; others wait to be woken
+                    timeout = None
+                    if self._waiters[0] == entry:
+                        timeout = (amount - self.tokens) / self.rate
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                raise
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take extra (negative) tokens once the real usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the provider answered 429, so every caller slows down."""
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class _SharedCall:
+    """An in-flight OpenAI call and the number of callers waiting on its result."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class OpenAIScheduler:
+    """Client-side admission for OpenAI calls, shared by everything in the process.
+
+    Each model has a request bucket and (for chat models) a token bucket sized
+    from its RPM/TPM limits. Paid books are admitted ahead of free previews,
+    identical in-flight requests are coalesced into one call, 429s drain the
+    buckets instead of triggering immediate retries, and token usage and cost
+    are charged to the book being generated (see ``current_usage``).
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, Dict]] = None,
+        pricing: Optional[Dict[str, Dict]] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.rate_limits = (
+            rate_limits
+            or json.loads(os.getenv("OPENAI_RATE_LIMITS", "null"))
+            or DEFAULT_RATE_LIMITS
+        )
+        self.pricing = pricing or json.loads(os.getenv("OPENAI_PRICING", "null")) or DEFAULT_PRICING
+        if max_retries is None:
+            max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+        self.max_retries = max_retries
+        self._request_buckets: Dict[str, PriorityTokenBucket] = {}
+        self._token_buckets: Dict[str, PriorityTokenBucket] = {}
+        self._inflight: Dict[str, _SharedCall] = {}
+        self.coalesced = 0
+        self.rate_limited = 0
+
+    def _buckets(
+        self, model: str
+    ) -> Tuple[Optional[PriorityTokenBucket], Optional[PriorityTokenBucket]]:
+        limits = self.rate_limits.get(model, {})
+        if model not in self._request_buckets and "rpm" in limits:
+            self._request_buckets[model] = PriorityTokenBucket(limits["rpm"])
+        if model not in self._token_buckets and "tpm" in limits:
+            self._token_buckets[model] = PriorityTokenBucket(limits["tpm"])
+        return self._request_buckets.get(model), self._token_buckets.get(model)
+
+    async def submit(
+        self,
+        model: str,
+        key: Optional[str],
+        call: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0,
+        usage_of: Optional[Callable[[Any], Tuple[int, int]]] = None,
+        images: int = 0,
+    ) -> Any:
+        """Run ``call`` once admitted, sharing the result with identical in-flight requests.
+
+        ``usage_of`` maps the response to (prompt tokens, completion tokens) so the
+        token bucket and the current book's usage are corrected to actual figures.
+        Pass ``key=None`` for calls that must not be shared, such as streams.
+        """
+        if key is None:
+            return await self._admit_and_call(model, call, estimated_tokens, usage_of, images)
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+        else:
+            # The call runs as its own task, so cancelling whichever caller started it
+            # (e.g. a cancelled book) does not cancel it for the others
+            shared = _SharedCall(
+                asyncio.create_task(
+                    self._admit_and_call(model, call, estimated_tokens, usage_of, images)
+                )
+            )
+            self._inflight[key] = shared
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                # Every caller has been cancelled, so nobody wants the result
+                self._forget(key, shared)
+                shared.task.cancel()
+
+    def _forget(self, key: str, shared: "_SharedCall") -> None:
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+
+    async def _admit_and_call(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[Any]],
+        estimated_tokens: int,
+        usage_of: Optional[Callable[[Any], Tuple[int, int]]],
+        images: int,
+    ) -> Any:
+        priority = generation_priority.get()
+        request_bucket, token_bucket = self._buckets(model)
+        for attempt in range(self.max_retries + 1):
+            if request_bucket is not None:
+                await request_bucket.acquire(1, priority)
+            if token_bucket is not None and estimated_tokens:
+                await token_bucket.acquire(estimated_tokens, priority)
+            try:
+                # Timed per attempt, so this is provider latency without the rate limiter's wait
+                with instrument("openai", model):
+                    response = await call()
+            except Exception as e:
+                if not _is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                for bucket in (request_bucket, token_bucket):
+                    if bucket is not None:
+                        bucket.drain()
+                await asyncio.sleep(_retry_after(e) or random.uniform(0, 2 ** attempt))
+                continue
+
+            if usage_of is not None or images:
+                prompt_tokens, completion_tokens = usage_of(response) if usage_of else (0, 0)
+                self.settle(model, estimated_tokens, prompt_tokens, completion_tokens, images)
+            return response
+
+    def settle(
+        self,
+        model: str,
+        estimated_tokens: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        images: int = 0,
+    ) -> None:
+        """Correct the token bucket to the actual usage and charge it to the current book."""
+        token_bucket = self._token_buckets.get(model)
+        if token_bucket is not None and estimated_tokens:
+            token_bucket.adjust(estimated_tokens - (prompt_tokens + completion_tokens))
+
+        usage = current_usage.get()
+        if usage is None:
+            return
+        price = self.pricing.get(model, {})
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        usage.images += images
+        usage.cost += (
+            prompt_tokens / 1000 * price.get("prompt", 0)
+            + completion_tokens / 1000 * price.get("completion", 0)
+            + images * price.get("image", 0)
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "inflight": len(self._inflight),
+            "tokens_available": {
+                model: round(bucket.tokens) for model, bucket in self._token_buckets.items()
+            },
+            "requests_available": {
+                model: round(bucket.tokens) for model, bucket in self._request_buckets.items()
+            },
+        }
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return type(error).__name__ == "RateLimitError" or getattr(error, "http_status", None) == 429
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+_default_scheduler: Optional[OpenAIScheduler] = None
+
+
+def get_scheduler() -> OpenAIScheduler:
+    """Return the process-wide OpenAI scheduler, creating it on first use."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = OpenAIScheduler()
+    return _default_scheduler
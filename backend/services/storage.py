@@ -0,0 +1,260 @@
+import os
+import re
+import hashlib
+import asyncio
+import mimetypes
+import tempfile
+from typing import Dict, Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNK_SIZE = 64 * 1024
+
+# "start-end", "start-" or "-suffix length"
+RANGE_SPEC = re.compile(r"(\d*)-(\d*)")
+
+
+def artifact_key(digest: str, extension: str) -> str:
+    """Content-addressed key, e.g. ``3f/a1/3fa1...e9.png``."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def key_digest(key: str) -> str:
+    """The content hash embedded in an artifact key, usable as a strong ETag."""
+    return os.path.splitext(os.path.basename(key))[0]
+
+
+class ArtifactStore:
+    """Base class for content-addressed storage of page images, PDFs and audio."""
+
+    async def put(self, data: bytes, extension: str) -> str:
+        """Store bytes and return their artifact key. Identical content is stored once."""
+        raise NotImplementedError
+
+    async def put_file(self, path: str, extension: str) -> str:
+        """Store a file from disk without reading it fully into memory."""
+        raise NotImplementedError
+
+    async def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def content_type(self, key: str) -> str:
+        return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Stores artifacts on the local filesystem under a sharded directory tree."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Invalid artifact key: {key}")
+        return path
+
+    def _commit(self, tmp_path: str, key: str) -> None:
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def _put(self, data: bytes, extension: str) -> str:
+        key = artifact_key(hashlib.sha256(data).hexdigest(), extension)
+        if os.path.exists(self.path(key)):
+            return key
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._commit(tmp_path, key)
+        return key
+
+    def _put_file(self, source: str, extension: str) -> str:
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+        key = artifact_key(digest.hexdigest(), extension)
+        self._commit(tmp_path, key)
+        return key
+
+    def _get(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    async def put(self, data: bytes, extension: str) -> str:
+        return await asyncio.to_thread(self._put, data, extension)
+
+    async def put_file(self, path: str, extension: str) -> str:
+        return await asyncio.to_thread(self._put_file, path, extension)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._get, key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(key))
+
+
+class S3ArtifactStore(ArtifactStore):
+    """Stores artifacts in an S3-compatible bucket (AWS S3, MinIO, ...)."""
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        prefix: str = "",
+        url_expiry: int = 3600,
+    ):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise ImportError("S3ArtifactStore requires the 'boto3' package to be installed")
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expiry = url_expiry
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self.client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _put(self, data: bytes, extension: str) -> str:
+        key = artifact_key(hashlib.sha256(data).hexdigest(), extension)
+        if not self._exists(key):
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._object_key(key),
+                Body=data,
+                ContentType=self.content_type(key),
+            )
+        return key
+
+    def _put_file(self, path: str, extension: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        key = artifact_key(digest.hexdigest(), extension)
+        if not self._exists(key):
+            # upload_file streams in multipart chunks rather than loading the file
+            self.client.upload_file(
+                path, self.bucket, self._object_key(key),
+                ExtraArgs={"ContentType": self.content_type(key)},
+            )
+        return key
+
+    def _get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"].read()
+
+    def presigned_url(self, key: str) -> str:
+        """A short-lived URL clients can download from directly (S3 handles ranges and ETags)."""
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=self.url_expiry,
+        )
+
+    async def put(self, data: bytes, extension: str) -> str:
+        return await asyncio.to_thread(self._put, data, extension)
+
+    async def put_file(self, path: str, extension: str) -> str:
+        return await asyncio.to_thread(self._put_file, path, extension)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._get, key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._exists, key)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Dict[str, int]]:
+    """Parse a single ``bytes=start-end`` Range header.
+
+    Returns None when no range was requested or the header is malformed (which,
+    like multipart ranges, means serving the whole file), and raises ValueError
+    for ranges that cannot be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        # Multipart ranges aren't worth supporting; serve the whole file instead
+        return None
+    match = RANGE_SPEC.fullmatch(spec.strip())
+    if match is None or match.group() == "-":
+        return None
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if end_text and end < start:
+            # An inverted range is invalid rather than unsatisfiable, so it is ignored
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(end_text), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return {"start": start, "end": end}
+
+
+def iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Yield a file's bytes from start to end (inclusive) in fixed-size chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def create_artifact_store_from_env() -> ArtifactStore:
+    """Build the artifact store selected by ARTIFACT_BACKEND (local or s3)."""
+    backend = os.getenv("ARTIFACT_BACKEND", "local")
+    if backend == "local":
+        return LocalArtifactStore(os.getenv("ARTIFACT_DIR", "artifacts"))
+    elif backend == "s3":
+        return S3ArtifactStore(
+            bucket=os.getenv("ARTIFACT_BUCKET", "memorymaker-artifacts"),
+            endpoint_url=os.getenv("ARTIFACT_S3_ENDPOINT_URL"),
+            prefix=os.getenv("ARTIFACT_S3_PREFIX", ""),
+        )
+    else:
+        raise ValueError(f"Unknown artifact backend: {backend}")
+
+
+_default_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store, creating it on first use."""
+    global _default_store
+    if _default_store is None:
+        _default_store = create_artifact_store_from_env()
+    return _default_store
@@ -0,0 +1,191 @@
+import re
+import json
+import hashlib
+import threading
+from functools import lru_cache
+from string import Formatter
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from models import BookType
+
+PAGE_INSTRUCTIONS = (
+    "The story should be split into 5-7 pages, with each page being a short paragraph."
+)
+
+DEFAULT_SYSTEM_PROMPT = "You are a warm, imaginative writer of personalized books."
+
+# Template used for book types whose prompts are only a list of field labels
+GENERIC_TEMPLATE = """Create a personalized "{book_type_name}" book. {book_type_description}.
+Use these details from the customer:
+{details}
+""" + PAGE_INSTRUCTIONS
+
+# Built-in templates behind the API's book type keys ("children-story", "spouse-roasting")
+BUILTIN_TEMPLATES = {
+    "children-story": {
+        "system": "You are a children's story writer.",
+        "fields": ["name", "age", "interests"],
+        "template": """Create a children's bedtime story for {name}, who is {age} years old.
+The story should be engaging and include elements about {interests}.
+""" + PAGE_INSTRUCTIONS + """
+Make it magical and educational.""",
+    },
+    "spouse-roasting": {
+        "system": "You are a humorous writer.",
+        "fields": ["name", "interests"],
+        "template": """Create a fun, light-hearted roasting book for {name}.
+Include references to {interests} and make it humorous but not mean-spirited.
+""" + PAGE_INSTRUCTIONS + """
+Make it funny and personal.""",
+    },
+}
+
+
+def field_key(label: str) -> str:
+    """Normalize a prompt label such as "Child's Name" to its placeholder key, ``childs_name``."""
+    return re.sub(r"[^a-z0-9]+", "_", label.lower().replace("'", "")).strip("_")
+
+
+def book_type_key(book_type_id: int) -> str:
+    """Registry key for a BookType row. Ids are stable across admin renames."""
+    return f"book-type-{book_type_id}"
+
+
+class StoryTemplate:
+    """A prompt template compiled once into literal and placeholder segments.
+
+    Placeholders are validated against the declared fields when the template is
+    compiled, so a bad template fails at load time rather than mid-generation.
+    """
+
+    def __init__(self, key: str, system: str, template: str, fields: Iterable[str]):
+        self.key = key
+        self.system = system
+        self.fields = [field_key(field) for field in fields]
+        self._segments: List[Tuple[str, Optional[str]]] = []
+
+        for literal, placeholder, format_spec, conversion in Formatter().parse(template):
+            if placeholder is None:
+                self._segments.append((literal, None))
+                continue
+            if format_spec or conversion or not placeholder.isidentifier():
+                raise ValueError(
+                    f"Template {key} has an unsupported placeholder: {{{placeholder}}}"
+                )
+            if placeholder not in self.fields:
+                raise ValueError(f"Template {key} uses undeclared placeholder: {{{placeholder}}}")
+            self._segments.append((literal, placeholder))
+
+        self.placeholders = {placeholder for _, placeholder in self._segments if placeholder}
+        self._render_cached = lru_cache(maxsize=256)(self._render)
+
+    def _render(self, items: Tuple[Tuple[str, str], ...]) -> str:
+        values = dict(items)
+        missing = sorted(self.placeholders - values.keys())
+        if missing:
+            raise ValueError(f"Missing prompt fields for {self.key}: {', '.join(missing)}")
+        return "".join(
+            literal + (values[placeholder] if placeholder else "")
+            for literal, placeholder in self._segments
+        )
+
+    def render(self, prompts: Dict[str, str]) -> Tuple[str, str]:
+        """Return (system prompt, user prompt). Prompt keys may be labels or field keys."""
+        items = tuple(sorted((field_key(name), str(value)) for name, value in prompts.items()))
+        return self.system, self._render_cached(items)
+
+
+def _escape_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def prompt_fields(prompts: Union[Dict, List[str], None]) -> List[str]:
+    """The field labels customers fill in, from either shape of a BookType's ``prompts``."""
+    if isinstance(prompts, dict):
+        return list(prompts.get("fields", []))
+    return list(prompts or [])
+
+
+def compile_book_type(book_type: "BookType") -> StoryTemplate:
+    """Compile a BookType row's prompts into a template.
+
+    ``prompts`` is either a dict with ``fields``, ``template`` and optional
+    ``system`` keys, or (for older rows) a plain list of field labels, which
+    gets the generic template.
+    """
+    key = book_type_key(book_type.id)
+    prompts = book_type.prompts or []
+    if isinstance(prompts, dict):
+        return StoryTemplate(
+            key,
+            prompts.get("system", DEFAULT_SYSTEM_PROMPT),
+            prompts["template"],
+            prompts.get("fields", []),
+        )
+
+    # Admin-entered text is brace-escaped so only the field placeholders are parsed
+    details = "\n".join(f"- {_escape_braces(label)}: {{{field_key(label)}}}" for label in prompts)
+    template = GENERIC_TEMPLATE.format(
+        book_type_name=_escape_braces(book_type.name),
+        book_type_description=_escape_braces(book_type.description or ""),
+        details=details,
+    )
+    return StoryTemplate(key, DEFAULT_SYSTEM_PROMPT, template, prompts)
+
+
+class TemplateRegistry:
+    """Maps book type keys to compiled templates, recompiling a BookType only when it changes."""
+
+    def __init__(self) -> None:
+        self._templates: Dict[str, StoryTemplate] = {}
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        for key, spec in BUILTIN_TEMPLATES.items():
+            self.register(StoryTemplate(key, spec["system"], spec["template"], spec["fields"]))
+
+    def register(self, template: StoryTemplate) -> None:
+        with self._lock:
+            self._templates[template.key] = template
+
+    def get(self, key: str) -> StoryTemplate:
+        template = self._templates.get(key)
+        if template is None:
+            raise ValueError(f"Unknown book type: {key}")
+        return template
+
+    def for_book_type(self, book_type: "BookType") -> StoryTemplate:
+        """Return the compiled template for a BookType row, compiling it on first use or change."""
+        key = book_type_key(book_type.id)
+        version = hashlib.sha256(
+            json.dumps(
+                [book_type.name, book_type.description, book_type.prompts], sort_keys=True
+            ).encode()
+        ).hexdigest()
+        if self._versions.get(key) != version:
+            template = compile_book_type(book_type)
+            with self._lock:
+                self._templates[key] = template
+                self._versions[key] = version
+        return self._templates[key]
+
+    def load(self, book_types: Iterable) -> List[str]:
+        """Compile every given BookType, returning the keys whose templates failed validation."""
+        errors = []
+        for book_type in book_types:
+            try:
+                self.for_book_type(book_type)
+            except (ValueError, KeyError) as e:
+                errors.append(f"{book_type_key(book_type.id)}: {str(e)}")
+        return errors
+
+
+_default_registry: Optional[TemplateRegistry] = None
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Return the process-wide template registry, creating it on first use."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = TemplateRegistry()
+    return _default_registry
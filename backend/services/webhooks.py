@@ -0,0 +1,332 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from dotenv import load_dotenv
+
+from database import SessionLocal, dialect_insert
+from models import Book, Order, StripeEvent
+from services.jobs import COMPLETED, FAILED, QUEUED
+from services.reporting import OrderStatsDelta
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Order.status values. A later event never moves an order to a lower rank, so
+# a stale "failed" delivered after "completed" can't undo a payment.
+ORDER_PENDING = "pending"
+ORDER_FAILED = "failed"
+ORDER_COMPLETED = "completed"
+ORDER_REFUNDED = "refunded"
+
+STATUS_RANK = {ORDER_PENDING: 0, ORDER_FAILED: 1, ORDER_COMPLETED: 2, ORDER_REFUNDED: 3}
+
+ORDER_FIELDS = ("stripe_payment_id", "status", "amount", "book_id", "user_id")
+
+
+def _metadata_id(obj: Dict, name: str) -> Optional[int]:
+    value = (obj.get("metadata") or {}).get(name)
+    if value is None and name == "book_id":
+        value = obj.get("client_reference_id")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _cents(amount: Optional[int]) -> Optional[float]:
+    return amount / 100 if amount is not None else None
+
+
+def order_change(event_type: str, obj: Dict) -> Optional[Dict]:
+    """Map a Stripe event to the order row it implies, or None for events we don't track.
+
+    Checkout sessions and payment intents for the same payment share the
+    payment intent id, so both events land on one order.
+    """
+    if event_type.startswith("payment_intent."):
+        status = {
+            "payment_intent.succeeded": ORDER_COMPLETED,
+            "payment_intent.payment_failed": ORDER_FAILED,
+            "payment_intent.canceled": ORDER_FAILED,
+            "payment_intent.processing": ORDER_PENDING,
+            "payment_intent.created": ORDER_PENDING,
+        }.get(event_type)
+        payment_id = obj.get("id")
+        amount = _cents(obj.get("amount_received") or obj.get("amount"))
+    elif event_type.startswith("checkout.session."):
+        if event_type in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
+            paid = obj.get("payment_status") in ("paid", "no_payment_required")
+            status = ORDER_COMPLETED if paid else ORDER_PENDING
+        else:
+            status = {
+                "checkout.session.async_payment_failed": ORDER_FAILED,
+                "checkout.session.expired": ORDER_FAILED,
+            }.get(event_type)
+        payment_id = obj.get("payment_intent") or obj.get("id")
+        amount = _cents(obj.get("amount_total"))
+    elif event_type == "charge.refunded":
+        status = ORDER_REFUNDED if obj.get("refunded") else None
+        payment_id = obj.get("payment_intent")
+        # Fully refunded charges only, so this is the amount that was paid
+        amount = _cents(obj.get("amount_refunded") or obj.get("amount"))
+    else:
+        return None
+
+    if status is None or not payment_id:
+        return None
+    return {
+        "stripe_payment_id": payment_id,
+        "status": status,
+        "amount": amount,
+        "book_id": _metadata_id(obj, "book_id"),
+        "user_id": _metadata_id(obj, "user_id"),
+    }
+
+
+def merge_order(current: Optional[Dict], change: Dict) -> Dict:
+    """Fold an order change into the current row, keeping the highest-ranked status."""
+    if current is None:
+        return dict(change)
+    merged = {
+        field: change[field] if change[field] is not None else current[field]
+        for field in ORDER_FIELDS
+    }
+    if STATUS_RANK.get(current["status"], 0) > STATUS_RANK[change["status"]]:
+        merged["status"] = current["status"]
+    return merged
+
+
+async def record_event(db: AsyncSession, event: Dict) -> bool:
+    """Append a verified event to stripe_events. Returns False for a redelivery already recorded.
+
+    ``db`` is an AsyncSession; this is the only work done before the webhook is
+    acknowledged.
+    """
+    insert = dialect_insert(db.bind.dialect.name)
+    result = await db.execute(
+        insert(StripeEvent)
+        .values(
+            id=event["id"],
+            type=event["type"],
+            created=datetime.utcfromtimestamp(event["created"]),
+            payload=event,
+            received_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=[StripeEvent.id])
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+class WebhookProcessor:
+    """Applies recorded Stripe events to orders and books in batches.
+
+    Each batch is folded into one row per payment and written with a single
+    multi-row upsert, so a burst of checkout events costs a handful of
+    statements rather than several per event. Replaying events is safe:
+    upserts converge on the same rows and statuses never move backwards.
+    Paid previews are re-queued for their full-quality upgrade, and
+    ``on_upgrade`` is called with each re-queued book id after commit.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        on_upgrade: Optional[Callable[[int], Awaitable[None]]] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.on_upgrade = on_upgrade
+        self.batch_size = batch_size or int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+        self.poll_interval = poll_interval or float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the worker early, e.g. right after an event was recorded in this process."""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._work())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                await self.process_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stripe webhook batch failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_pending(self) -> int:
+        """Apply batches until no unprocessed events remain; returns the number applied."""
+        total = 0
+        while True:
+            applied, upgraded = await asyncio.to_thread(self._process_batch)
+            for book_id in upgraded:
+                if self.on_upgrade is not None:
+                    await self.on_upgrade(book_id)
+            total += applied
+            if applied < self.batch_size:
+                return total
+
+    def _claim(self, db: Session) -> List[StripeEvent]:
+        query = (
+            select(StripeEvent)
+            .where(StripeEvent.processed_at.is_(None))
+            .order_by(StripeEvent.created, StripeEvent.id)
+            .limit(self.batch_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            # Lets several workers drain the log without applying an event twice
+            query = query.with_for_update(skip_locked=True)
+        return list(db.execute(query).scalars())
+
+    def _process_batch(self) -> tuple:
+        with self.session_factory() as db:
+            events = self._claim(db)
+            if not events:
+                return 0, []
+            event_ids = [event.id for event in events]
+            try:
+                upgraded = self._apply(db, events)
+                self._mark_processed(db, event_ids)
+                db.commit()
+                return len(events), upgraded
+            except Exception:
+                db.rollback()
+                logger.exception(
+                    "Stripe webhook batch failed; applying %s events one at a time", len(events)
+                )
+
+        # Isolate the bad event so it doesn't hold up the rest of the batch
+        upgraded = []
+        for event_id in event_ids:
+            with self.session_factory() as db:
+                event = self._reclaim(db, event_id)
+                if event is None:
+                    continue
+                try:
+                    upgraded.extend(self._apply(db, [event]))
+                    self._mark_processed(db, [event_id])
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.exception("Stripe event %s could not be applied", event_id)
+                    self._mark_processed(db, [event_id], error=str(e))
+                    db.commit()
+        return len(event_ids), upgraded
+
+    def _reclaim(self, db: Session, event_id: str) -> Optional[StripeEvent]:
+        """Lock one unprocessed event again; None if it was applied or another worker holds it.
+
+        The batch's row locks were released by its rollback, so without this another
+        worker could claim and apply the same events while we retry them one by one.
+        """
+        query = select(StripeEvent).where(
+            StripeEvent.id == event_id, StripeEvent.processed_at.is_(None)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        return db.execute(query).scalars().first()
+
+    def _mark_processed(
+        self, db: Session, event_ids: List[str], error: Optional[str] = None
+    ) -> None:
+        db.execute(
+            update(StripeEvent)
+            .where(StripeEvent.id.in_(event_ids))
+            .values(processed_at=datetime.utcnow(), error=error)
+        )
+
+    def _apply(self, db: Session, events: List[StripeEvent]) -> List[int]:
+        """Upsert the orders implied by the events and return the books re-queued for upgrade."""
+        changes: Dict[str, Dict] = {}
+        for event in events:
+            change = order_change(event.type, event.payload["data"]["object"])
+            if change is not None:
+                key = change["stripe_payment_id"]
+                changes[key] = merge_order(changes.get(key), change)
+        if not changes:
+            return []
+
+        if db.get_bind().dialect.name == "postgresql":
+            # Another worker changing the same order would apply a stale delta to the stats.
+            # Row locks can't cover orders that don't exist yet (two workers would both count
+            # them as new), so each payment id is locked until commit instead, in a fixed
+            # order so that overlapping batches can't deadlock.
+            for key in sorted(changes):
+                db.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+        query = (
+            select(Order.created_at, *(getattr(Order, field) for field in ORDER_FIELDS))
+            .where(Order.stripe_payment_id.in_(list(changes)))
+        )
+        existing = {row["stripe_payment_id"]: dict(row) for row in db.execute(query).mappings()}
+        for key, row in existing.items():
+            changes[key] = merge_order(row, changes[key])
+        rows = list(changes.values())
+        for row in rows:
+            if row["amount"] is None:
+                # orders.amount is NOT NULL; a later event that carries the amount fills it in
+                row["amount"] = 0.0
+
+        now = datetime.utcnow()
+        stats = OrderStatsDelta()
+        for row in rows:
+            before = existing.get(row["stripe_payment_id"])
+            stats.record(before, row, (before or {}).get("created_at") or now)
+
+        insert = dialect_insert(db.get_bind().dialect.name)(Order)
+        db.execute(
+            insert.values([{**row, "created_at": now} for row in rows]).on_conflict_do_update(
+                index_elements=[Order.stripe_payment_id],
+                set_={
+                    field: insert.excluded[field]
+                    for field in ORDER_FIELDS
+                    if field != "stripe_payment_id"
+                },
+            )
+        )
+        stats.apply(db)
+
+        paid = [
+            {"id": row["book_id"], "price_paid": row["amount"]}
+            for row in rows
+            if row["status"] == ORDER_COMPLETED and row["book_id"] is not None
+        ]
+        if not paid:
+            return []
+        # ORM bulk UPDATE by primary key: one executemany for the whole batch
+        db.execute(update(Book), paid)
+
+        # Finished previews are regenerated at full quality; books still generating
+        # pick up the full tier for their remaining stages on their own.
+        book_ids = [row["id"] for row in paid]
+        upgradable = list(db.execute(
+            select(Book.id).where(Book.id.in_(book_ids), Book.status.in_([COMPLETED, FAILED]))
+        ).scalars())
+        if upgradable:
+            db.execute(
+                update(Book)
+                .where(Book.id.in_(upgradable))
+                .values(status=QUEUED, generation_attempts=0, generation_error=None)
+            )
+        return upgradable
@@ -7,17 +7,19 @@ setup(
     install_requires=[
         "fastapi==0.104.1",
         "uvicorn==0.24.0",
-        "sqlalchemy==2.0.23",
+        "sqlalchemy[asyncio]==2.0.23",
         "alembic==1.12.1",
         "psycopg2-binary==2.9.9",
+        "asyncpg==0.29.0",
         "python-jose[cryptography]==3.3.0",
-        "passlib[bcrypt]==1.7.4",
+        "bcrypt==4.1.2",
         "python-multipart==0.0.6",
         "python-dotenv==1.0.0",
         "openai==1.3.5",
         "stripe==7.6.0",
         "pillow==10.1.0",
         "requests==2.31.0",
+        "httpx==0.25.2",
     ],
     extras_require={
         "dev": [
@@ -28,6 +30,16 @@ setup(
             "mypy==1.7.0",
             "flake8==6.1.0",
         ],
+        "redis": [
+            "redis==5.0.1",
+        ],
+        "argon2": [
+            "argon2-cffi==23.1.0",
+        ],
+        "speedups": [
+            "orjson==3.9.10",
+            "brotli==1.1.0",
+        ],
     },
     python_requires=">=3.9",
     author="Sal's Memory Maker",
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Book, BookPage, User
+from scripts import admin
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Points the admin CLI at a fresh SQLite file with the full schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'admin.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(admin, "engine", engine)
+    monkeypatch.setattr(admin, "SessionLocal", sessionmaker(engine))
+    yield engine
+    engine.dispose()
+
+
+def seed(engine):
+    with sessionmaker(engine)() as db:
+        db.add(User(id=1, email="a@example.com", created_at=datetime(2026, 1, 2, 3, 4, 5)))
+        for number in range(1, 6):
+            status = "completed" if number % 2 else "failed"
+            db.add(Book(id=number, owner_id=1, status=status, prompts={"name": f"Kid {number}"}))
+            db.add(
+                BookPage(book_id=number, page_number=1, text="Once", image_variants={"web": "k"})
+            )
+        db.commit()
+
+
+def count(engine, model):
+    with sessionmaker(engine)() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def test_export_and_import_round_trip(database, tmp_path):
+    seed(database)
+    paths = {}
+    for name in ("users", "books", "book_pages"):
+        paths[name] = str(tmp_path / f"{name}.ndjson")
+        assert admin.export_table(name, paths[name], batch_size=2) == (1 if name == "users" else 5)
+
+    Base.metadata.drop_all(database)
+    Base.metadata.create_all(database)
+    for name in ("users", "books", "book_pages"):
+        admin.import_table(name, paths[name], batch_size=2)
+
+    with sessionmaker(database)() as db:
+        assert db.get(User, 1).created_at == datetime(2026, 1, 2, 3, 4, 5)
+        assert db.get(Book, 3).prompts == {"name": "Kid 3"}
+        page = db.scalars(select(BookPage).where(BookPage.book_id == 3)).one()
+        assert (page.text, page.image_variants) == ("Once", {"web": "k"})
+
+    # Importing the same dump again only adds what is missing
+    assert admin.import_table("users", paths["users"], skip_existing=True) == 1
+    assert count(database, User) == 1
+
+
+def test_parquet_round_trip(database, tmp_path):
+    pytest.importorskip("pyarrow")
+    seed(database)
+    path = str(tmp_path / "books.parquet")
+    assert admin.export_table("books", path, format="parquet", batch_size=2) == 5
+    rows = [row for batch in admin.read_batches(path, admin._table("books"), 10) for row in batch]
+    assert [row["prompts"] for row in rows][:1] == [{"name": "Kid 1"}]
+
+
+def test_backfills_checkpoint_and_resume(database, tmp_path, monkeypatch):
+    seed(database)
+    reran = []
+
+    class Runner:
+        async def rerun_stage(self, book_id, stage):
+            if book_id == 3:
+                raise RuntimeError("render failed")
+            reran.append(book_id)
+
+    monkeypatch.setattr(admin, "BookJobRunner", Runner)
+    path = str(tmp_path / "rerender.json")
+    checkpoint = asyncio.run(
+        admin.rerun_stage(
+            admin.RENDERING, statuses=["completed"], batch_size=2, checkpoint_path=path
+        )
+    )
+    assert sorted(reran) == [1, 5]
+    assert (checkpoint.last_id, checkpoint.done, checkpoint.failed) == (5, 2, 1)
+    assert '"book_id": 3' in open(path + ".failed").read()
+
+    # A resumed run starts after the last checkpointed book
+    assert admin.Checkpoint(path).last_id == 5
+    asyncio.run(admin.rerun_stage(admin.RENDERING, checkpoint_path=path))
+    assert sorted(reran) == [1, 5]
@@ -0,0 +1,52 @@
+import time
+
+from services.auth import CurrentUser, TokenCache
+
+
+def test_tokens_expire():
+    cache = TokenCache()
+    user = CurrentUser(1, "reader@example.com", False)
+    cache.set("live", user, time.time() + 60)
+    cache.set("expired", user, time.time() - 1)
+
+    assert cache.get("live") is user
+    assert cache.get("expired") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_least_recently_used_tokens_are_evicted():
+    cache = TokenCache(max_entries=2)
+    expires_at = time.time() + 60
+    for index in range(3):
+        if index == 2:
+            cache.get("token-0")
+        user = CurrentUser(index, f"user{index}@example.com", False)
+        cache.set(f"token-{index}", user, expires_at)
+
+    assert cache.get("token-0") is not None
+    assert cache.get("token-1") is None
+    assert cache.get("token-2") is not None
+
+
+def test_evict_user_drops_every_token_of_that_user():
+    cache = TokenCache()
+    expires_at = time.time() + 60
+    cache.set("phone", CurrentUser(1, "reader@example.com", False), expires_at)
+    cache.set("laptop", CurrentUser(1, "reader@example.com", False), expires_at)
+    cache.set("other", CurrentUser(2, "writer@example.com", False), expires_at)
+
+    cache.evict_user(1)
+    assert cache.get("phone") is None and cache.get("laptop") is None
+    assert cache.get("other") is not None
+
+
+def test_entries_are_rechecked_after_the_ttl(monkeypatch):
+    cache = TokenCache(ttl=30)
+    user = CurrentUser(1, "reader@example.com", True)
+    cache.set("token", user, time.time() + 3600)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 29)
+    assert cache.get("token") is user
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    assert cache.get("token") is None
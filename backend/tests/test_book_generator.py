@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.book_generator import FULL_TIER, PREVIEW_TIER, BookGenerator
+from services.cache import MemoryCache
+
+
+def make_generator():
+    return BookGenerator(cache=MemoryCache(), templates=object(), scheduler=object())
+
+
+def pages(count):
+    return [{"text": f"Page {n}", "image_prompt": f"prompt {n}"} for n in range(count)]
+
+
+def test_illustration_failures_and_timeouts_stay_on_their_page():
+    generator = make_generator()
+
+    async def generate_image(prompt, size):
+        if prompt == "prompt 1":
+            await asyncio.sleep(1)
+        if prompt == "prompt 2":
+            raise RuntimeError("content policy")
+        return f"https://images.test/{prompt.split()[-1]}.png"
+
+    generator.generate_image = generate_image
+    result = asyncio.run(generator.illustrate_pages(pages(3), timeout=0.05))
+
+    assert [page["text"] for page in result] == ["Page 0", "Page 1", "Page 2"]
+    assert result[0]["image_url"] == "https://images.test/0.png" and result[0]["error"] is None
+    assert result[1]["image_url"] is None
+    assert result[1]["error"] == "Image generation timed out after 0.05s"
+    assert result[2]["image_url"] is None
+    assert result[2]["error"] == "Error generating image: content policy"
+
+
+def test_preview_tier_illustrates_only_its_first_pages():
+    generator = make_generator()
+
+    async def generate_image(prompt, size):
+        return size
+
+    generator.generate_image = generate_image
+    result = asyncio.run(generator.illustrate_pages(pages(5), tier=PREVIEW_TIER))
+
+    illustrated = [page["image_url"] for page in result]
+    assert illustrated == [PREVIEW_TIER.image_size] * PREVIEW_TIER.illustrated_pages + [None] * (
+        5 - PREVIEW_TIER.illustrated_pages
+    )
+    assert all(page["error"] is None for page in result)
+
+
+def test_illustrations_run_concurrently_up_to_the_limit():
+    generator = make_generator()
+    running = []
+    peak = []
+
+    async def generate_image(prompt, size):
+        running.append(prompt)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(prompt)
+        return size
+
+    generator.generate_image = generate_image
+    result = asyncio.run(generator.illustrate_pages(pages(8), max_concurrency=3))
+
+    assert max(peak) == 3
+    assert {page["image_url"] for page in result} == {FULL_TIER.image_size}
+
+
+class StoryTemplates:
+    def get(self, book_type):
+        def render(prompts):
+            return "system", f"A story about {prompts['hero']}"
+
+        return SimpleNamespace(render=render)
+
+
+class StoryScheduler:
+    """Hands out a scripted completion: streamed in ``chunks`` or whole."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    async def submit(self, model, key, call, **kwargs):
+        self.calls += 1
+        if key is None:
+            return self._stream()
+        message = SimpleNamespace(content="".join(self.chunks))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def _stream(self):
+        for content in self.chunks:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": content})])
+
+    def settle(self, *args):
+        pass
+
+
+def story_generator(chunks):
+    scheduler = StoryScheduler(chunks)
+    generator = BookGenerator(cache=MemoryCache(), templates=StoryTemplates(), scheduler=scheduler)
+    return generator, scheduler
+
+
+def stream(generator):
+    async def collect():
+        return [page async for page in generator.stream_story("adventure", {"hero": "Ada"})]
+
+    return asyncio.run(collect())
+
+
+def test_stream_story_emits_a_page_per_paragraph_across_chunk_boundaries():
+    chunks = ["Once upon", " a time.\n", "\nThe end", " came.\n\n\n\n", "  \n\nEpilogue"]
+    generator, _ = story_generator(chunks)
+    assert [page["text"] for page in stream(generator)] == [
+        "Once upon a time.",
+        "The end came.",
+        "Epilogue",
+    ]
+
+
+def test_streamed_and_complete_stories_share_pages_and_cache():
+    chunks = ["First.\n\n", "\n\n", "Second."]
+    streamed, scheduler = story_generator(chunks)
+    first = stream(streamed)
+    # Replayed from the cache rather than streamed again
+    assert stream(streamed) == first
+    assert scheduler.calls == 1
+
+    completed, _ = story_generator(chunks)
+    assert asyncio.run(completed._complete_story("system", "A story about Ada")) == first
@@ -0,0 +1,67 @@
+import os
+import asyncio
+
+from services.cache import DiskCache, MemoryCache, TieredCache
+
+
+def test_promoted_entries_keep_the_shared_ttl(tmp_path):
+    async def scenario():
+        local = MemoryCache(default_ttl=86400)
+        cache = TieredCache(local, DiskCache(str(tmp_path), default_ttl=86400))
+        await cache.shared.set("image", "https://example.com/image.png", ttl=3000)
+        value = await cache.get("image")
+        return value, await local.get_with_ttl("image")
+
+    value, (promoted, ttl) = asyncio.run(scenario())
+    assert value == promoted == "https://example.com/image.png"
+    assert 2990 < ttl <= 3000
+
+
+def test_expired_memory_entries_are_misses():
+    async def scenario():
+        cache = MemoryCache()
+        await cache.set("key", "value", ttl=-1)
+        return await cache.get_with_ttl("key"), cache.stats()
+
+    entry, stats = asyncio.run(scenario())
+    assert entry == (None, None)
+    assert stats == {"hits": 0, "misses": 1, "entries": 0}
+
+
+def test_disk_cache_evicts_oldest_entries_without_rescanning_every_write(tmp_path):
+    async def scenario():
+        cache = DiskCache(str(tmp_path), max_entries=10)
+        scans = 0
+        evict = cache._evict
+
+        def counting_evict():
+            nonlocal scans
+            scans += 1
+            evict()
+
+        cache._evict = counting_evict
+        for index in range(25):
+            await cache.set(f"key-{index}", index)
+            # Distinct mtimes, so the eviction order is well defined
+            os.utime(cache._path(f"key-{index}"), (index, index))
+        return cache, scans
+
+    cache, scans = asyncio.run(scenario())
+    remaining = sorted(int(name[4:-5]) for name in os.listdir(tmp_path))
+    assert len(remaining) <= 10
+    assert remaining == list(range(25 - len(remaining), 25))
+    assert scans <= 8
+    assert cache._entries == len(remaining)
+
+
+def test_disk_cache_rewrites_and_deletes_keep_the_count(tmp_path):
+    async def scenario():
+        cache = DiskCache(str(tmp_path), max_entries=10)
+        for _ in range(3):
+            await cache.set("same", "value")
+        await cache.set("other", "value")
+        await cache.delete("other")
+        await cache.delete("missing")
+        return cache._entries
+
+    assert asyncio.run(scenario()) == 1
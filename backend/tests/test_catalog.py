@@ -0,0 +1,50 @@
+import asyncio
+
+from services.catalog import BookTypeCatalog
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self.rows
+
+
+class SlowSession:
+    """Returns no book types after ``on_query`` runs, standing in for an invalidation mid-reload."""
+
+    def __init__(self, on_query=None):
+        self.on_query = on_query
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        if self.on_query is not None:
+            self.on_query()
+        await asyncio.sleep(0)
+        return FakeResult([])
+
+
+def test_snapshot_is_cached_until_invalidated():
+    async def scenario():
+        catalog = BookTypeCatalog(ttl=300)
+        db = SlowSession()
+        first = await catalog.get(db)
+        assert await catalog.get(db) is first
+        catalog.invalidate()
+        await catalog.get(db)
+        return db.queries
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_reload_racing_an_invalidation_is_not_cached():
+    async def scenario():
+        catalog = BookTypeCatalog(ttl=300)
+        await catalog.get(SlowSession(on_query=catalog.invalidate))
+        db = SlowSession()
+        await catalog.get(db)
+        return db.queries
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,74 @@
+import io
+import asyncio
+
+import httpx
+from PIL import Image
+
+from services.images import FULL_VARIANTS, PREVIEW_VARIANTS, ImageIngestor, make_variants
+from services.storage import LocalArtifactStore
+
+
+def png(width, height):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "orange").save(output, format="PNG")
+    return output.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_full_variants_sizes_and_formats():
+    encoded = make_variants(png(1024, 512), FULL_VARIANTS)
+    variants = {name: decode(data) for name, data in encoded.items()}
+
+    assert (variants["print"].format, variants["print"].mode) == ("JPEG", "CMYK")
+    # Small sources are enlarged for print so they span the page at 300 DPI
+    assert variants["print"].size == (2400, 1200)
+    assert tuple(round(value) for value in variants["print"].info["dpi"]) == (300, 300)
+    assert (variants["web"].format, variants["web"].mode) == ("WEBP", "RGB")
+    assert variants["web"].size == (1024, 512)
+    assert variants["thumbnail"].size == (256, 128)
+
+
+def test_screen_variants_never_upscale():
+    variants = make_variants(png(200, 100), PREVIEW_VARIANTS)
+    assert set(variants) == set(PREVIEW_VARIANTS)
+    assert decode(variants["web"]).size == (200, 100)
+    assert decode(variants["thumbnail"]).size == (200, 100)
+
+
+class InlinePool:
+    async def submit(self, fn, *args):
+        return fn(*args)
+
+
+def test_ingest_pages_records_failures_on_the_page(tmp_path):
+    image = png(64, 64)
+
+    def respond(request):
+        if request.url.path == "/missing.png":
+            return httpx.Response(404)
+        return httpx.Response(200, content=image)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            ingestor = ImageIngestor(
+                client=client,
+                store=LocalArtifactStore(str(tmp_path)),
+                render_pool=InlinePool(),
+            )
+            pages = [
+                {"page_number": 1, "image_url": "https://images.test/ok.png"},
+                {"page_number": 2, "image_url": "https://images.test/missing.png"},
+                {"page_number": 3, "image_url": None},
+            ]
+            return ingestor.store, await ingestor.ingest_pages(pages, PREVIEW_VARIANTS)
+
+    store, (ok, missing, blank) = asyncio.run(scenario())
+    assert set(ok["image_variants"]) == set(PREVIEW_VARIANTS)
+    assert "error" not in ok
+    assert decode(asyncio.run(store.get(ok["image_variants"]["web"]))).size == (64, 64)
+    assert missing["image_variants"] is None
+    assert missing["error"].startswith("Error ingesting image")
+    assert blank["image_variants"] is None and "error" not in blank
@@ -0,0 +1,239 @@
+import asyncio
+
+from pypdf import PdfReader
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Base, Book
+from services.jobs import (
+    CANCELLED,
+    COMPLETED,
+    FAILED,
+    GENERATING_IMAGES,
+    GENERATING_STORY,
+    PURCHASED,
+    QUEUED,
+    RENDERING,
+    BookJobRunner,
+    InProcessJobQueue,
+    claim_job,
+    recover_jobs,
+    request_upgrade,
+    tier_for,
+)
+from services.book_generator import FULL_TIER, PREVIEW_TIER
+from services.storage import LocalArtifactStore
+
+
+def test_in_process_queue_holds_each_book_once():
+    async def scenario():
+        queue = InProcessJobQueue(runner=None)
+        ran = []
+
+        async def run(book_id):
+            ran.append(book_id)
+
+        queue._run_claimed = run
+        for book_id in (1, 2, 1, 2, 1):
+            await queue.enqueue(book_id)
+        held = queue._queue.qsize()
+        worker = asyncio.create_task(queue._work())
+        await queue._queue.join()
+        # Once a worker has taken a book it can be queued again, e.g. for an upgrade
+        await queue.enqueue(1)
+        await queue._queue.join()
+        worker.cancel()
+        return held, ran
+
+    assert asyncio.run(scenario()) == (2, [1, 2, 1])
+
+
+def make_runner(tmp_path):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    store = LocalArtifactStore(str(tmp_path / "artifacts"))
+    return BookJobRunner(session_factory=sessionmaker(engine), generator=object(), store=store)
+
+
+def add_book(runner, **fields):
+    with runner.session_factory() as db:
+        book = Book(**{"status": RENDERING, **fields})
+        db.add(book)
+        db.commit()
+        return book.id
+
+
+def test_pages_are_saved_as_one_row_per_page(tmp_path):
+    runner = make_runner(tmp_path)
+    book_id, other_id = add_book(runner), add_book(runner)
+    story = [{"page_number": number, "text": f"Page {number}"} for number in (2, 1, 3)]
+    asyncio.run(runner._save_pages(book_id, story))
+    asyncio.run(runner._save_pages(other_id, story[:1]))
+
+    pages = asyncio.run(runner._load_pages(book_id))
+    assert [page["page_number"] for page in pages] == [1, 2, 3]
+    assert pages[0] == {
+        "page_number": 1,
+        "text": "Page 1",
+        "image_prompt": None,
+        "image_url": None,
+        "image_variants": None,
+        "page_image": None,
+        "error": None,
+    }
+
+    # Fields a stage did not return are kept; pages it dropped are deleted
+    asyncio.run(runner._save_pages(book_id, [{"page_number": 1, "page_image": "ab/cd/1.png"}]))
+    [page] = asyncio.run(runner._load_pages(book_id))
+    assert (page["text"], page["page_image"]) == ("Page 1", "ab/cd/1.png")
+    assert len(asyncio.run(runner._load_pages(other_id))) == 1
+
+
+def test_paid_previews_are_upgraded_with_their_story(tmp_path):
+    runner = make_runner(tmp_path)
+    paid = add_book(runner, price_paid=20.0, status=COMPLETED, generation_attempts=3)
+    unpaid = add_book(runner, status=COMPLETED)
+    running = add_book(runner, price_paid=20.0)
+    assert tier_for(asyncio.run(runner._load(paid))) is FULL_TIER
+    assert tier_for(asyncio.run(runner._load(unpaid))) is PREVIEW_TIER
+
+    upgraded = [
+        request_upgrade(book_id, runner.session_factory) for book_id in (paid, unpaid, running)
+    ]
+    assert upgraded == [True, False, False]
+    book = asyncio.run(runner._load(paid))
+    assert (book.status, book.generation_attempts) == (QUEUED, 0)
+
+    # The story stage keeps the preview's pages rather than writing a new story
+    story = [{"page_number": 1, "text": "Once upon a time"}]
+    assert asyncio.run(runner._generate_story(book, story)) == story
+
+
+def test_paid_books_get_a_print_pdf(tmp_path):
+    runner = make_runner(tmp_path)
+    pages = [{"page_number": 1, "text": "The end", "page_image": None}]
+    paid, preview = add_book(runner, price_paid=20.0), add_book(runner)
+
+    for book_id in (paid, preview):
+        book = asyncio.run(runner._load(book_id))
+        assert asyncio.run(runner._assemble_pdf(book, pages)) == pages
+
+    print_file = asyncio.run(runner._load(paid)).print_file
+    assert print_file.endswith(".pdf")
+    assert len(PdfReader(runner.store.path(print_file)).pages) == 1
+    assert asyncio.run(runner._load(preview)).print_file is None
+
+
+def test_pages_are_rendered_with_their_web_illustration(tmp_path):
+    runner = make_runner(tmp_path)
+    illustration = asyncio.run(runner.store.put(b"web image", ".webp"))
+    pages = [
+        {"page_number": 1, "text": "A", "image_variants": {"web": illustration}},
+        {"page_number": 2, "text": "B", "image_variants": None},
+    ]
+    rendered = {}
+
+    class Generator:
+        async def render_book(self, pages, tier, images):
+            rendered["images"] = images
+            return [b"page one", b"page two"]
+
+    runner.generator = Generator()
+    book = asyncio.run(runner._load(add_book(runner)))
+    pages = asyncio.run(runner._render_pages(book, pages))
+
+    assert rendered["images"] == [b"web image", None]
+    assert [asyncio.run(runner.store.get(page["page_image"])) for page in pages] == [
+        b"page one",
+        b"page two",
+    ]
+
+
+def scripted_stages(runner, failures=None):
+    """Replace the runner's stages with ones that record their runs and fail on cue."""
+    ran = []
+    failures = failures or {}
+
+    def stage(status):
+        async def run(book, pages):
+            ran.append(status)
+            if failures.get(status):
+                failures[status] -= 1
+                raise RuntimeError(f"{status} failed")
+            if status == GENERATING_STORY and not pages:
+                return [{"page_number": 1, "text": "Once"}]
+            return pages
+
+        return run
+
+    statuses = (GENERATING_STORY, GENERATING_IMAGES, RENDERING)
+    runner.stages = [(status, stage(status)) for status in statuses]
+    return ran
+
+
+def test_jobs_resume_from_the_last_recorded_stage(tmp_path):
+    runner = make_runner(tmp_path)
+    ran = scripted_stages(runner)
+    book_id = add_book(runner)  # recorded as RENDERING
+
+    assert asyncio.run(runner.run(book_id)) == COMPLETED
+    assert ran == [RENDERING]
+    book = asyncio.run(runner._load(book_id))
+    assert book.status == COMPLETED and book.lease_expires_at is None
+
+
+def test_failed_stages_are_retried_then_the_book_fails(tmp_path):
+    runner = make_runner(tmp_path)
+    runner.backoff_base = 0.001
+    ran = scripted_stages(runner, failures={GENERATING_IMAGES: 1})
+    book_id = add_book(runner, price_paid=20.0)
+    asyncio.run(runner._update(book_id, status=QUEUED))
+
+    assert asyncio.run(runner.run(book_id)) == PURCHASED
+    # The retry resumes at the stage that failed instead of writing a new story
+    assert ran == [GENERATING_STORY, GENERATING_IMAGES, GENERATING_IMAGES, RENDERING]
+    book = asyncio.run(runner._load(book_id))
+    assert (book.generation_attempts, book.generation_error) == (1, None)
+    assert [page["text"] for page in asyncio.run(runner._load_pages(book_id))] == ["Once"]
+
+    scripted_stages(runner, failures={RENDERING: runner.max_attempts})
+    asyncio.run(runner._update(book_id, status=RENDERING))
+    assert asyncio.run(runner.run(book_id)) == FAILED
+    book = asyncio.run(runner._load(book_id))
+    assert book.generation_attempts == runner.max_attempts
+    assert book.generation_error == "rendering failed"
+
+
+def test_cancelled_books_stop_between_stages(tmp_path):
+    runner = make_runner(tmp_path)
+    ran = scripted_stages(runner)
+    book_id = add_book(runner)
+    asyncio.run(runner._update(book_id, status=QUEUED))
+
+    async def cancel_after_story(book, pages):
+        ran.append(GENERATING_STORY)
+        with runner.session_factory() as db:
+            db.get(Book, book_id).status = CANCELLED
+            db.commit()
+        return [{"page_number": 1, "text": "Once"}]
+
+    runner.stages[0] = (GENERATING_STORY, cancel_after_story)
+    assert asyncio.run(runner.run(book_id)) == CANCELLED
+    assert ran == [GENERATING_STORY]
+    assert asyncio.run(runner._load(book_id)).status == CANCELLED
+
+
+def test_a_leased_book_is_claimed_once(tmp_path):
+    runner = make_runner(tmp_path)
+    queued, done = add_book(runner), add_book(runner)
+    asyncio.run(runner._update(queued, status=QUEUED))
+    asyncio.run(runner._update(done, status=COMPLETED))
+
+    assert recover_jobs(runner.session_factory) == [queued]
+    assert claim_job(queued, runner.session_factory) == queued
+    assert claim_job(queued, runner.session_factory) is None
+    assert claim_job(done, runner.session_factory) is None
+    assert recover_jobs(runner.session_factory) == []
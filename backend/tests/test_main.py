@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from main import get_owned_book
+from models import Book
+from services.auth import CurrentUser
+
+
+class Books:
+    """Stands in for the AsyncSession get_owned_book looks the book up with."""
+
+    def __init__(self, book):
+        self.book = book
+
+    async def get(self, model, book_id):
+        return self.book if book_id == self.book.id else None
+
+
+def lookup(book, user=None, header=None, query=None, book_id=None):
+    return asyncio.run(
+        get_owned_book(book_id or book.id, user, header, query, Books(book))
+    )
+
+
+def test_anonymous_books_need_their_access_token():
+    book = Book(id=7, owner_id=None, access_token="secret")
+    assert lookup(book, header="secret") is book
+    assert lookup(book, query="secret") is book
+    for token in (None, "guess"):
+        with pytest.raises(HTTPException) as error:
+            lookup(book, header=token)
+        assert error.value.status_code == 404
+
+
+def test_anonymous_books_without_a_token_are_admin_only():
+    book = Book(id=7, owner_id=None, access_token=None)
+    with pytest.raises(HTTPException):
+        lookup(book, header="")
+    assert lookup(book, user=CurrentUser(1, "admin@example.com", True)) is book
+
+
+def test_owned_books_need_their_owner():
+    book = Book(id=7, owner_id=3, access_token=None)
+    assert lookup(book, user=CurrentUser(3, "owner@example.com", False)) is book
+    with pytest.raises(HTTPException) as error:
+        lookup(book)
+    assert error.value.status_code == 401
+    with pytest.raises(HTTPException) as error:
+        lookup(book, user=CurrentUser(4, "other@example.com", False))
+    assert error.value.status_code == 404
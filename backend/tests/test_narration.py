@@ -0,0 +1,80 @@
+import asyncio
+import wave
+
+import pytest
+
+from services.cache import MemoryCache
+from services.narration import Narrator, ToneTTSBackend, split_sentences
+from services.storage import LocalArtifactStore
+
+
+def test_split_sentences_keeps_sentences_whole():
+    text = "One two.  Three four!\n\"Five,\" said six. " + "x" * 50
+    assert split_sentences(text, max_chars=20) == [
+        "One two. Three four!",
+        "\"Five,\" said six.",
+        "x" * 50,
+    ]
+    assert split_sentences("   ") == []
+
+
+def make_narrator(tmp_path, **options):
+    return Narrator(
+        backend=ToneTTSBackend(),
+        cache=MemoryCache(),
+        store=LocalArtifactStore(str(tmp_path)),
+        max_chunk_chars=20,
+        page_pause=0.5,
+        **options,
+    )
+
+
+def frames(narrator, key):
+    with wave.open(narrator.store.path(key)) as audio:
+        assert (audio.getnchannels(), audio.getsampwidth()) == (1, 2)
+        assert audio.getframerate() == narrator.backend.sample_rate
+        return audio.getnframes()
+
+
+def test_pages_are_stitched_with_a_pause_between_them(tmp_path):
+    narrator = make_narrator(tmp_path)
+    backend = narrator.backend
+    rate = backend.sample_rate
+    word = int(backend.word_seconds * rate) + int(backend.gap_seconds * rate)
+    pause = int(0.5 * rate)
+
+    key = asyncio.run(narrator.narrate(["One two.", "", "Three."], "tone"))
+    # The blank page adds no audio and no second pause
+    assert frames(narrator, key) == 3 * word + pause
+
+
+def test_only_changed_chunks_are_synthesized_again(tmp_path):
+    narrator = make_narrator(tmp_path)
+    pages = ["First sentence. Second one here.", "Another page."]
+    first = asyncio.run(narrator.narrate(pages, "tone"))
+    assert narrator.synthesized == 3
+
+    assert asyncio.run(narrator.cached(pages, "tone")) == first
+    assert asyncio.run(narrator.narrate(pages, "tone")) == first
+    assert narrator.synthesized == 3
+
+    asyncio.run(narrator.narrate(["First sentence. Second one here.", "Edited page."], "tone"))
+    assert narrator.synthesized == 4
+
+
+def test_concurrent_requests_share_one_narration(tmp_path):
+    narrator = make_narrator(tmp_path)
+
+    async def scenario():
+        return await asyncio.gather(*(narrator.narrate(["Hello there."], "tone") for _ in range(3)))
+
+    assert len(set(asyncio.run(scenario()))) == 1
+    assert narrator.synthesized == 1
+
+
+def test_unknown_voices_are_rejected(tmp_path):
+    narrator = make_narrator(tmp_path)
+    narrator.backend.voices = frozenset({"tone"})
+    assert narrator.resolve_voice(None) == "tone"
+    with pytest.raises(ValueError):
+        narrator.resolve_voice("nova")
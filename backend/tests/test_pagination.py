@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from models import Book, Order
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, page_of, paginate
+
+ORDER_KEYS = [Order.created_at, Order.id]
+
+
+def pages(db, query, keys, limit):
+    """Walk every page of a query, returning the ids on each."""
+    result, cursor = [], None
+    while True:
+        rows = db.execute(paginate(query, keys, cursor, limit)).scalars()
+        rows, cursor = page_of(rows, keys, limit)
+        result.append([row.id for row in rows])
+        if cursor is None:
+            return result
+
+
+def test_pages_run_newest_first_without_gaps(db):
+    db.add_all(Book(title=f"Book {number}") for number in range(5))
+    db.flush()
+
+    assert pages(db, select(Book), [Book.id], 2) == [[5, 4], [3, 2], [1]]
+    assert pages(db, select(Book), [Book.id], 5) == [[5, 4, 3, 2, 1]]
+
+
+def test_composite_keys_break_ties_on_id(db):
+    start = datetime(2024, 6, 3, 9, 30)
+    # Orders 2 and 3 were created in the same instant
+    for offset in (0, 1, 1, 2):
+        db.add(Order(amount=1.0, status="completed", created_at=start + timedelta(seconds=offset)))
+    db.flush()
+
+    assert pages(db, select(Order), ORDER_KEYS, 1) == [[4], [3], [2], [1]]
+    assert pages(db, select(Order).where(Order.id != 4), ORDER_KEYS, 2) == [[3, 2], [1]]
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 6, 3, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor([created_at, 42]), ORDER_KEYS) == [created_at, 42]
+    # Padding is stripped, so cursors stay URL-safe without escaping
+    assert "=" not in encode_cursor([created_at, 42])
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    raw_cursor({"created_at": "2024-06-03"}),
+    raw_cursor(["2024-06-03T09:30:00"]),
+    raw_cursor(["2024-06-03T09:30:00", 1, 2]),
+    raw_cursor(["yesterday", 1]),
+    raw_cursor([1717407000, 1]),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, ORDER_KEYS)
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import services.payment as payment
+from services.payment import PaymentService, invalidate_price_cache
+from services.webhooks import order_change
+
+
+class FakeStripe:
+    """Just enough of the Stripe SDK for PaymentService, recording each call."""
+
+    def __init__(self):
+        calls = self.calls = []
+        prices = self.prices = {}
+
+        class Price:
+            @classmethod
+            def list(cls, lookup_keys, **kwargs):
+                calls.append(("list", lookup_keys[0]))
+                found = [prices[key] for key in lookup_keys if key in prices]
+                return SimpleNamespace(data=found)
+
+            @classmethod
+            def create(cls, lookup_key, **kwargs):
+                calls.append(("create", lookup_key))
+                price = prices[lookup_key] = SimpleNamespace(id=f"price_{len(prices) + 1}")
+                return price
+
+        class Session:
+            @classmethod
+            def create(cls, **kwargs):
+                calls.append(("session", kwargs))
+                return SimpleNamespace(id="cs_1", url="https://checkout.test/cs_1")
+
+        self.Price = Price
+        self.checkout = SimpleNamespace(Session=Session)
+
+
+def make_service():
+    invalidate_price_cache()
+    service = PaymentService()
+    service.stripe = FakeStripe()
+    return service
+
+
+def test_concurrent_lookups_create_one_price():
+    service = make_service()
+
+    async def scenario():
+        lookups = (service.get_physical_book_price("hardcover") for _ in range(5))
+        return await asyncio.gather(*lookups)
+
+    assert set(asyncio.run(scenario())) == {"price_1"}
+    assert [call[0] for call in service.stripe.calls] == ["list", "create"]
+
+
+def test_invalidation_looks_the_price_up_again():
+    service = make_service()
+    asyncio.run(service.get_physical_book_price("hardcover"))
+    asyncio.run(service.get_physical_book_price("hardcover"))
+    assert len(service.stripe.calls) == 2
+
+    invalidate_price_cache("paperback")
+    asyncio.run(service.get_physical_book_price("hardcover"))
+    assert len(service.stripe.calls) == 2
+
+    invalidate_price_cache("hardcover")
+    # The lookup key finds the price created before, so nothing new is created
+    assert asyncio.run(service.get_physical_book_price("hardcover")) == "price_1"
+    assert [call[0] for call in service.stripe.calls] == ["list", "create", "list"]
+    assert payment._price_cache == {("hardcover", 2999, "usd"): "price_1"}
+
+
+def test_publishing_order_is_matched_to_its_book():
+    service = make_service()
+    asyncio.run(service.create_publishing_order(7, "hardcover", {}))
+    session = service.stripe.calls[-1][1]
+    assert session["client_reference_id"] == "7"
+    assert session["metadata"] == {"book_id": 7}
+
+    completed = {
+        "id": "cs_1",
+        "payment_intent": "pi_1",
+        "payment_status": "paid",
+        "amount_total": 2999,
+        "metadata": session["metadata"],
+    }
+    assert order_change("checkout.session.completed", completed)["book_id"] == 7
+    intent = {"id": "pi_1", "amount": 2999, **session["payment_intent_data"]}
+    assert order_change("payment_intent.succeeded", intent)["book_id"] == 7
@@ -0,0 +1,107 @@
+import io
+import asyncio
+
+from PIL import Image
+from pypdf import PdfReader
+from pypdf.generic import ContentStream
+
+from services.pdf import PAGE_HEIGHT, PAGE_WIDTH, PdfAssembler, assemble_book_pdf
+from services.storage import LocalArtifactStore
+
+
+def png(width, height, color="navy"):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def build(*pages):
+    output = io.BytesIO()
+    with PdfAssembler(output) as pdf:
+        for page in pages:
+            pdf.add_page(**page)
+    output.seek(0)
+    return PdfReader(output)
+
+
+def operations(reader, page_number, operator):
+    page = reader.pages[page_number]
+    content = ContentStream(page.get_contents(), reader)
+    return [
+        [float(value) for value in operands]
+        for operands, op in content.operations
+        if op == operator
+    ]
+
+
+def test_image_is_fitted_inside_the_page():
+    reader = build({"image": png(1200, 800)})
+    [[width, _, _, height, x, y]] = operations(reader, 0, b"cm")
+    assert (width, x) == (PAGE_WIDTH, 0)
+    assert abs(width / height - 1.5) < 0.01
+    assert abs(y - (PAGE_HEIGHT - height) / 2) < 0.01
+
+
+def test_text_is_set_below_the_image():
+    reader = build({"text": "Once upon a time", "image": png(800, 800)})
+    [[width, _, _, height, x, y]] = operations(reader, 0, b"cm")
+    assert x >= 54 and x + width <= PAGE_WIDTH - 54
+    assert y >= 54 and y + height <= PAGE_HEIGHT - 54
+    [[_, top]] = operations(reader, 0, b"Td")
+    assert top < y
+    assert "Once upon a time" in reader.pages[0].extract_text()
+
+
+def test_long_text_keeps_half_the_page_for_the_image():
+    reader = build({"text": "word " * 2000, "image": png(800, 800)})
+    [[_, _, _, height, _, _]] = operations(reader, 0, b"cm")
+    assert height >= (PAGE_HEIGHT - 2 * 54) / 2 - 0.01
+
+
+def test_shared_images_are_embedded_once():
+    background = png(100, 100)
+    reader = build({"image": background}, {"image": background})
+    images = [page["/Resources"]["/XObject"] for page in reader.pages]
+    assert list(images[0].values()) == list(images[1].values())
+
+
+def test_assembled_book_has_a_page_per_book_page(tmp_path):
+    store = LocalArtifactStore(str(tmp_path / "artifacts"))
+    pages = [
+        {"text": "First page", "page_image": asyncio.run(store.put(png(1200, 800), ".png"))},
+        {"text": "Second page", "page_image": None},
+    ]
+    path = str(tmp_path / "book.pdf")
+    asyncio.run(assemble_book_pdf(pages, store, path))
+
+    reader = PdfReader(path)
+    assert len(reader.pages) == 2
+    for page in reader.pages:
+        assert [float(value) for value in page.mediabox] == [0, 0, PAGE_WIDTH, PAGE_HEIGHT]
+    assert "/XObject" in reader.pages[0]["/Resources"]
+    assert "Second page" in reader.pages[1].extract_text()
+
+
+def test_illustrated_pages_print_the_print_variant_with_vector_text(tmp_path):
+    store = LocalArtifactStore(str(tmp_path / "artifacts"))
+    print_image = io.BytesIO()
+    Image.new("CMYK", (2400, 2400)).save(print_image, format="JPEG", dpi=(300, 300))
+    pages = [
+        {
+            "text": "Vector text",
+            "page_image": asyncio.run(store.put(png(1200, 800), ".png")),
+            "image_variants": {"print": asyncio.run(store.put(print_image.getvalue(), ".jpg"))},
+        }
+    ]
+    path = str(tmp_path / "book.pdf")
+    asyncio.run(assemble_book_pdf(pages, store, path))
+
+    page = PdfReader(path).pages[0]
+    [image] = page["/Resources"]["/XObject"].values()
+    image = image.get_object()
+    assert (image["/Width"], image["/ColorSpace"], image["/Filter"]) == (
+        2400,
+        "/DeviceCMYK",
+        "/DCTDecode",
+    )
+    assert "Vector text" in page.extract_text()
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.publishing import PublishingService
+
+ADDRESS = {
+    "name": "Ada",
+    "address1": "1 Main St",
+    "city": "Springfield",
+    "state": "IL",
+    "postal_code": "62701",
+    "country": "US",
+}
+
+
+def run_with(handler, scenario):
+    """Run ``scenario(service)`` against a vendor stub; returns its result and the paths hit."""
+    requests = []
+
+    def respond(request):
+        requests.append(request.url.path)
+        return handler(request, len(requests))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            service = PublishingService(client=client)
+            service.api_url = "https://print.test"
+            service.retry_backoff = 0
+            return await scenario(service)
+
+    return asyncio.run(main()), requests
+
+
+def test_idempotent_requests_are_retried_on_transient_errors():
+    def handler(request, attempt):
+        if attempt < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"status": "printing"})
+
+    result, requests = run_with(handler, lambda service: service.get_order_status("o1"))
+    assert result == {"status": "printing"}
+    assert requests == ["/orders/o1"] * 3
+
+
+def test_orders_are_never_submitted_twice():
+    def handler(request, attempt):
+        return httpx.Response(503)
+
+    with pytest.raises(Exception, match="Error creating book order"):
+        run_with(
+            handler,
+            lambda service: service.create_book_order({"title": "T", "pages": 3}, ADDRESS),
+        )
+
+
+def test_orders_are_retried_when_the_connection_failed():
+    def handler(request, attempt):
+        if attempt == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201, json={"id": "o1"})
+
+    result, requests = run_with(
+        handler, lambda service: service.create_book_order({"title": "T", "pages": 3}, ADDRESS)
+    )
+    assert result == {"id": "o1"}
+    assert requests == ["/orders", "/orders"]
+
+
+def test_order_statuses_report_failures_per_order():
+    def handler(request, attempt):
+        if request.url.path == "/orders/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"status": "shipped"})
+
+    result, _ = run_with(handler, lambda service: service.get_order_statuses(["o1", "missing"]))
+    assert result["o1"] == {"status": "shipped"}
+    assert "404" in result["missing"]["error"]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from services import ratelimit
+from services.ratelimit import MemoryRateLimiter, RateLimit, sliding_window
+
+PER_MINUTE = RateLimit(10, 60)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for the limiter, starting at the beginning of a window."""
+    now = [6000.0]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: now[0])
+    return now
+
+
+def test_parse():
+    assert vars(RateLimit.parse("10/hour")) == {"limit": 10, "window": 3600}
+    assert vars(RateLimit.parse("5/minutes")) == {"limit": 5, "window": 60}
+    assert vars(RateLimit.parse("100/30")) == {"limit": 100, "window": 30.0}
+    with pytest.raises(ValueError):
+        RateLimit.parse("10/fortnight")
+
+
+def test_sliding_window_weights_the_previous_window():
+    # Halfway through the window, half of the previous window's 10 requests still count
+    assert sliding_window(150, PER_MINUTE, current=4, previous=10) == (True, 0.0)
+    allowed, retry_after = sliding_window(150, PER_MINUTE, current=5, previous=10)
+    assert not allowed
+    # Six seconds later the previous window weighs 4, so 4 + 5 + 1 fits
+    assert retry_after == pytest.approx(6)
+    assert sliding_window(156, PER_MINUTE, current=5, previous=10)[0]
+
+
+def test_sliding_window_full_current_window_waits_past_its_end():
+    allowed, retry_after = sliding_window(150, PER_MINUTE, current=10, previous=0)
+    assert not allowed
+    assert retry_after == pytest.approx(30 + 6)
+
+
+def test_zero_limit_rejects_everything():
+    for current, previous in ((0, 0), (0, 3), (2, 0)):
+        assert sliding_window(150, RateLimit(0, 60), current, previous) == (False, 60.0)
+
+
+def test_memory_limiter_rejects_over_the_limit_without_counting(clock):
+    async def scenario():
+        limiter = MemoryRateLimiter()
+        rate = RateLimit(2, 60)
+        waits = [await limiter.hit("client", rate) for _ in range(4)]
+        clock[0] += 60
+        # The two counted requests weigh in fully at the start of the next window
+        waits.append(await limiter.hit("client", rate))
+        clock[0] += 30
+        waits.append(await limiter.hit("client", rate))
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0 and waits[3] > 0
+    assert waits[4] > 0
+    assert waits[5] == 0.0
+
+
+def test_hit_all_counts_nothing_when_any_limit_refuses(clock):
+    async def scenario():
+        limiter = MemoryRateLimiter()
+        user, ip = RateLimit(1, 60), RateLimit(3, 60)
+        waits = [await limiter.hit_all([("user:1", user), ("ip:1", ip)]) for _ in range(3)]
+        # Only the first request counted against the IP, so two more fit
+        waits += [await limiter.hit("ip:1", ip) for _ in range(3)]
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert waits[0] == 0.0
+    assert waits[1] > 0 and waits[2] > 0
+    assert waits[3:5] == [0.0, 0.0]
+    assert waits[5] > 0
+
+
+def test_least_recently_used_keys_are_evicted(clock):
+    async def scenario():
+        limiter = MemoryRateLimiter(max_keys=2)
+        rate = RateLimit(1, 60)
+        await limiter.hit("a", rate)
+        await limiter.hit("b", rate)
+        await limiter.hit("c", rate)
+        return await limiter.hit("a", rate), await limiter.hit("c", rate)
+
+    evicted, kept = asyncio.run(scenario())
+    assert evicted == 0.0
+    assert kept > 0
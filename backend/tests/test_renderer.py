@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from PIL import Image
+
+from services import renderer as renderer_module
+from services.renderer import FontNotFoundError, PageRenderer, check_font
+
+
+def png(width, height, color):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_illustration_fills_the_right_half():
+    renderer = PageRenderer(width=1200, height=800, watermark=None)
+    page = Image.open(io.BytesIO(renderer.render("Hello", image=png(500, 500, "blue"))))
+    assert page.size == (1200, 800)
+    assert page.getpixel((900, 400)) == (0, 0, 255)
+    assert page.getpixel((300, 700)) == (255, 255, 255)
+
+
+def test_text_only_pages_have_no_illustration():
+    renderer = PageRenderer(width=1200, height=800, watermark=None)
+    page = Image.open(io.BytesIO(renderer.render("Hello")))
+    assert page.getpixel((900, 400)) == (255, 255, 255)
+
+
+def test_pages_render_at_the_requested_size_and_format():
+    renderer = PageRenderer(width=600, height=400, watermark="PREVIEW")
+    page = Image.open(io.BytesIO(renderer.render("Once upon a time", "WEBP")))
+    assert (page.format, page.size) == ("WEBP", (600, 400))
+    # The watermark is drawn once on the cached base canvas, not on every page
+    assert renderer._base_canvas() is renderer._base_canvas()
+    assert renderer._base_canvas().getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_missing_font_fails_with_a_clear_error(monkeypatch):
+    monkeypatch.setattr(renderer_module, "FONT_PATH", "/nonexistent/font.ttf")
+    renderer_module.load_font.cache_clear()
+    try:
+        with pytest.raises(FontNotFoundError, match="PAGE_FONT_PATH"):
+            check_font()
+    finally:
+        renderer_module.load_font.cache_clear()
@@ -0,0 +1,83 @@
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from models import Order, OrderDailyStats
+from services.reporting import OrderStatsDelta, rebuild_order_stats
+
+MONDAY = datetime(2024, 6, 3, 9, 30)
+TUESDAY = datetime(2024, 6, 4, 18, 0)
+
+
+def stats(db):
+    rows = db.execute(select(OrderDailyStats)).scalars()
+    return {(row.day, row.status): (row.order_count, round(row.revenue, 2)) for row in rows}
+
+
+def write(db, delta, order, before=None):
+    """Apply one order write the way the webhook worker does: the row and its stats delta."""
+    delta.record(before, {"status": order.status, "amount": order.amount}, order.created_at)
+    db.add(order)
+
+
+def test_status_changes_move_orders_between_buckets(db):
+    first = Order(stripe_payment_id="pi_1", status="pending", amount=19.99, created_at=MONDAY)
+    second = Order(stripe_payment_id="pi_2", status="completed", amount=9.5, created_at=TUESDAY)
+    delta = OrderStatsDelta()
+    write(db, delta, first)
+    write(db, delta, second)
+    delta.apply(db)
+
+    assert stats(db) == {
+        (date(2024, 6, 3), "pending"): (1, 19.99),
+        (date(2024, 6, 4), "completed"): (1, 9.5),
+    }
+
+    # A later batch completes the first order and refunds the second
+    delta = OrderStatsDelta()
+    before = {"status": first.status, "amount": first.amount}
+    first.status = "completed"
+    write(db, delta, first, before)
+    before = {"status": second.status, "amount": second.amount}
+    second.status = "refunded"
+    write(db, delta, second, before)
+    delta.apply(db)
+
+    assert stats(db) == {
+        (date(2024, 6, 3), "pending"): (0, 0.0),
+        (date(2024, 6, 3), "completed"): (1, 19.99),
+        (date(2024, 6, 4), "completed"): (0, 0.0),
+        (date(2024, 6, 4), "refunded"): (1, 9.5),
+    }
+
+
+def test_deltas_match_a_rebuild(db):
+    delta = OrderStatsDelta()
+    orders = [
+        Order(stripe_payment_id=f"pi_{index}", status=status, amount=amount, created_at=created_at)
+        for index, (status, amount, created_at) in enumerate([
+            ("completed", 19.99, MONDAY),
+            ("completed", 5.0, MONDAY),
+            ("failed", 19.99, MONDAY),
+            ("refunded", 9.5, TUESDAY),
+        ])
+    ]
+    for order in orders:
+        write(db, delta, order)
+    delta.apply(db)
+    db.flush()
+    incremental = {key: value for key, value in stats(db).items() if value[0]}
+
+    rebuild_order_stats(db)
+    assert stats(db) == incremental
+
+
+def test_changes_that_cancel_out_are_not_written(db):
+    OrderStatsDelta().apply(db)
+    delta = OrderStatsDelta()
+    delta.record(None, {"status": "pending", "amount": 1.0}, MONDAY)
+    delta.record({"status": "pending", "amount": 1.0}, {"status": "failed", "amount": 1.0}, MONDAY)
+    delta.record({"status": "failed", "amount": 1.0}, {"status": "pending", "amount": 1.0}, MONDAY)
+    delta.record({"status": "pending", "amount": 1.0}, {"status": "failed", "amount": 1.0}, MONDAY)
+    delta.apply(db)
+    assert stats(db) == {(date(2024, 6, 3), "failed"): (1, 1.0)}
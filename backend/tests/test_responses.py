@@ -0,0 +1,48 @@
+import pytest
+
+from services.responses import Fieldset, InvalidFields
+
+BOOK = {
+    "id": 7,
+    "title": "The Brave Fox",
+    "status": "preview",
+    "pages": [
+        {
+            "page_number": 1,
+            "text": "Once upon a time",
+            "images": {"web": "a.webp", "print": "a.jpg"},
+        },
+        {"page_number": 2, "text": "The end", "images": {}},
+    ],
+}
+
+
+def test_no_selection_returns_the_payload_untouched():
+    assert Fieldset.parse(None).apply(BOOK) is BOOK
+    assert Fieldset.parse(" , ").apply(BOOK) is BOOK
+
+
+def test_top_level_and_nested_fields():
+    fields = Fieldset.parse("title, pages.page_number,pages.images.web")
+    assert fields.apply(BOOK) == {
+        "title": "The Brave Fox",
+        "pages": [
+            {"page_number": 1, "images": {"web": "a.webp"}},
+            # Image maps vary by page, so a missing variant is skipped rather than rejected
+            {"page_number": 2, "images": {}},
+        ],
+    }
+
+
+def test_naming_a_parent_selects_all_of_it():
+    assert Fieldset.parse("pages,pages.text").apply(BOOK) == {"pages": BOOK["pages"]}
+
+
+def test_lists_are_trimmed_item_by_item():
+    books = [BOOK, {**BOOK, "id": 8}]
+    assert Fieldset.parse("id").apply(books) == [{"id": 7}, {"id": 8}]
+
+
+def test_unknown_top_level_fields_are_rejected():
+    with pytest.raises(InvalidFields, match="Unknown fields: price"):
+        Fieldset.parse("title,price").apply(BOOK)
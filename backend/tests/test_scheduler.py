@@ -0,0 +1,118 @@
+import asyncio
+
+from services.scheduler import OpenAIScheduler, Usage, current_usage
+
+
+def make_scheduler() -> OpenAIScheduler:
+    return OpenAIScheduler(rate_limits={"gpt-4": {}}, pricing={"gpt-4": {}}, max_retries=0)
+
+
+def test_identical_requests_are_coalesced():
+    async def scenario():
+        scheduler = make_scheduler()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "story"
+
+        results = await asyncio.gather(*(scheduler.submit("gpt-4", "key", call) for _ in range(3)))
+        return scheduler, calls, results
+
+    scheduler, calls, results = asyncio.run(scenario())
+    assert results == ["story"] * 3
+    assert calls == 1
+    assert scheduler.coalesced == 2
+    assert scheduler.stats()["inflight"] == 0
+
+
+def test_cancelling_one_book_does_not_cancel_coalesced_books():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "story"
+
+        first = asyncio.create_task(scheduler.submit("gpt-4", "key", call))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(scheduler.submit("gpt-4", "key", call))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return scheduler, await second, first
+
+    scheduler, result, first = asyncio.run(scenario())
+    assert result == "story"
+    assert first.cancelled()
+    assert scheduler.coalesced == 1
+
+
+def test_call_is_cancelled_once_every_caller_is():
+    async def scenario():
+        scheduler = make_scheduler()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(scheduler.submit("gpt-4", "key", call)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.stats()["inflight"] == 0
+
+
+def test_failures_reach_every_coalesced_caller():
+    async def scenario():
+        scheduler = make_scheduler()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        return await asyncio.gather(
+            *(scheduler.submit("gpt-4", "key", call) for _ in range(2)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+def test_usage_is_charged_to_the_current_book():
+    async def scenario():
+        scheduler = OpenAIScheduler(
+            rate_limits={"gpt-4": {}},
+            pricing={"gpt-4": {"prompt": 1.0, "completion": 2.0}},
+            max_retries=0,
+        )
+        usage = Usage()
+        current_usage.set(usage)
+
+        async def call():
+            return {"prompt_tokens": 1000, "completion_tokens": 500}
+
+        await scheduler.submit(
+            "gpt-4", "key", call, usage_of=lambda r: (r["prompt_tokens"], r["completion_tokens"])
+        )
+        return usage
+
+    usage = asyncio.run(scenario())
+    assert (usage.prompt_tokens, usage.completion_tokens) == (1000, 500)
+    assert usage.cost == 2.0
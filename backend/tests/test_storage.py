@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from services.storage import LocalArtifactStore, iter_file_range, key_digest, parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", {"start": 0, "end": 99}),
+        ("bytes=10-", {"start": 10, "end": 999}),
+        ("bytes=-100", {"start": 900, "end": 999}),
+        ("bytes=-5000", {"start": 0, "end": 999}),
+        ("bytes=990-5000", {"start": 990, "end": 999}),
+        (" bytes = 5-5 ", {"start": 5, "end": 5}),
+        # Multipart, other units and malformed headers are served whole
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("bytes=-", None),
+        ("bytes=abc-", None),
+        ("bytes=1-2-3", None),
+        ("bytes=50-10", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "header, size", [("bytes=1000-", 1000), ("bytes=-0", 1000), ("bytes=0-", 0)]
+)
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = LocalArtifactStore(str(tmp_path / "artifacts"))
+    source = tmp_path / "page.png"
+    source.write_bytes(b"page")
+
+    key = asyncio.run(store.put(b"page", ".png"))
+    assert asyncio.run(store.put_file(str(source), ".png")) == key
+    assert key.startswith(f"{key[6:8]}/{key[8:10]}/") and key.endswith(".png")
+    assert asyncio.run(store.get(key)) == b"page"
+    assert store.content_type(key) == "image/png"
+    assert len(key_digest(key)) == 64
+    assert [path.name for path in (tmp_path / "artifacts").rglob("*") if path.is_file()] == [
+        key.split("/")[-1]
+    ]
+
+
+def test_keys_cannot_escape_the_store(tmp_path):
+    store = LocalArtifactStore(str(tmp_path / "artifacts"))
+    with pytest.raises(ValueError):
+        store.path("../secret.png")
+
+
+def test_iter_file_range_reads_inclusive_ranges(tmp_path):
+    path = tmp_path / "audio.wav"
+    path.write_bytes(bytes(range(200)) * 1000)
+    data = b"".join(iter_file_range(str(path), 70000, 140000))
+    assert data == path.read_bytes()[70000:140001]
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.templates import (
+    DEFAULT_SYSTEM_PROMPT,
+    StoryTemplate,
+    TemplateRegistry,
+    book_type_key,
+    compile_book_type,
+    field_key,
+)
+
+
+def book_type(prompts, id=3, name="Pet Tales", description="Stories about {pets}"):
+    return SimpleNamespace(id=id, name=name, description=description, prompts=prompts)
+
+
+def test_field_keys_normalize_labels():
+    assert field_key("Child's Name") == "childs_name"
+    assert field_key("  Favourite colour? ") == "favourite_colour"
+
+
+def test_rendering_accepts_labels_or_field_keys():
+    fields = ["Child's Name", "Age"]
+    template = StoryTemplate("t", "system", "For {childs_name}, age {age}.", fields)
+    assert template.render({"Child's Name": "Mia", "age": 5}) == ("system", "For Mia, age 5.")
+    with pytest.raises(ValueError, match="age"):
+        template.render({"childs_name": "Mia"})
+
+
+@pytest.mark.parametrize("text", ["{name!r}", "{name:>10}", "{name.upper}", "{0}", "{other}"])
+def test_bad_placeholders_fail_when_compiled(text):
+    with pytest.raises(ValueError):
+        StoryTemplate("t", "system", text, ["name"])
+
+
+def test_label_only_book_types_get_the_generic_template():
+    template = compile_book_type(book_type(["Pet's Name", "Breed {of dog}"]))
+    assert template.key == book_type_key(3) and template.system == DEFAULT_SYSTEM_PROMPT
+    _, prompt = template.render({"Pet's Name": "Rex", "Breed {of dog}": "Beagle"})
+    # Braces typed by an admin are text, not placeholders
+    assert "Stories about {pets}" in prompt
+    assert "- Pet's Name: Rex" in prompt and "- Breed {of dog}: Beagle" in prompt
+
+
+def test_registry_recompiles_only_changed_book_types():
+    registry = TemplateRegistry()
+    pets = book_type({"system": "Be kind.", "fields": ["name"], "template": "Hi {name}"})
+    first = registry.for_book_type(pets)
+    assert registry.for_book_type(pets) is first
+    assert registry.get(book_type_key(3)) is first
+
+    pets.prompts = {"fields": ["name"], "template": "Hello {name}"}
+    recompiled = registry.for_book_type(pets)
+    assert recompiled.render({"name": "Rex"}) == (DEFAULT_SYSTEM_PROMPT, "Hello Rex")
+    assert registry.get("children-story").fields == ["name", "age", "interests"]
+    with pytest.raises(ValueError):
+        registry.get("unknown")
+
+
+def test_load_reports_invalid_book_types():
+    registry = TemplateRegistry()
+    good = book_type(["Name"], id=1)
+    undeclared = book_type({"fields": [], "template": "Hi {name}"}, id=2)
+    no_template = book_type({"fields": ["name"]}, id=3)
+    errors = registry.load([good, undeclared, no_template])
+    assert [error.split(":")[0] for error in errors] == ["book-type-2", "book-type-3"]
+    assert registry.get("book-type-1").fields == ["name"]
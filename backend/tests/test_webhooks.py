@@ -0,0 +1,78 @@
+from services.webhooks import (
+    ORDER_COMPLETED,
+    ORDER_FAILED,
+    ORDER_PENDING,
+    ORDER_REFUNDED,
+    merge_order,
+    order_change,
+)
+
+
+def change(status, amount=None, **fields):
+    return {
+        "stripe_payment_id": "pi_1",
+        "status": status,
+        "amount": amount,
+        "book_id": None,
+        "user_id": None,
+        **fields,
+    }
+
+
+def test_first_change_becomes_the_order():
+    created = change(ORDER_PENDING, 19.99, book_id=3)
+    assert merge_order(None, created) == created
+    assert merge_order(None, created) is not created
+
+
+def test_late_lower_ranked_events_do_not_move_the_status_back():
+    completed = merge_order(None, change(ORDER_COMPLETED, 19.99))
+    assert merge_order(completed, change(ORDER_PENDING))["status"] == ORDER_COMPLETED
+    assert merge_order(completed, change(ORDER_FAILED))["status"] == ORDER_COMPLETED
+
+
+def test_status_moves_forward():
+    order = merge_order(None, change(ORDER_PENDING, 19.99, book_id=3, user_id=5))
+    order = merge_order(order, change(ORDER_FAILED))
+    assert order["status"] == ORDER_FAILED
+    # A retried payment on the same intent can still succeed
+    order = merge_order(order, change(ORDER_COMPLETED))
+    assert order["status"] == ORDER_COMPLETED
+    order = merge_order(order, change(ORDER_REFUNDED, 19.99))
+    assert order == change(ORDER_REFUNDED, 19.99, book_id=3, user_id=5)
+
+
+def test_missing_fields_keep_the_current_values():
+    order = merge_order(None, change(ORDER_PENDING, 19.99, book_id=3, user_id=5))
+    assert merge_order(order, change(ORDER_COMPLETED)) == change(
+        ORDER_COMPLETED, 19.99, book_id=3, user_id=5
+    )
+
+
+def test_refunds_carry_the_refunded_amount():
+    refund = order_change(
+        "charge.refunded",
+        {"payment_intent": "pi_1", "refunded": True, "amount": 1999, "amount_refunded": 1999},
+    )
+    assert refund["status"] == ORDER_REFUNDED
+    assert refund["amount"] == 19.99
+    # Partial refunds leave the order as it was
+    assert order_change("charge.refunded", {"payment_intent": "pi_1", "refunded": False}) is None
+
+
+def test_checkout_and_payment_intent_events_share_the_order():
+    session = order_change(
+        "checkout.session.completed",
+        {
+            "id": "cs_1",
+            "payment_intent": "pi_1",
+            "payment_status": "paid",
+            "amount_total": 1999,
+            "client_reference_id": "3",
+            "metadata": {"user_id": "5"},
+        },
+    )
+    intent = order_change("payment_intent.succeeded", {"id": "pi_1", "amount_received": 1999})
+    assert session == change(ORDER_COMPLETED, 19.99, book_id=3, user_id=5)
+    assert intent["stripe_payment_id"] == session["stripe_payment_id"]
+    assert order_change("customer.created", {"id": "cus_1"}) is None